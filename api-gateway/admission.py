@@ -0,0 +1,234 @@
+"""Control de admisión con clases de prioridad y descarte de carga en el gateway.
+
+Cada petición bajo `/api/v1` se clasifica por método y prefijo de ruta
+(`servicio/ruta`) según GATEWAY_PRIORITY_RULES, p. ej.
+"POST reservas/reservas=critical,GET restaurantes=low". La primera regla que
+coincide gana (`*` vale para cualquier método); si ninguna coincide la clase es
+`normal`. Clases, de más a menos prioritaria: critical, high, normal, low.
+
+- Como máximo GATEWAY_ADMISSION_MAX_CONCURRENCY peticiones se atienden a la vez.
+  El resto espera en una cola acotada por clase (GATEWAY_ADMISSION_QUEUE_<CLASE>)
+  y al liberarse un hueco entra la más antigua de la clase más prioritaria.
+- Si el retardo de cola supera GATEWAY_ADMISSION_TARGET_DELAY durante todo un
+  GATEWAY_ADMISSION_INTERVAL (criterio de CoDel), el gateway se considera
+  sobrecargado y las clases de GATEWAY_ADMISSION_SHED_CLASSES se rechazan al
+  llegar con 503 y Retry-After, sin esperar ni tocar los servicios.
+- Con la cola de la clase llena, o tras GATEWAY_ADMISSION_MAX_WAIT en cola,
+  también se responde 503.
+- Los streams de Server-Sent Events pasan por la admisión al conectar, pero
+  liberan su hueco al empezar la respuesta: una conexión abierta durante horas
+  no debe ocupar capacidad de las peticiones normales.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = ("critical", "high", "normal", "low")
+DEFAULT_CLASS = "normal"
+
+DEFAULT_RULES = (
+    "POST reservas/reservas=critical,PUT reservas/reservas=critical,PATCH reservas/reservas=critical,"
+    "DELETE reservas/reservas=critical,* auth=high,GET restaurantes=low,GET menu=low"
+)
+DEFAULT_QUEUE_LIMITS = {"critical": 200, "high": 100, "normal": 100, "low": 50}
+
+
+def parse_rules(raw: str) -> List[Tuple[str, str, str]]:
+    """Convierte "MÉTODO prefijo=clase,..." en una lista de (método, prefijo, clase)."""
+    rules = []
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        match, priority = item.rsplit("=", 1)
+        method, _, prefix = match.strip().partition(" ")
+        priority = priority.strip()
+        if priority not in PRIORITY_CLASSES or not prefix:
+            logger.warning(f"Regla de prioridad inválida ignorada: {item}")
+            continue
+        rules.append((method.upper(), prefix.strip().strip("/"), priority))
+    return rules
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        rules: List[Tuple[str, str, str]],
+        max_concurrency: int,
+        queue_limits: Dict[str, int],
+        target_delay: float,
+        interval: float,
+        max_wait: float,
+        shed_classes: Tuple[str, ...],
+    ):
+        self.rules = rules
+        self.max_concurrency = max_concurrency
+        self.queue_limits = queue_limits
+        self.target_delay = target_delay
+        self.interval = interval
+        self.max_wait = max_wait
+        self.shed_classes = shed_classes
+        self.in_flight = 0
+        self.queues: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {c: deque() for c in PRIORITY_CLASSES}
+        self.overloaded = False
+        self._above_target_since = None
+        self.admitted = {c: 0 for c in PRIORITY_CLASSES}
+        self.shed = {c: 0 for c in PRIORITY_CLASSES}
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            rules=parse_rules(os.getenv("GATEWAY_PRIORITY_RULES", DEFAULT_RULES)),
+            max_concurrency=int(os.getenv("GATEWAY_ADMISSION_MAX_CONCURRENCY", "128")),
+            queue_limits={
+                c: int(os.getenv(f"GATEWAY_ADMISSION_QUEUE_{c.upper()}", str(DEFAULT_QUEUE_LIMITS[c])))
+                for c in PRIORITY_CLASSES
+            },
+            target_delay=float(os.getenv("GATEWAY_ADMISSION_TARGET_DELAY", "0.05")),
+            interval=float(os.getenv("GATEWAY_ADMISSION_INTERVAL", "0.1")),
+            max_wait=float(os.getenv("GATEWAY_ADMISSION_MAX_WAIT", "2")),
+            shed_classes=tuple(
+                c.strip() for c in os.getenv("GATEWAY_ADMISSION_SHED_CLASSES", "low").split(",") if c.strip()
+            ),
+        )
+
+    def classify(self, method: str, route: str) -> str:
+        for rule_method, prefix, priority in self.rules:
+            if rule_method in ("*", method) and (route == prefix or route.startswith(prefix + "/")):
+                return priority
+        return DEFAULT_CLASS
+
+    def _observe_delay(self, delay: float):
+        """Actualiza el estado de sobrecarga con el retardo de cola de una petición."""
+        now = time.monotonic()
+        if delay < self.target_delay:
+            self._above_target_since = None
+            if self.overloaded:
+                self.overloaded = False
+                logger.info("admission: fin de sobrecarga")
+            return
+        if self._above_target_since is None:
+            self._above_target_since = now
+        elif not self.overloaded and now - self._above_target_since >= self.interval:
+            self.overloaded = True
+            logger.warning(f"admission: sobrecarga (retardo de cola {delay * 1000:.0f} ms)")
+
+    def _waiting_ahead(self, priority: str) -> bool:
+        """¿Hay peticiones de igual o mayor prioridad esperando?"""
+        for c in PRIORITY_CLASSES:
+            if self.queues[c]:
+                return True
+            if c == priority:
+                return False
+        return False
+
+    def _reject(self, priority: str):
+        self.shed[priority] += 1
+        return False
+
+    async def acquire(self, priority: str) -> bool:
+        """Espera un hueco. Devuelve False si la petición debe descartarse."""
+        if self.in_flight < self.max_concurrency and not self._waiting_ahead(priority):
+            self.in_flight += 1
+            self.admitted[priority] += 1
+            self._observe_delay(0.0)
+            return True
+        if self.overloaded and priority in self.shed_classes:
+            return self._reject(priority)
+        queue = self.queues[priority]
+        if len(queue) >= self.queue_limits[priority]:
+            return self._reject(priority)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (time.monotonic(), future)
+        queue.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Se le asignó hueco justo al vencer el plazo: se devuelve
+                self.release()
+            else:
+                queue.remove(entry)
+            return self._reject(priority)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            elif entry in queue:
+                queue.remove(entry)
+            raise
+        self.admitted[priority] += 1
+        return True
+
+    def release(self):
+        """Libera un hueco y se lo pasa a la petición más antigua de mayor prioridad."""
+        self.in_flight -= 1
+        now = time.monotonic()
+        for c in PRIORITY_CLASSES:
+            queue = self.queues[c]
+            while queue:
+                enqueued_at, future = queue.popleft()
+                if future.done():
+                    continue
+                self.in_flight += 1
+                self._observe_delay(now - enqueued_at)
+                future.set_result(None)
+                return
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "overloaded": self.overloaded,
+            "queued": {c: len(q) for c, q in self.queues.items()},
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+class AdmissionMiddleware:
+    """Aplica el control de admisión a las peticiones bajo `/api/v1`."""
+
+    def __init__(self, app, controller: AdmissionController, path_prefix: str = "/api/v1"):
+        self.app = app
+        self.controller = controller
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix + "/"):
+            await self.app(scope, receive, send)
+            return
+
+        route = scope["path"][len(self.path_prefix) + 1:]
+        priority = self.controller.classify(scope["method"], route)
+        if not await self.controller.acquire(priority):
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Gateway overloaded, request shed (priority {priority})."},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        released = False
+
+        async def wrapped_send(message):
+            nonlocal released
+            if message["type"] == "http.response.start" and not released:
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                if content_type.startswith("text/event-stream"):
+                    released = True
+                    self.controller.release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            if not released:
+                self.controller.release()
@@ -0,0 +1,112 @@
+"""Endpoint batch del gateway: varias sub-peticiones en una sola llamada.
+
+Cada elemento `{method, service, path, query, body}` se convierte en una
+petición ASGI sintética y se despacha al mismo handler `forward_*` que usaría
+una petición normal, de modo que caché, coalescencia, circuit breakers y
+balanceo entre réplicas también se aplican a las sub-peticiones.
+"""
+import os
+import json
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+BATCH_MAX_ITEMS = int(os.getenv("GATEWAY_BATCH_MAX_ITEMS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("GATEWAY_BATCH_CONCURRENCY", "10"))
+
+# Cabeceras de la petición batch que se heredan en cada sub-petición.
+INHERITED_HEADERS = ("authorization", "cookie", "accept-language", "x-request-id", "x-forwarded-for")
+
+
+class BatchItem(BaseModel):
+    """Sub-petición dentro de un batch."""
+    method: str = "GET"
+    service: str
+    path: str = ""
+    query: Optional[Dict[str, Any]] = None
+    body: Optional[Any] = None
+    headers: Optional[Dict[str, str]] = None
+
+
+def build_request(item: BatchItem, parent: Request) -> Request:
+    """Construye la petición sintética que recibirá el handler `forward_*`."""
+    path = item.path.lstrip("/")
+    body = b""
+    headers = {k: parent.headers[k] for k in INHERITED_HEADERS if k in parent.headers}
+    if item.body is not None:
+        body = json.dumps(item.body).encode("utf-8")
+        headers["content-type"] = "application/json"
+    headers.update({k.lower(): v for k, v in (item.headers or {}).items()})
+    headers["content-length"] = str(len(body))
+
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": item.method.upper(),
+        "scheme": parent.url.scheme,
+        "path": f"/api/v1/{item.service}/{path}",
+        "raw_path": f"/api/v1/{item.service}/{path}".encode("utf-8"),
+        "query_string": urlencode(item.query or {}, doseq=True).encode("utf-8"),
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        "client": parent.client,
+        "server": parent.scope.get("server"),
+        "app": parent.scope.get("app"),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request(scope, receive)
+
+
+async def _read_body(response: Response) -> bytes:
+    if isinstance(response, StreamingResponse):
+        chunks = []
+        async for chunk in response.body_iterator:
+            chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        return b"".join(chunks)
+    return response.body
+
+
+async def to_result(outcome: Awaitable) -> dict:
+    """Normaliza lo que devuelve (o lanza) un handler en `{status, body}`."""
+    try:
+        result = await outcome
+    except HTTPException as e:
+        return {"status": e.status_code, "body": {"detail": e.detail}}
+    except Exception as e:
+        return {"status": 500, "body": {"detail": f"Error procesando sub-petición: {e}"}}
+
+    if not isinstance(result, Response):
+        return {"status": 200, "body": jsonable_encoder(result)}
+
+    raw = await _read_body(result)
+    if result.headers.get("content-encoding"):
+        # Cuerpo comprimido en passthrough: no se puede incrustar en el JSON
+        return {"status": result.status_code, "body": None, "detail": "Cuerpo comprimido omitido"}
+    if "application/json" in result.headers.get("content-type", ""):
+        body = json.loads(raw) if raw else None
+    else:
+        body = raw.decode("utf-8", errors="replace")
+    return {"status": result.status_code, "body": body}
+
+
+async def run_batch(
+    items: List[BatchItem],
+    parent: Request,
+    dispatch: Callable[[BatchItem, Request], Awaitable],
+) -> List[dict]:
+    """Ejecuta las sub-peticiones en paralelo (máximo BATCH_CONCURRENCY a la vez)
+    y devuelve los resultados en el mismo orden que la entrada."""
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(item: BatchItem) -> dict:
+        async with semaphore:
+            return await to_result(dispatch(item, build_request(item, parent)))
+
+    return await asyncio.gather(*(run(item) for item in items))
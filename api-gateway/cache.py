@@ -0,0 +1,214 @@
+"""Caché en memoria de respuestas GET del gateway.
+
+- TTL por prefijo de ruta (`servicio/ruta`), configurable con GATEWAY_CACHE_TTLS,
+  por ejemplo: "restaurantes/restaurantes/=30,menu/platos/=15". Las rutas que no
+  coinciden con ningún prefijo no se cachean.
+- Límite de memoria (GATEWAY_CACHE_MAX_BYTES) con expulsión LRU.
+- La clave incluye la ruta, la query string normalizada y los valores de las
+  cabeceras que afectan a la respuesta (GATEWAY_CACHE_VARY_HEADERS más las que
+  indique el servicio en su cabecera `Vary`).
+- Una escritura exitosa (POST/PUT/PATCH/DELETE) invalida las entradas del mismo
+  servicio y primer segmento de ruta, p. ej. `PUT menu/platos/4` invalida
+  `menu/platos/?restaurante_id=2`.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from etag import compute_etag
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTLS = "restaurantes/restaurantes/=30,menu/platos/=15,menu/menu/=15,reservas/reservas/disponibilidad=30"
+DEFAULT_VARY_HEADERS = "authorization,accept,accept-language"
+
+# Cabeceras del servicio que se guardan junto al cuerpo de la respuesta.
+CACHED_RESPONSE_HEADERS = ("content-type", "cache-control", "etag", "last-modified", "vary")
+
+# Sobrecoste aproximado por entrada (clave, cabeceras, estructura) para el límite de memoria.
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def parse_ttls(raw: str) -> Dict[str, float]:
+    """Convierte "prefijo=segundos,prefijo=segundos" en un diccionario."""
+    ttls = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        prefix, seconds = item.rsplit("=", 1)
+        try:
+            ttls[prefix.strip().strip("/")] = float(seconds)
+        except ValueError:
+            logger.warning(f"TTL de caché inválido ignorado: {item}")
+    return ttls
+
+
+def invalidation_scope(route: str) -> str:
+    """Servicio + primer segmento de la ruta: `menu/platos/4` -> `menu/platos`."""
+    parts = [p for p in route.split("/") if p]
+    return "/".join(parts[:2])
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+    expires_at: float
+    scope: str
+    size: int = field(init=False)
+
+    def __post_init__(self):
+        self.size = len(self.body) + ENTRY_OVERHEAD_BYTES
+
+    def to_response(self, cache_status: str) -> Response:
+        headers = dict(self.headers)
+        headers["x-cache"] = cache_status
+        return Response(content=self.body, status_code=self.status_code, headers=headers)
+
+
+class ResponseCache:
+    """Caché LRU acotada por bytes con TTL por prefijo de ruta.
+
+    El gateway corre en un único event loop, por lo que no se necesitan locks.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_bytes: int, vary_headers: Tuple[str, ...]):
+        # Prefijos ordenados de más largo a más corto para elegir el más específico
+        self.ttls = dict(sorted(ttls.items(), key=lambda kv: len(kv[0]), reverse=True))
+        self.max_bytes = max_bytes
+        self.vary_headers = tuple(h.lower() for h in vary_headers)
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._by_scope: Dict[str, Set[tuple]] = {}
+        # Cabeceras Vary anunciadas por el servicio para cada ruta+query y cuántas
+        # variantes (entradas) quedan de ella: se olvidan al quitar la última
+        self._vary: Dict[str, Tuple[str, ...]] = {}
+        self._variants: Dict[str, int] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            ttls=parse_ttls(os.getenv("GATEWAY_CACHE_TTLS", DEFAULT_TTLS)),
+            max_bytes=int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            vary_headers=tuple(
+                h.strip() for h in os.getenv("GATEWAY_CACHE_VARY_HEADERS", DEFAULT_VARY_HEADERS).split(",") if h.strip()
+            ),
+        )
+
+    def ttl_for(self, route: str) -> float:
+        """TTL en segundos para la ruta, 0 si no se cachea."""
+        route = route.strip("/")
+        for prefix, ttl in self.ttls.items():
+            if route.startswith(prefix):
+                return ttl
+        return 0
+
+    def _base_key(self, route: str, request: Request) -> str:
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return f"{route.strip('/')}?{query}"
+
+    def _key(self, base_key: str, request: Request) -> tuple:
+        names = self._vary.get(base_key, self.vary_headers)
+        return (base_key,) + tuple(request.headers.get(name, "") for name in names)
+
+    def get(self, route: str, request: Request) -> Optional[CachedResponse]:
+        key = self._key(self._base_key(route, request), request)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, route: str, request: Request, status_code: int, headers, body: bytes, ttl: float):
+        """Guarda la respuesta si el servicio lo permite (no `no-store`/`private`, sin `Vary: *`)."""
+        cache_control = headers.get("cache-control", "").lower()
+        if "no-store" in cache_control or "private" in cache_control:
+            return
+        upstream_vary = tuple(v.strip().lower() for v in headers.get("vary", "").split(",") if v.strip())
+        if "*" in upstream_vary:
+            return
+
+        base_key = self._base_key(route, request)
+        vary_names = self.vary_headers + tuple(v for v in upstream_vary if v not in self.vary_headers)
+        key = (base_key,) + tuple(request.headers.get(name, "") for name in vary_names)
+
+        cached_headers = {k: headers[k] for k in CACHED_RESPONSE_HEADERS if k in headers}
+        # El ETag se calcula una vez al guardar para no rehacer el hash en cada acierto
+        cached_headers.setdefault("etag", compute_etag(body))
+        entry = CachedResponse(
+            status_code=status_code,
+            headers=cached_headers,
+            body=body,
+            expires_at=time.monotonic() + ttl,
+            scope=invalidation_scope(route),
+        )
+        if entry.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._vary[base_key] = vary_names
+        self._variants[base_key] = self._variants.get(base_key, 0) + 1
+        self._entries[key] = entry
+        self._by_scope.setdefault(entry.scope, set()).add(key)
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, route: str):
+        """Elimina las entradas del mismo servicio y primer segmento que `route`."""
+        keys = self._by_scope.pop(invalidation_scope(route), set())
+        for key in keys:
+            self._remove(key)
+        if keys:
+            self.invalidations += len(keys)
+            logger.info(f"cache invalidate scope={invalidation_scope(route)} entries={len(keys)}")
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        remaining = self._variants.pop(key[0], 1) - 1
+        if remaining > 0:
+            self._variants[key[0]] = remaining
+        else:
+            self._vary.pop(key[0], None)
+        scope_keys = self._by_scope.get(entry.scope)
+        if scope_keys is not None:
+            scope_keys.discard(key)
+            if not scope_keys:
+                del self._by_scope[entry.scope]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "ttls": self.ttls,
+        }
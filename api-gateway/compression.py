@@ -0,0 +1,184 @@
+"""Compresión de respuestas del gateway según `Accept-Encoding` (brotli o gzip).
+
+Middleware ASGI:
+
+- Negocia `br` (si el módulo `brotli` está instalado) o `gzip` respetando los
+  valores q del cliente.
+- Sólo comprime tipos de texto/JSON con estado 200 y a partir de
+  GATEWAY_COMPRESS_MIN_SIZE bytes (1024 por defecto).
+- Las respuestas que ya traen `Content-Encoding` (p. ej. el servicio comprimió
+  en modo passthrough) se envían tal cual, sin descomprimir ni recomprimir.
+- Las respuestas en streaming se comprimen por trozos, sin bufferizarlas.
+  Server-Sent Events (`text/event-stream`) no se comprimen: cada evento debe
+  llegar al navegador en cuanto sale y son mensajes pequeños.
+- Al comprimir, el ETag pasa a ser débil (`W/"..."`): la representación cambia
+  pero el contenido es equivalente, y la comparación de If-None-Match es débil.
+"""
+import os
+import gzip
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él sólo se ofrece gzip
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("GATEWAY_COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("GATEWAY_COMPRESS_LEVEL", "6"))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Elige la mejor codificación soportada según Accept-Encoding (o None)."""
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qualities[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = qualities.get(encoding, qualities.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor:
+    """Compresor incremental para gzip o brotli."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._impl = brotli.Compressor(quality=min(COMPRESS_LEVEL, 11))
+        else:
+            self._impl = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._impl.process(data) + self._impl.flush()
+        return self._impl.compress(data) + self._impl.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._impl.finish()
+        return self._impl.flush(zlib.Z_FINISH)
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=min(COMPRESS_LEVEL, 11))
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+
+
+def weak_etag(etag: str) -> str:
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+def add_vary(headers: MutableHeaders):
+    vary = headers.get("vary", "")
+    if "accept-encoding" not in vary.lower():
+        headers["vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] == 304 and "etag" in headers:
+                    mutable = MutableHeaders(raw=message["headers"])
+                    mutable["etag"] = weak_etag(headers["etag"])
+                    add_vary(mutable)
+                    message["headers"] = mutable.raw
+                if (
+                    message["status"] != 200
+                    or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                    or headers.get("content-type", "").startswith(UNCOMPRESSED_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is not None:
+                chunk = compressor.compress(body)
+                if not more_body:
+                    chunk += compressor.finish()
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            if not more_body and len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers["content-encoding"] = encoding
+            add_vary(headers)
+            if "etag" in headers:
+                headers["etag"] = weak_etag(headers["etag"])
+            if more_body:
+                # Streaming: se comprime trozo a trozo, la longitud final es desconocida
+                if "content-length" in headers:
+                    del headers["content-length"]
+                compressor = _Compressor(encoding)
+                start_message["headers"] = headers.raw
+                await send(start_message)
+                await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+                return
+
+            compressed = compress_body(body, encoding)
+            headers["content-length"] = str(len(compressed))
+            start_message["headers"] = headers.raw
+            passthrough = True
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, wrapped_send)
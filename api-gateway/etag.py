@@ -0,0 +1,104 @@
+"""ETag y GET condicional (304) para las respuestas del gateway.
+
+Middleware ASGI que actúa sobre los GET con estado 200 bajo `/api/v1`:
+
+- Si la respuesta ya trae `ETag` (del servicio o de la caché) se respeta tal cual.
+- Si no, y la respuesta no es streaming, se calcula un ETag fuerte a partir del
+  cuerpo. Las respuestas en streaming sin ETag se dejan pasar sin bufferizar.
+- Si el `If-None-Match` del cliente coincide se responde 304 sin cuerpo.
+"""
+import hashlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Cabeceras que no tienen sentido en una respuesta 304 sin cuerpo.
+NOT_MODIFIED_DROP_HEADERS = ("content-length", "content-type")
+
+
+def compute_etag(body: bytes) -> str:
+    """ETag fuerte derivado del contenido."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(t) for t in if_none_match.split(",")}
+
+
+class ETagMiddleware:
+    def __init__(self, app, path_prefix: str = "/api/v1"):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start_message = None
+        passthrough = False
+        discard = False
+
+        async def send_not_modified(etag: str):
+            headers = MutableHeaders(raw=list(start_message["headers"]))
+            for name in NOT_MODIFIED_DROP_HEADERS:
+                if name in headers:
+                    del headers[name]
+            headers["etag"] = etag
+            await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        async def wrapped_send(message):
+            nonlocal start_message, passthrough, discard
+            if discard:
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            headers = Headers(raw=start_message["headers"])
+            etag = headers.get("etag")
+            streaming = message.get("more_body", False)
+
+            if etag is None and not streaming:
+                etag = compute_etag(message.get("body", b""))
+                mutable = MutableHeaders(raw=start_message["headers"])
+                mutable["etag"] = etag
+                start_message["headers"] = mutable.raw
+
+            passthrough = True
+            if etag is not None and etag_matches(if_none_match, etag):
+                await send_not_modified(etag)
+                # El resto del cuerpo (si era streaming) se descarta
+                discard = True
+                return
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, wrapped_send)
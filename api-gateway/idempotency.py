@@ -0,0 +1,268 @@
+"""Claves de idempotencia (`Idempotency-Key`) para los POST del gateway.
+
+Middleware ASGI que actúa sobre los POST bajo `/api/v1` que traen la cabecera
+`Idempotency-Key`:
+
+- La primera petición con una clave se ejecuta normalmente y su respuesta
+  (estado, cabeceras y cuerpo) se guarda en memoria durante
+  GATEWAY_IDEMPOTENCY_TTL segundos (24 h).
+- Una repetición con la misma clave, ruta y `Authorization` recibe la respuesta
+  guardada con `Idempotent-Replayed: true`, sin llegar al servicio.
+- Si la repetición llega mientras la original sigue en curso, espera a que
+  termine en lugar de ejecutarse dos veces.
+- La misma clave con otro cuerpo responde 422: la clave identifica una
+  operación, no se puede reutilizar para otra.
+
+Sólo se guardan las respuestas definitivas: las 5xx, 408 y 429 (o una respuesta
+que no llega a terminar) liberan la clave y el cliente puede reintentar con ella.
+El almacén está acotado por GATEWAY_IDEMPOTENCY_MAX_BYTES con expulsión LRU y no
+guarda respuestas de más de GATEWAY_IDEMPOTENCY_MAX_BODY bytes. Es local a cada
+réplica del gateway; `POST /reservas` guarda además la clave en la base (ver
+services/reservas/idempotencia.py), que sí se comparte.
+
+Se registra dentro de CompressionMiddleware y pide `identity` hacia dentro: la
+respuesta se guarda sin comprimir y cada repetición se comprime según su propio
+`Accept-Encoding`.
+
+El gateway corre en un único event loop, por lo que no se necesitan locks.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+
+# Respuestas que no son definitivas: el cliente puede reintentar con la misma clave.
+RETRYABLE_STATUSES = (408, 429)
+
+# Sobrecoste aproximado por entrada (clave, cabeceras, estructura) para el límite de memoria.
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    expires_at: float
+    size: int = field(init=False)
+
+    def __post_init__(self):
+        self.size = len(self.body) + sum(len(k) + len(v) for k, v in self.headers) + ENTRY_OVERHEAD_BYTES
+
+
+class IdempotencyStore:
+    """Respuestas guardadas por clave con TTL, acotadas por bytes (LRU)."""
+
+    def __init__(self, ttl: float, max_bytes: int, max_body: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_body = max_body
+        self._entries: "OrderedDict[tuple, StoredResponse]" = OrderedDict()
+        # Claves con la petición original en curso y el cuerpo con el que llegó
+        self._inflight: Dict[tuple, Tuple[str, asyncio.Future]] = {}
+        self.bytes = 0
+        self.stored = 0
+        self.replayed = 0
+        self.waited = 0
+        self.mismatches = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyStore":
+        return cls(
+            ttl=float(os.getenv("GATEWAY_IDEMPOTENCY_TTL", str(24 * 3600))),
+            max_bytes=int(os.getenv("GATEWAY_IDEMPOTENCY_MAX_BYTES", str(16 * 1024 * 1024))),
+            max_body=int(os.getenv("GATEWAY_IDEMPOTENCY_MAX_BODY", str(64 * 1024))),
+        )
+
+    def get(self, key: tuple) -> Optional[StoredResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def inflight(self, key: tuple) -> Optional[Tuple[str, asyncio.Future]]:
+        return self._inflight.get(key)
+
+    def begin(self, key: tuple, body_fingerprint: str):
+        self._inflight[key] = (body_fingerprint, asyncio.get_running_loop().create_future())
+
+    def finish(self, key: tuple, entry: Optional[StoredResponse]):
+        """Termina la petición original: guarda su respuesta (si es definitiva) y despierta a las que esperan."""
+        if entry is not None and entry.size <= self.max_bytes:
+            self._store(key, entry)
+        _, future = self._inflight.pop(key, (None, None))
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def _store(self, key: tuple, entry: StoredResponse):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        self.stored += 1
+        while self.bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "stored": self.stored,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "mismatches": self.mismatches,
+            "evictions": self.evictions,
+        }
+
+
+async def _send_json(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}, separators=(",", ":")).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body, "more_body": False})
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, store: IdempotencyStore, path_prefix: str = "/api/v1"):
+        self.app = app
+        self.store = store
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(HEADER)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key admite como máximo {MAX_KEY_LENGTH} caracteres")
+            return
+
+        # El cuerpo se lee entero para compararlo y se vuelve a entregar a la aplicación
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        body_fingerprint = fingerprint(body)
+        # La clave es de un cliente: dos usuarios con la misma clave no comparten respuesta
+        key = (scope["path"], headers.get("authorization", ""), idempotency_key)
+
+        while True:
+            entry = self.store.get(key)
+            if entry is not None:
+                if entry.fingerprint != body_fingerprint:
+                    self.store.mismatches += 1
+                    await _send_json(send, 422, "Idempotency-Key ya usada con otro cuerpo")
+                    return
+                self.store.replayed += 1
+                await send({
+                    "type": "http.response.start",
+                    "status": entry.status,
+                    "headers": entry.headers + [(b"idempotent-replayed", b"true")],
+                })
+                await send({"type": "http.response.body", "body": entry.body, "more_body": False})
+                return
+            inflight = self.store.inflight(key)
+            if inflight is None:
+                break
+            if inflight[0] != body_fingerprint:
+                self.store.mismatches += 1
+                await _send_json(send, 422, "Idempotency-Key ya usada con otro cuerpo")
+                return
+            # Repetición mientras la original sigue en curso: se espera su resultado
+            self.store.waited += 1
+            await asyncio.shield(inflight[1])
+
+        self.store.begin(key, body_fingerprint)
+        sent = False
+        # Sin comprimir, también en modo passthrough (el servicio no comprime)
+        scope = dict(scope, headers=[(k, v) for k, v in scope["headers"] if k != b"accept-encoding"])
+        scope["headers"].append((b"accept-encoding", b"identity"))
+
+        async def replay_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start_message = None
+        response_chunks = []
+        response_size = 0
+        storable = True
+        stored = None
+
+        async def wrapped_send(message):
+            nonlocal start_message, response_size, storable, stored
+            if message["type"] == "http.response.start":
+                start_message = message
+                status = message["status"]
+                storable = status < 500 and status not in RETRYABLE_STATUSES
+            elif message["type"] == "http.response.body" and storable:
+                chunk = message.get("body", b"")
+                response_size += len(chunk)
+                if response_size > self.store.max_body:
+                    storable = False
+                    response_chunks.clear()
+                else:
+                    response_chunks.append(chunk)
+                if not message.get("more_body", False) and storable:
+                    stored = StoredResponse(
+                        fingerprint=body_fingerprint,
+                        status=start_message["status"],
+                        headers=list(start_message["headers"]),
+                        body=b"".join(response_chunks),
+                        expires_at=time.monotonic() + self.store.ttl,
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, wrapped_send)
+        finally:
+            self.store.finish(key, stored)
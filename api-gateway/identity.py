@@ -0,0 +1,163 @@
+"""Verificación local de JWT en el gateway y cabeceras de identidad.
+
+Los access tokens los firma `auth-service` con HS256 (`create_access_token`).
+El gateway comparte `JWT_SECRET` y los verifica sin llamar al servicio:
+
+- Las claims verificadas se guardan en memoria hasta que expira el token.
+- A cada petición hacia los servicios se le quitan las cabeceras `X-User-*`
+  que envíe el cliente y, si el token es válido, se añaden `X-User-Email` y
+  `X-User-Token-Exp`, que los servicios pueden tratar como identidad de confianza.
+- `GET auth/me` se responde desde una caché de usuarios de TTL corto
+  (GATEWAY_ME_CACHE_TTL, 30s) cuando el token es válido. Una escritura con
+  éxito hacia `auth` (POST/PUT/PATCH/DELETE) quita de la caché al usuario del
+  token con el que se hizo.
+"""
+import os
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+from jose import ExpiredSignatureError, JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+JWT_SECRET = os.getenv("JWT_SECRET", "devsecret_change_me")
+JWT_ALG = "HS256"
+
+IDENTITY_HEADER_PREFIX = "x-user-"
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token.strip()
+
+
+class TokenVerifier:
+    """Verifica access tokens HS256 y cachea las claims hasta su expiración."""
+
+    def __init__(self, secret: str, max_entries: int):
+        self.secret = secret
+        self.max_entries = max_entries
+        self._claims: Dict[str, Tuple[dict, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalid = 0
+        self.expired = 0
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Devuelve las claims si el token es válido; None en caso contrario.
+
+        Lanza ExpiredSignatureError si la firma es correcta pero el token expiró.
+        """
+        now = time.time()
+        entry = self._claims.get(token)
+        if entry is not None:
+            claims, exp = entry
+            if exp > now:
+                self.hits += 1
+                return claims
+            del self._claims[token]
+            self.expired += 1
+            raise ExpiredSignatureError("Signature has expired.")
+
+        self.misses += 1
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[JWT_ALG])
+        except ExpiredSignatureError:
+            self.expired += 1
+            raise
+        except JWTError:
+            self.invalid += 1
+            return None
+        if not claims.get("sub") or "exp" not in claims:
+            self.invalid += 1
+            return None
+        self._store(token, claims, float(claims["exp"]), now)
+        return claims
+
+    def claims(self, authorization: Optional[str]) -> Optional[dict]:
+        """Claims del header Authorization, o None si falta, es inválido o expiró."""
+        token = bearer_token(authorization)
+        if token is None:
+            return None
+        try:
+            return self.verify(token)
+        except ExpiredSignatureError:
+            return None
+
+    def _store(self, token: str, claims: dict, exp: float, now: float):
+        if len(self._claims) >= self.max_entries:
+            # Primero los expirados; si no basta, los más antiguos
+            for key in [k for k, (_, e) in self._claims.items() if e <= now]:
+                del self._claims[key]
+            while len(self._claims) >= self.max_entries:
+                del self._claims[next(iter(self._claims))]
+        self._claims[token] = (claims, exp)
+
+    def stats(self) -> dict:
+        return {
+            "cached_tokens": len(self._claims),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalid": self.invalid,
+            "expired": self.expired,
+        }
+
+
+class UserCache:
+    """Respuestas de `auth/me` por usuario, con TTL corto."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._users: Dict[str, Tuple[dict, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, subject: str) -> Optional[dict]:
+        entry = self._users.get(subject)
+        if entry is None or entry[1] <= time.monotonic():
+            self._users.pop(subject, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def put(self, subject: str, user: dict, ttl: float):
+        if ttl <= 0:
+            return
+        if len(self._users) >= self.max_entries:
+            del self._users[next(iter(self._users))]
+        self._users[subject] = (user, time.monotonic() + ttl)
+
+    def evict(self, subject: str):
+        if self._users.pop(subject, None) is not None:
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "cached_users": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "ttl": self.ttl,
+        }
+
+
+verifier = TokenVerifier(JWT_SECRET, int(os.getenv("GATEWAY_IDENTITY_CACHE_SIZE", "10000")))
+users = UserCache(float(os.getenv("GATEWAY_ME_CACHE_TTL", "30")), int(os.getenv("GATEWAY_ME_CACHE_SIZE", "10000")))
+
+
+def identity_headers(headers: Dict[str, str], authorization: Optional[str]) -> Dict[str, str]:
+    """Quita las cabeceras de identidad del cliente y añade las verificadas por el gateway."""
+    cleaned = {k: v for k, v in headers.items() if not k.lower().startswith(IDENTITY_HEADER_PREFIX)}
+    claims = verifier.claims(authorization)
+    if claims is not None:
+        cleaned["x-user-email"] = str(claims["sub"])
+        cleaned["x-user-token-exp"] = str(int(claims["exp"]))
+    return cleaned
@@ -1,18 +1,82 @@
 from fastapi import FastAPI, APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse, Response
 # NEW BUILD MARKER
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+import httpx
+from jose import ExpiredSignatureError
 import logging
-from typing import Dict, Any
+import math
+import time
+from typing import Dict, Any, List
 import os
 
+from common.metrics import instrument_fastapi
+from common.tracing import trace_fastapi
+from admission import AdmissionController, AdmissionMiddleware
+from ratelimit import RateLimiter, RateLimitMiddleware
+from batch import BATCH_MAX_ITEMS, BatchItem, run_batch
+from cache import ResponseCache
+from compression import CompressionMiddleware
+from etag import ETagMiddleware
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+from identity import bearer_token, users, verifier
+from resilience import guards_from_env
+from retries import policies_from_env
+from singleflight import SingleFlight, request_key
+from upstream import UpstreamClients, forward_headers, parse_replicas, passthrough_enabled, stream_request
+
 # Define la instancia de la aplicación FastAPI.
 app = FastAPI(title="API Gateway Taller Microservicios")
 logging.basicConfig(level=logging.INFO, format='[gateway] %(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
+# httpx registra cada petición a nivel INFO; sólo nos interesan advertencias
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# ETag fuerte y respuestas 304 para los GET reenviados (ver etag.py).
+app.add_middleware(ETagMiddleware)
+
+# Control de admisión por clases de prioridad: bajo sobrecarga se descarta antes
+# la navegación (GET restaurantes/menu) que las reservas (ver admission.py).
+admission = AdmissionController.from_env()
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+# Idempotency-Key en los POST: una repetición recibe la respuesta guardada de la
+# original sin ocupar plaza de admisión ni llegar al servicio (ver idempotency.py).
+idempotency = IdempotencyStore.from_env()
+app.add_middleware(IdempotencyMiddleware, store=idempotency)
+
+# Compresión gzip/brotli negociada con Accept-Encoding (ver compression.py).
+# Envuelve al ETag (el 304 se decide sobre el cuerpo sin comprimir) y a la
+# idempotencia (se guarda sin comprimir y cada repetición se comprime según su
+# propio Accept-Encoding).
+app.add_middleware(CompressionMiddleware)
+
+# Token bucket por IP, usuario y ruta; responde 429 antes de encolar o llamar a
+# los servicios (ver ratelimit.py).
+limiter = RateLimiter.from_env()
+app.add_middleware(RateLimitMiddleware, limiter=limiter)
+
+# La ruta genérica se etiqueta en métricas y trazas con el servicio destino
+# (`/api/v1/menu/{path:path}`).
+def route_label(scope: dict, template: str) -> str:
+    service_name = scope.get("path_params", {}).get("service_name")
+    if service_name in SERVICES:
+        return template.replace("{service_name}", service_name)
+    return template
+
+
+# Trazas: span por petición, spans por llamada a cada réplica y `traceparent`
+# hacia los servicios (ver common/tracing.py).
+trace_fastapi(app, "api-gateway", route_label=route_label)
+
+# Métricas Prometheus en /metrics (ver common/metrics.py). Envuelve al resto de
+# middlewares para medir la petición completa.
+metrics = instrument_fastapi(app, "api-gateway", route_label=route_label)
 
 # Configura CORS (Cross-Origin Resource Sharing).
 # Esto es esencial para permitir que el frontend se comunique con el gateway.
+# Se registra el último para que sea el más externo: los 429/503/304 de los
+# middlewares anteriores y los preflight OPTIONS llevan también sus cabeceras.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Permite peticiones desde cualquier origen (ajustar en producción)
@@ -27,56 +91,216 @@ router = APIRouter(prefix="/api/v1")
 # Define los microservicios y sus URLs.
 # La URL debe coincidir con el nombre del servicio definido en docker-compose.yml.
 # El puerto debe ser el del contenedor (ej. auth-service:8004).
+# Cada variable admite varias réplicas separadas por comas (ver upstream.py).
 SERVICES = {
-    "auth": os.getenv("AUTH_SERVICE_URL", "http://auth-service:8004"),
-    "restaurantes": os.getenv("RESTAURANTES_SERVICE_URL", "http://restaurantes-service:8001"),
-    "reservas": os.getenv("RESERVAS_SERVICE_URL", "http://reservas-service:8003"),
-    "menu": os.getenv("MENU_SERVICE_URL", "http://menu-service:8002"),
+    "auth": parse_replicas(os.getenv("AUTH_SERVICE_URL", "http://auth-service:8004")),
+    "restaurantes": parse_replicas(os.getenv("RESTAURANTES_SERVICE_URL", "http://restaurantes-service:8001")),
+    "reservas": parse_replicas(os.getenv("RESERVAS_SERVICE_URL", "http://reservas-service:8003")),
+    "menu": parse_replicas(os.getenv("MENU_SERVICE_URL", "http://menu-service:8002")),
 }
 
+# Timeout hacia los servicios (segundos). Se lee una sola vez al arrancar.
+GATEWAY_TIMEOUT = float(os.getenv("GATEWAY_TIMEOUT", "5"))
+
+# Server-Sent Events: máximo sin recibir nada del servicio (los servicios envían
+# un latido cada 15s) antes de cortar el stream.
+GATEWAY_SSE_READ_TIMEOUT = float(os.getenv("GATEWAY_SSE_READ_TIMEOUT", "60"))
+
+# Un cliente HTTP asíncrono con pool keep-alive por servicio (ver upstream.py).
+clients = UpstreamClients(SERVICES, timeout=GATEWAY_TIMEOUT, policies=policies_from_env(SERVICES, GATEWAY_TIMEOUT))
+
+# Caché en memoria de respuestas GET con TTL por prefijo de ruta (ver cache.py).
+cache = ResponseCache.from_env()
+
+# Une los GET idénticos concurrentes en una sola llamada al servicio (ver singleflight.py).
+singleflight = SingleFlight()
+
+# Circuit breaker + límite de peticiones en vuelo por servicio (ver resilience.py).
+guards = guards_from_env(SERVICES)
+
+
+@app.on_event("startup")
+async def startup_event():
+    await clients.startup()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await clients.shutdown()
+
+# Tras una escritura con éxito: invalida la caché de respuestas del mismo ámbito y,
+# si va a auth (perfil, logout...), el usuario del token en la caché de auth/me.
+def invalidate_after_write(service_name: str, path: str, request: Request):
+    cache.invalidate(f"{service_name}/{path}")
+    if service_name == "auth":
+        claims = verifier.claims(request.headers.get("authorization"))
+        if claims is not None:
+            users.evict(claims["sub"])
+
+async def passthrough(service_name: str, method: str, path: str, request: Request):
+    """Reenvía en modo passthrough (streaming de bytes crudos, ver upstream.stream_request)."""
+    guard = guards[service_name]
+    guard.acquire()
+    try:
+        # El hueco del bulkhead se libera cuando termina el streaming del cuerpo
+        response = await stream_request(
+            clients, service_name, method, path, request,
+            on_close=lambda upstream: guard.release(upstream.status_code < 500),
+        )
+    except httpx.HTTPError as e:
+        guard.release(False)
+        raise HTTPException(status_code=500, detail=f"Error forwarding request to {service_name}: {e}")
+    if method != "GET" and response.status_code < 400:
+        try:
+            invalidate_after_write(service_name, path, request)
+        except Exception:
+            # La respuesta no llegará a enviarse: se cierra aquí para liberar el hueco
+            await response.aclose()
+            raise
+    return response
+
+def wants_event_stream(request: Request) -> bool:
+    return "text/event-stream" in request.headers.get("accept", "")
+
+async def stream_events(service_name: str, path: str, request: Request):
+    """Reenvía un stream de Server-Sent Events sin bufferizar, cachear ni agrupar.
+
+    El circuit breaker y el bulkhead sólo cuentan la apertura del stream: el hueco
+    se libera cuando llegan las cabeceras del servicio, porque un stream puede
+    durar horas. La lectura no tiene más límite que GATEWAY_SSE_READ_TIMEOUT
+    entre eventos.
+    """
+    guard = guards[service_name]
+    guard.acquire()
+    try:
+        response = await stream_request(
+            clients, service_name, "GET", path, request,
+            timeout=httpx.Timeout(GATEWAY_TIMEOUT, read=GATEWAY_SSE_READ_TIMEOUT),
+        )
+    except httpx.HTTPError as e:
+        guard.release(False)
+        raise HTTPException(status_code=500, detail=f"Error forwarding request to {service_name}: {e}")
+    guard.release(response.status_code < 500)
+    response.headers["x-accel-buffering"] = "no"
+    return response
+
+def cache_miss_response(response: httpx.Response) -> Response:
+    """Devuelve el cuerpo ya leído del servicio sin volver a parsear el JSON."""
+    headers = {k: response.headers[k] for k in ("content-type", "cache-control", "etag", "last-modified") if k in response.headers}
+    headers["x-cache"] = "MISS"
+    return Response(content=response.content, status_code=response.status_code, headers=headers)
+
+async def dispatch_batch_item(item: BatchItem, request: Request):
+    """Envía una sub-petición del batch al handler genérico de su método."""
+    handlers = {
+        "GET": forward_get,
+        "POST": forward_post,
+        "PUT": forward_put,
+        "PATCH": forward_patch,
+        "DELETE": forward_delete,
+    }
+    handler = handlers.get(item.method.upper())
+    if handler is None:
+        raise HTTPException(status_code=405, detail=f"Método '{item.method}' no soportado en batch.")
+    # Cada sub-petición consume de los límites de su propia ruta
+    ip = limiter.client_ip(request.client.host if request.client else None, request.headers.get("x-forwarded-for"))
+    route = f"{item.service}/{item.path.strip('/')}".strip("/")
+    wait = await limiter.check(item.method.upper(), route, ip, request.headers.get("authorization"))
+    if wait > 0:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded.", headers={"Retry-After": str(max(1, math.ceil(wait)))})
+    return await handler(item.service, item.path.lstrip("/"), request)
+
+# Ejecuta varias sub-peticiones en paralelo y devuelve los resultados en orden.
+# Debe declararse antes de las rutas genéricas para que no la capture /{service_name}/{path}.
+@router.post("/batch")
+async def batch(items: List[BatchItem], request: Request):
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Máximo {BATCH_MAX_ITEMS} sub-peticiones por batch.")
+    return {"results": await run_batch(items, request, dispatch_batch_item)}
+
+# Perfil del usuario autenticado. Se responde desde la caché de usuarios cuando el
+# token se verifica localmente, sin pasar por auth-service ni MongoDB.
+@router.get("/auth/me")
+async def auth_me(request: Request):
+    token = bearer_token(request.headers.get("authorization"))
+    claims = None
+    if token is not None:
+        try:
+            claims = verifier.verify(token)
+        except ExpiredSignatureError:
+            raise HTTPException(
+                status_code=401, detail="Credenciales inválidas", headers={"WWW-Authenticate": "Bearer"}
+            )
+    if claims is not None:
+        user = users.get(claims["sub"])
+        if user is not None:
+            return JSONResponse(user, headers={"x-cache": "HIT"})
+
+    result = await forward_get("auth", "me", request)
+    if claims is not None and isinstance(result, dict):
+        users.put(claims["sub"], result, ttl=min(users.ttl, claims["exp"] - time.time()))
+    return result
+
 # Rutas genéricas para redirigir peticiones GET/POST/PUT/PATCH/DELETE a los microservicios.
 @router.get("/{service_name}/{path:path}")
 async def forward_get(service_name: str, path: str, request: Request):
     if service_name not in SERVICES:
         raise HTTPException(status_code=404, detail=f"Service '{service_name}' not found.")
-    
-    service_url = f"{SERVICES[service_name]}/{path}"
-    
+
+    if wants_event_stream(request):
+        return await stream_events(service_name, path, request)
+
+    route = f"{service_name}/{path}"
+    ttl = cache.ttl_for(route)
+    if ttl:
+        cached = cache.get(route, request)
+        if cached is not None:
+            return cached.to_response("HIT")
+    elif passthrough_enabled(service_name):
+        return await passthrough(service_name, "GET", path, request)
+
     try:
         # Reenviar headers relevantes (incluye Authorization si está presente)
-        headers = {k: v for k, v in request.headers.items()}
-        timeout = float(os.getenv("GATEWAY_TIMEOUT", "5"))
-        response = requests.get(service_url, params=request.query_params, headers=headers, timeout=timeout)
+        headers = forward_headers(request.headers)
+        response = await singleflight.do(
+            request_key(route, request),
+            lambda: guards[service_name].call(
+                lambda: clients.send(service_name, "GET", path, params=request.query_params, headers=headers)
+            ),
+        )
+        if ttl:
+            if response.status_code == 200:
+                cache.store(route, request, response.status_code, response.headers, response.content, ttl)
+                return cache_miss_response(response)
+            if passthrough_enabled(service_name):
+                return cache_miss_response(response)
         response.raise_for_status()
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Error forwarding request to {service_name}: {e}")
 
 @router.post("/{service_name}/{path:path}")
 async def forward_post(service_name: str, path: str, request: Request):
     if service_name not in SERVICES:
         raise HTTPException(status_code=404, detail=f"Service '{service_name}' not found.")
-
-    service_url = f"{SERVICES[service_name]}/{path}"
+    if passthrough_enabled(service_name):
+        return await passthrough(service_name, "POST", path, request)
 
     try:
-        headers = {k: v for k, v in request.headers.items()}
-        timeout = float(os.getenv("GATEWAY_TIMEOUT", "5"))
+        headers = forward_headers(request.headers)
         content_type = request.headers.get("content-type", "").lower()
         params = request.query_params
         body = await request.body()
         logger.info(f"forward_post service={service_name} path={path} content_type={content_type} body_len={len(body)}")
-        if "application/json" in content_type:
-            import json as _json
-            payload = _json.loads(body.decode("utf-8") or "{}") if body else {}
-            response = requests.post(service_url, json=payload, params=params, headers=headers, timeout=timeout)
-        else:
-            # Pasar cuerpo crudo para formularios/multipart/otros
-            response = requests.post(service_url, data=body, params=params, headers=headers, timeout=timeout)
+        # El cuerpo se reenvía tal cual (JSON, formularios, multipart...) sin decodificarlo
+        response = await guards[service_name].call(
+            lambda: clients.send(service_name, "POST", path, content=body, params=params, headers=headers)
+        )
         logger.info(f"forward_post upstream_status={response.status_code}")
         if response.status_code >= 400:
             # Propaga el código original y el texto de error
             raise HTTPException(status_code=response.status_code, detail=response.text)
+        invalidate_after_write(service_name, path, request)
         return response.json() if response.content else {"status": response.status_code}
     except HTTPException:
         raise
@@ -87,20 +311,18 @@ async def forward_post(service_name: str, path: str, request: Request):
 async def forward_put(service_name: str, path: str, request: Request):
     if service_name not in SERVICES:
         raise HTTPException(status_code=404, detail=f"Service '{service_name}' not found.")
-    service_url = f"{SERVICES[service_name]}/{path}"
+    if passthrough_enabled(service_name):
+        return await passthrough(service_name, "PUT", path, request)
     try:
-        headers = {k: v for k, v in request.headers.items()}
-        timeout = float(os.getenv("GATEWAY_TIMEOUT", "5"))
-        content_type = headers.get("content-type", "").lower()
+        headers = forward_headers(request.headers)
         params = request.query_params
-        if "application/json" in content_type:
-            payload = await request.json()
-            response = requests.put(service_url, json=payload, params=params, headers=headers, timeout=timeout)
-        else:
-            body = await request.body()
-            response = requests.put(service_url, data=body, params=params, headers=headers, timeout=timeout)
+        body = await request.body()
+        response = await guards[service_name].call(
+            lambda: clients.send(service_name, "PUT", path, content=body, params=params, headers=headers)
+        )
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
+        invalidate_after_write(service_name, path, request)
         return response.json() if response.content else {"status": response.status_code}
     except HTTPException:
         raise
@@ -111,20 +333,18 @@ async def forward_put(service_name: str, path: str, request: Request):
 async def forward_patch(service_name: str, path: str, request: Request):
     if service_name not in SERVICES:
         raise HTTPException(status_code=404, detail=f"Service '{service_name}' not found.")
-    service_url = f"{SERVICES[service_name]}/{path}"
+    if passthrough_enabled(service_name):
+        return await passthrough(service_name, "PATCH", path, request)
     try:
-        headers = {k: v for k, v in request.headers.items()}
-        timeout = float(os.getenv("GATEWAY_TIMEOUT", "5"))
-        content_type = headers.get("content-type", "").lower()
+        headers = forward_headers(request.headers)
         params = request.query_params
-        if "application/json" in content_type:
-            payload = await request.json()
-            response = requests.patch(service_url, json=payload, params=params, headers=headers, timeout=timeout)
-        else:
-            body = await request.body()
-            response = requests.patch(service_url, data=body, params=params, headers=headers, timeout=timeout)
+        body = await request.body()
+        response = await guards[service_name].call(
+            lambda: clients.send(service_name, "PATCH", path, content=body, params=params, headers=headers)
+        )
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
+        invalidate_after_write(service_name, path, request)
         return response.json() if response.content else {"status": response.status_code}
     except HTTPException:
         raise
@@ -135,16 +355,20 @@ async def forward_patch(service_name: str, path: str, request: Request):
 async def forward_delete(service_name: str, path: str, request: Request):
     if service_name not in SERVICES:
         raise HTTPException(status_code=404, detail=f"Service '{service_name}' not found.")
-    service_url = f"{SERVICES[service_name]}/{path}"
+    if passthrough_enabled(service_name):
+        return await passthrough(service_name, "DELETE", path, request)
     try:
-        headers = {k: v for k, v in request.headers.items()}
-        timeout = float(os.getenv("GATEWAY_TIMEOUT", "5"))
-        response = requests.delete(service_url, params=request.query_params, headers=headers, timeout=timeout)
+        headers = forward_headers(request.headers)
+        response = await guards[service_name].call(
+            lambda: clients.send(service_name, "DELETE", path, params=request.query_params, headers=headers)
+        )
+        if response.status_code < 400:
+            invalidate_after_write(service_name, path, request)
         if response.status_code == 204:
             return {"status": "deleted"}
         response.raise_for_status()
         return response.json() if response.content else {"status": response.status_code}
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Error forwarding request to {service_name}: {e}")
 
 # Incluye el router en la aplicación principal.
@@ -154,3 +378,84 @@ app.include_router(router)
 @app.get("/health")
 def health_check():
     return {"status": "ok", "message": "API Gateway is running."}
+
+# Métricas propias del gateway que se añaden a /metrics.
+def gateway_metrics():
+    yield "gateway_cache_hits_total", "counter", "Respuestas servidas desde la caché.", [({}, cache.hits)]
+    yield "gateway_cache_misses_total", "counter", "Consultas a la caché sin entrada válida.", [({}, cache.misses)]
+    yield "gateway_coalesced_total", "counter", "GET resueltos con la llamada de otro GET idéntico.", [({}, singleflight.coalesced)]
+    yield "gateway_upstream_in_flight", "gauge", "Peticiones en vuelo hacia cada servicio.", [
+        ({"upstream": name}, guard.in_flight) for name, guard in guards.items()
+    ]
+    yield "gateway_circuit_open", "gauge", "1 si el circuit breaker del servicio está abierto.", [
+        ({"upstream": name}, int(guard.breaker.state == "open")) for name, guard in guards.items()
+    ]
+    yield "gateway_upstream_retries_total", "counter", "Reintentos hacia cada servicio.", [
+        ({"upstream": name}, policy.retries) for name, policy in clients.policies.items()
+    ]
+    yield "gateway_upstream_hedges_total", "counter", "Peticiones hedge lanzadas a cada servicio.", [
+        ({"upstream": name}, policy.hedges) for name, policy in clients.policies.items()
+    ]
+
+    yield "gateway_admission_shed_total", "counter", "Peticiones descartadas por el control de admisión.", [
+        ({"priority": name}, count) for name, count in admission.shed.items()
+    ]
+    yield "gateway_admission_queued", "gauge", "Peticiones esperando turno por clase de prioridad.", [
+        ({"priority": name}, len(queue)) for name, queue in admission.queues.items()
+    ]
+
+    yield "gateway_idempotent_replays_total", "counter", "POST respondidos con la respuesta guardada de su Idempotency-Key.", [
+        ({}, idempotency.replayed)
+    ]
+
+    yield "gateway_rate_limited_total", "counter", "Peticiones rechazadas con 429 por cada regla.", [
+        ({"rule": rule}, count) for rule, count in limiter.limited.items()
+    ]
+
+
+metrics.add_collector(gateway_metrics)
+
+# Réplicas de cada servicio con su estado de salud y peticiones pendientes.
+@app.get("/admin/upstreams")
+def upstreams_status():
+    return clients.stats()
+
+# Latencias observadas, timeout derivado del p99, reintentos y hedging por servicio.
+@app.get("/admin/latency")
+def latency_stats():
+    return {name: policy.stats() for name, policy in clients.policies.items()}
+
+# Buckets activos, peticiones admitidas y rechazadas por cada regla.
+@app.get("/admin/ratelimit")
+def ratelimit_stats():
+    return limiter.stats()
+
+# Clases de prioridad: en cola, admitidas y descartadas; estado de sobrecarga.
+@app.get("/admin/admission")
+def admission_stats():
+    return admission.stats()
+
+# Estado de los circuit breakers y peticiones en vuelo por servicio.
+@app.get("/admin/breakers")
+def breakers_status():
+    return {name: guard.stats() for name, guard in guards.items()}
+
+# Tokens verificados localmente y caché de auth/me.
+@app.get("/admin/identity")
+def identity_stats():
+    return {"tokens": verifier.stats(), "users": users.stats()}
+
+# Contadores de la caché de respuestas (hits, misses, expulsiones) para ajustar TTLs y tamaño.
+@app.get("/admin/cache")
+def cache_stats():
+    return cache.stats()
+
+# Cuántos GET concurrentes idénticos se resolvieron con una única llamada al servicio.
+@app.get("/admin/coalescing")
+def coalescing_stats():
+    return singleflight.stats()
+
+# Claves de idempotencia guardadas, repeticiones servidas y claves reutilizadas con otro cuerpo.
+@app.get("/admin/idempotency")
+def idempotency_stats():
+    return idempotency.stats()
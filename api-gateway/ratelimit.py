@@ -0,0 +1,302 @@
+"""Límites de peticiones con token bucket por IP, por usuario y por ruta.
+
+Las reglas se configuran en GATEWAY_RATE_LIMITS como una lista separada por
+comas de `ámbito MÉTODO prefijo=peticiones/segundos`:
+
+- `ip POST auth/login=10/60`: 10 logins por minuto y dirección IP.
+- `subject * reservas/reservas=20/60`: 20 peticiones por minuto y usuario
+  autenticado (claim `sub` del JWT verificado en el gateway).
+- `route POST auth/login=50/1`: 50 por segundo en total para la ruta.
+
+`*` como método o prefijo vale para todo. Cada regla es un bucket de capacidad
+`peticiones` que se rellena a `peticiones/segundos` fichas por segundo; una
+petición tiene que pasar todas las reglas que le aplican. Si alguna se agota se
+responde 429 con Retry-After antes de hacer ningún trabajo hacia los servicios.
+
+Buckets:
+
+- En memoria (por defecto): un dict `clave -> (fichas, instante, lleno_en)`.
+  Un bucket que ya se habría rellenado del todo equivale a uno nuevo, así que
+  se borra en el barrido periódico; como máximo GATEWAY_RATE_LIMIT_MAX_KEYS
+  claves (se expulsan las menos recientes).
+- Redis (GATEWAY_RATE_LIMIT_REDIS_URL): los buckets se comparten entre réplicas
+  del gateway con un script Lua atómico. Requiere el paquete `redis`; si Redis
+  no responde las peticiones se dejan pasar.
+
+La IP del cliente es la del socket salvo que venga de un proxy de confianza
+(GATEWAY_TRUSTED_PROXIES, redes CIDR, p. ej. el frontend), en cuyo caso se toma
+de `X-Forwarded-For`.
+"""
+import os
+import math
+import time
+import logging
+import ipaddress
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from identity import verifier
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis es opcional; sin él sólo hay buckets en memoria
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ("ip", "subject", "route")
+
+DEFAULT_LIMITS = (
+    "ip * *=100/1,ip POST auth/login=10/60,ip POST auth/register=5/60,"
+    "subject * *=50/1,subject POST reservas/reservas=20/60,route POST auth/login=50/1"
+)
+
+# Actualiza el bucket y devuelve los segundos de espera ("0" si se admite).
+# Usa el reloj de Redis para que todas las réplicas del gateway coincidan.
+REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(b[1]) or capacity
+local ts = tonumber(b[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class Rule:
+    __slots__ = ("index", "scope", "method", "prefix", "capacity", "rate", "spec")
+
+    def __init__(self, index: int, scope: str, method: str, prefix: str, capacity: float, period: float, spec: str):
+        self.index = index
+        self.scope = scope
+        self.method = method
+        self.prefix = prefix
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.spec = spec
+
+    def matches(self, method: str, route: str) -> bool:
+        if self.method not in ("*", method):
+            return False
+        return self.prefix == "*" or route == self.prefix or route.startswith(self.prefix + "/")
+
+
+def parse_limits(raw: str) -> List[Rule]:
+    """Convierte "ámbito MÉTODO prefijo=N/segundos,..." en reglas."""
+    rules = []
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        match, limit = item.rsplit("=", 1)
+        parts = match.split()
+        try:
+            scope, method, prefix = parts
+            count, _, period = limit.partition("/")
+            capacity, period = float(count), float(period or 1)
+            if scope not in SCOPES or capacity <= 0 or period <= 0:
+                raise ValueError(item)
+        except ValueError:
+            logger.warning(f"Límite de peticiones inválido ignorado: {item}")
+            continue
+        prefix = prefix.strip("/") or "*"
+        rules.append(Rule(len(rules), scope, method.upper(), prefix, capacity, period, item.strip()))
+    return rules
+
+
+class MemoryBuckets:
+    """Buckets en memoria con barrido de claves inactivas."""
+
+    def __init__(self, max_keys: int, sweep_interval: float = 10.0):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        # clave -> (fichas, instante de la última actualización, instante en que estará lleno)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        entry = self._buckets.pop(key, None)
+        tokens = capacity if entry is None else min(capacity, entry[0] + (now - entry[1]) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        # Reinsertar al final mantiene el dict en orden de uso (LRU)
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        if len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+        return wait
+
+    def _sweep(self, now: float):
+        for key in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        self._next_sweep = now + self.sweep_interval
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBuckets:
+    """Buckets compartidos en Redis. Ante errores de Redis se admite la petición."""
+
+    def __init__(self, client, prefix: str = "gateway:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(REDIS_TOKEN_BUCKET)
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBuckets":
+        if aioredis is None:
+            raise RuntimeError("GATEWAY_RATE_LIMIT_REDIS_URL requiere el paquete 'redis'")
+        return cls(aioredis.from_url(url))
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        try:
+            return float(await self._script(keys=[self.prefix + key], args=[capacity, rate]))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"ratelimit: Redis no disponible, se admite la petición ({e})")
+            return 0.0
+
+    def __len__(self):
+        return 0
+
+
+def parse_networks(raw: str) -> List[ipaddress._BaseNetwork]:
+    networks = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"Proxy de confianza inválido ignorado: {item}")
+    return networks
+
+
+class RateLimiter:
+    def __init__(self, rules: List[Rule], buckets, trusted_proxies: List[ipaddress._BaseNetwork]):
+        self.rules = rules
+        self.buckets = buckets
+        self.trusted_proxies = trusted_proxies
+        self.allowed = 0
+        self.limited: Dict[str, int] = {rule.spec: 0 for rule in rules}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        redis_url = os.getenv("GATEWAY_RATE_LIMIT_REDIS_URL")
+        if redis_url:
+            buckets = RedisBuckets.from_url(redis_url)
+        else:
+            buckets = MemoryBuckets(int(os.getenv("GATEWAY_RATE_LIMIT_MAX_KEYS", "100000")))
+        return cls(
+            rules=parse_limits(os.getenv("GATEWAY_RATE_LIMITS", DEFAULT_LIMITS)),
+            buckets=buckets,
+            trusted_proxies=parse_networks(os.getenv("GATEWAY_TRUSTED_PROXIES", "")),
+        )
+
+    def _trusted(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    def client_ip(self, peer: Optional[str], forwarded_for: Optional[str]) -> str:
+        """IP del cliente: la del socket, o la de X-Forwarded-For si el socket es un proxy de confianza."""
+        ip = peer or "unknown"
+        if not forwarded_for or not self.trusted_proxies or not self._trusted(ip):
+            return ip
+        # Se recorre de derecha a izquierda saltando los proxies de confianza
+        hops = [h.strip() for h in forwarded_for.split(",") if h.strip()]
+        for hop in reversed(hops):
+            if not self._trusted(hop):
+                return hop
+        return hops[0] if hops else ip
+
+    async def check(self, method: str, route: str, ip: str, authorization: Optional[str]) -> float:
+        """Consume una ficha de cada regla aplicable; devuelve los segundos de espera (0 si pasa)."""
+        subject = None
+        for rule in self.rules:
+            if not rule.matches(method, route):
+                continue
+            if rule.scope == "ip":
+                key = f"{rule.index}|{ip}"
+            elif rule.scope == "subject":
+                if subject is None:
+                    claims = verifier.claims(authorization)
+                    subject = str(claims["sub"]) if claims else ""
+                if not subject:
+                    continue
+                key = f"{rule.index}|{subject}"
+            else:
+                key = str(rule.index)
+            wait = await self.buckets.take(key, rule.capacity, rule.rate)
+            if wait > 0:
+                self.limited[rule.spec] += 1
+                return wait
+        self.allowed += 1
+        return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.buckets).__name__,
+            "keys": len(self.buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+def too_many_requests(wait: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Rate limit exceeded."},
+        headers={"Retry-After": str(max(1, math.ceil(wait)))},
+    )
+
+
+class RateLimitMiddleware:
+    """Aplica los límites a las peticiones bajo `/api/v1` antes de cualquier otro trabajo."""
+
+    def __init__(self, app, limiter: RateLimiter, path_prefix: str = "/api/v1"):
+        self.app = app
+        self.limiter = limiter
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix + "/"):
+            await self.app(scope, receive, send)
+            return
+
+        forwarded_for = authorization = None
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                forwarded_for = value.decode("latin-1")
+            elif name == b"authorization":
+                authorization = value.decode("latin-1")
+        client = scope.get("client")
+        ip = self.limiter.client_ip(client[0] if client else None, forwarded_for)
+        route = scope["path"][len(self.path_prefix) + 1:].strip("/")
+
+        wait = await self.limiter.check(scope["method"], route, ip, authorization)
+        if wait > 0:
+            await too_many_requests(wait)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
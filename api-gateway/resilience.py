@@ -0,0 +1,158 @@
+"""Circuit breaker y bulkhead por servicio.
+
+Cada servicio de `SERVICES` tiene un `ServiceGuard` que combina:
+
+- Circuit breaker con estados closed -> open -> half_open. Tras
+  `<SERVICIO>_BREAKER_FAILURES` fallos seguidos (errores de red, timeouts o 5xx)
+  el circuito se abre y las peticiones se rechazan al instante con 503 durante
+  `<SERVICIO>_BREAKER_RESET_TIMEOUT` segundos. Después se deja pasar un número
+  limitado de peticiones de prueba (half_open); si salen bien se cierra.
+- Bulkhead: como máximo `<SERVICIO>_MAX_IN_FLIGHT` peticiones en vuelo hacia el
+  servicio. Si está lleno se responde 503 sin esperar.
+
+Así un servicio colgado no acapara los workers del gateway ni deja sin
+capacidad al resto de servicios. Todas las variables admiten el prefijo
+`GATEWAY_` como valor global.
+"""
+import time
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from upstream import env_setting
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float, half_open_max: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_in_flight = 0
+        self.times_opened = 0
+
+    def retry_after(self) -> float:
+        """Segundos que faltan para pasar a half_open (0 si no está abierto)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                return False
+            self.state = HALF_OPEN
+            self.half_open_in_flight = 0
+        if self.state == HALF_OPEN:
+            if self.half_open_in_flight >= self.half_open_max:
+                return False
+            self.half_open_in_flight += 1
+        return True
+
+    def record(self, success: bool):
+        if self.state == HALF_OPEN:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+        if success:
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            return
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        if self.state != OPEN:
+            self.times_opened += 1
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+
+class ServiceGuard:
+    """Circuit breaker + límite de peticiones en vuelo para un servicio."""
+
+    def __init__(self, service_name: str, breaker: CircuitBreaker, max_in_flight: int):
+        self.service_name = service_name
+        self.breaker = breaker
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.rejected_open = 0
+        self.rejected_full = 0
+
+    @classmethod
+    def from_env(cls, service_name: str) -> "ServiceGuard":
+        breaker = CircuitBreaker(
+            failure_threshold=int(env_setting(service_name, "BREAKER_FAILURES", "5")),
+            reset_timeout=float(env_setting(service_name, "BREAKER_RESET_TIMEOUT", "30")),
+            half_open_max=int(env_setting(service_name, "BREAKER_HALF_OPEN_MAX", "1")),
+        )
+        return cls(service_name, breaker, int(env_setting(service_name, "MAX_IN_FLIGHT", "50")))
+
+    def acquire(self):
+        """Reserva un hueco o lanza HTTPException 503 sin llegar al servicio."""
+        if self.in_flight >= self.max_in_flight:
+            self.rejected_full += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Service '{self.service_name}' is at its concurrency limit.",
+                headers={"Retry-After": "1"},
+            )
+        if not self.breaker.allow():
+            self.rejected_open += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Service '{self.service_name}' is unavailable (circuit {self.breaker.state}).",
+                headers={"Retry-After": str(max(1, int(self.breaker.retry_after() + 0.5)))},
+            )
+        self.in_flight += 1
+
+    def release(self, success: Optional[bool]):
+        """Libera el hueco. `success=None` (p. ej. petición cancelada) no cuenta para el breaker."""
+        self.in_flight -= 1
+        if success is None:
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.half_open_in_flight = max(0, self.breaker.half_open_in_flight - 1)
+            return
+        previous = self.breaker.state
+        self.breaker.record(success)
+        if self.breaker.state != previous:
+            logger.warning(f"circuit service={self.service_name} {previous} -> {self.breaker.state}")
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Ejecuta `send` protegido; los errores de red y las respuestas 5xx cuentan como fallo."""
+        self.acquire()
+        success = None
+        try:
+            response = await send()
+            success = response.status_code < 500
+            return response
+        except httpx.HTTPError:
+            success = False
+            raise
+        finally:
+            self.release(success)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "times_opened": self.breaker.times_opened,
+            "retry_after": round(self.breaker.retry_after(), 2),
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rejected_open": self.rejected_open,
+            "rejected_full": self.rejected_full,
+        }
+
+
+def guards_from_env(services: Dict[str, str]) -> Dict[str, ServiceGuard]:
+    return {name: ServiceGuard.from_env(name) for name in services}
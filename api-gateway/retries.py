@@ -0,0 +1,243 @@
+"""Timeouts adaptativos, reintentos con presupuesto y hedging para GET/DELETE.
+
+Por servicio se guarda una ventana móvil con la latencia de las últimas
+peticiones idempotentes que terminaron bien (`LatencyWindow`):
+
+- Timeout: `p99 * TIMEOUT_P99_MULTIPLIER`, acotado entre `TIMEOUT_MIN` y el
+  timeout estático (`GATEWAY_TIMEOUT`). Mientras no hay muestras suficientes se
+  usa el estático. POST/PUT/PATCH siempre usan el estático: un timeout prematuro
+  sobre una escritura no se puede reintentar.
+- Reintentos: hasta `RETRY_MAX` para GET y DELETE ante errores de red, timeouts
+  o 502/503/504, con backoff exponencial con jitter y a otra réplica si la hay.
+- Presupuesto (`RetryBudget`): cada petición aporta `RETRY_BUDGET_RATIO` fichas
+  y cada reintento o petición hedge gasta una. Si el servicio está caído los
+  reintentos se agotan enseguida y la carga extra queda en torno a ese ratio
+  en lugar de multiplicarse.
+- Hedging (`HEDGE=1`, desactivado por defecto): si un GET no ha respondido tras
+  el p95 observado, se lanza una copia a otra réplica y se usa la primera
+  respuesta que llegue.
+
+Todas las variables admiten el prefijo `<SERVICIO>_` o `GATEWAY_`.
+"""
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+
+from upstream import env_setting
+
+IDEMPOTENT_METHODS = {"GET", "DELETE"}
+RETRYABLE_STATUS = {502, 503, 504}
+
+# Un intento recibe las réplicas ya probadas (para evitarlas y añadir la suya)
+# y el timeout a aplicar.
+Attempt = Callable[[Set[str], float], Awaitable[httpx.Response]]
+
+
+class LatencyWindow:
+    """Últimas `size` latencias (segundos) con percentiles bajo demanda."""
+
+    def __init__(self, size: int, min_samples: int):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._sorted = None
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Percentil `q` (0-100), o None si aún no hay muestras suficientes."""
+        if len(self.samples) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self.samples)
+        index = min(len(self._sorted) - 1, int(len(self._sorted) * q / 100))
+        return self._sorted[index]
+
+
+class RetryBudget:
+    """Fichas para reintentos: `ratio` por petición más un mínimo por segundo."""
+
+    def __init__(self, ratio: float, min_per_second: float, max_tokens: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._refilled_at = time.monotonic()
+        self.exhausted = 0
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+        if self.tokens < 1:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RetryPolicy:
+    """Latencias, timeouts, reintentos y hedging de un servicio."""
+
+    def __init__(
+        self,
+        static_timeout: float,
+        min_timeout: float,
+        p99_multiplier: float,
+        max_retries: int,
+        backoff: float,
+        budget: RetryBudget,
+        window: LatencyWindow,
+        hedge: bool,
+        hedge_min_delay: float,
+    ):
+        self.static_timeout = static_timeout
+        self.min_timeout = min_timeout
+        self.p99_multiplier = p99_multiplier
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.budget = budget
+        self.window = window
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls, service_name: str, static_timeout: float) -> "RetryPolicy":
+        ratio = float(env_setting(service_name, "RETRY_BUDGET_RATIO", "0.1"))
+        return cls(
+            static_timeout=static_timeout,
+            min_timeout=float(env_setting(service_name, "TIMEOUT_MIN", "0.5")),
+            p99_multiplier=float(env_setting(service_name, "TIMEOUT_P99_MULTIPLIER", "3")),
+            max_retries=int(env_setting(service_name, "RETRY_MAX", "2")),
+            backoff=float(env_setting(service_name, "RETRY_BACKOFF", "0.05")),
+            budget=RetryBudget(
+                ratio=ratio,
+                min_per_second=float(env_setting(service_name, "RETRY_BUDGET_MIN_PER_SECOND", "1")),
+                max_tokens=max(10.0, ratio * 100),
+            ),
+            window=LatencyWindow(
+                size=int(env_setting(service_name, "LATENCY_WINDOW", "1000")),
+                min_samples=int(env_setting(service_name, "LATENCY_MIN_SAMPLES", "50")),
+            ),
+            hedge=env_setting(service_name, "HEDGE", "0").lower() in ("1", "true", "yes"),
+            hedge_min_delay=float(env_setting(service_name, "HEDGE_MIN_DELAY", "0.01")),
+        )
+
+    def timeout(self, method: str) -> float:
+        if method not in IDEMPOTENT_METHODS:
+            return self.static_timeout
+        p99 = self.window.percentile(99)
+        if p99 is None:
+            return self.static_timeout
+        return min(self.static_timeout, max(self.min_timeout, p99 * self.p99_multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Espera antes de lanzar la copia hedge (p95), o None si no aplica."""
+        if not self.hedge:
+            return None
+        p95 = self.window.percentile(95)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    async def backoff_sleep(self, attempt: int):
+        await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    async def execute(self, method: str, attempt: Attempt, replicas: int) -> httpx.Response:
+        """Ejecuta la petición aplicando timeout adaptativo, reintentos y hedging.
+
+        Sólo GET y DELETE se reintentan; el resto hace un único intento con el
+        timeout estático. Si el presupuesto se agota se devuelve (o relanza) el
+        último resultado tal cual.
+        """
+        if method not in IDEMPOTENT_METHODS:
+            return await attempt(set(), self.static_timeout)
+
+        self.budget.deposit()
+        tried: Set[str] = set()
+        for n in range(self.max_retries + 1):
+            last = n == self.max_retries
+            try:
+                response = await self._attempt(method, attempt, tried, replicas)
+            except httpx.TransportError as e:
+                if isinstance(e, httpx.TimeoutException):
+                    self.timeouts += 1
+                if last or not self.budget.withdraw():
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS or last or not self.budget.withdraw():
+                    return response
+            self.retries += 1
+            await self.backoff_sleep(n)
+
+    async def _timed(self, attempt: Attempt, tried: Set[str], timeout: float) -> httpx.Response:
+        start = time.perf_counter()
+        response = await attempt(tried, timeout)
+        if response.status_code < 500:
+            self.window.record(time.perf_counter() - start)
+        return response
+
+    async def _attempt(self, method: str, attempt: Attempt, tried: Set[str], replicas: int) -> httpx.Response:
+        timeout = self.timeout(method)
+        delay = self.hedge_delay() if method == "GET" and replicas > 1 else None
+        if delay is None:
+            return await self._timed(attempt, tried, timeout)
+
+        first = asyncio.ensure_future(self._timed(attempt, tried, timeout))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not self.budget.withdraw():
+            return await first
+
+        # El primer intento va lento: copia a otra réplica, gana la primera respuesta buena
+        self.hedges += 1
+        second = asyncio.ensure_future(self._timed(attempt, tried, timeout))
+        pending = {first, second}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Si terminan las dos en la misma vuelta, una buena gana a un fallo
+                for task in (first, second):
+                    if task in done and task.exception() is None and task.result().status_code < 500:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                if not pending:
+                    # Las dos fallaron: mejor una respuesta (5xx) que una excepción
+                    failed = [t for t in (first, second) if t.exception() is None] or [first]
+                    return failed[0].result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        def ms(value):
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "samples": len(self.window.samples),
+            "p50_ms": ms(self.window.percentile(50)),
+            "p95_ms": ms(self.window.percentile(95)),
+            "p99_ms": ms(self.window.percentile(99)),
+            "timeout_ms": ms(self.timeout("GET")),
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "budget_tokens": round(self.budget.tokens, 2),
+            "budget_exhausted": self.budget.exhausted,
+            "hedge": self.hedge,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+def policies_from_env(services: Dict[str, List[str]], static_timeout: float) -> Dict[str, RetryPolicy]:
+    return {name: RetryPolicy.from_env(name, static_timeout) for name in services}
@@ -0,0 +1,67 @@
+"""Coalescencia de peticiones GET idénticas y concurrentes (single-flight).
+
+Cuando llegan varias peticiones iguales mientras la primera sigue en vuelo,
+sólo la primera llega al servicio; el resto espera y recibe la misma respuesta.
+
+Dos peticiones son "idénticas" si coinciden la ruta, la query string normalizada
+y las cabeceras de `KEY_HEADERS`. Así, peticiones con distinto `Authorization`
+nunca comparten respuesta.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict
+from urllib.parse import urlencode
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# Cabeceras que delimitan el alcance de una respuesta compartida.
+KEY_HEADERS = ("authorization", "cookie", "accept", "accept-language")
+
+
+def request_key(route: str, request: Request) -> tuple:
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return (route.strip("/"), query) + tuple(request.headers.get(name, "") for name in KEY_HEADERS)
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución."""
+
+    def __init__(self):
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.requests = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: tuple, fn: Callable[[], Awaitable]):
+        """Ejecuta `fn` o se une a la ejecución en curso con la misma clave.
+
+        La llamada real corre en su propia tarea: si el cliente que la inició se
+        desconecta, el resto de esperas no se cancelan.
+        """
+        self.requests += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marcar la excepción como recuperada aunque todos los que esperaban se hayan ido
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"single-flight key={key[0]} error={task.exception()}")
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
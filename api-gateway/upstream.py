@@ -0,0 +1,401 @@
+"""Clientes HTTP asíncronos compartidos hacia los microservicios.
+
+Cada servicio de `SERVICES` tiene su propio `httpx.AsyncClient` de larga vida,
+con pool de conexiones keep-alive. Así el gateway no bloquea el event loop
+y reutiliza conexiones TCP entre peticiones.
+
+Los límites del pool se configuran por variables de entorno; los valores
+globales pueden sobreescribirse por servicio usando el nombre en mayúsculas:
+
+- GATEWAY_POOL_MAX_CONNECTIONS / <SERVICIO>_POOL_MAX_CONNECTIONS (por defecto 100)
+- GATEWAY_POOL_MAX_KEEPALIVE / <SERVICIO>_POOL_MAX_KEEPALIVE (por defecto 20)
+- GATEWAY_POOL_KEEPALIVE_EXPIRY / <SERVICIO>_POOL_KEEPALIVE_EXPIRY (segundos, por defecto 30)
+
+El modo passthrough (GATEWAY_PASSTHROUGH / <SERVICIO>_PASSTHROUGH = 1) reenvía
+los cuerpos como bytes crudos en streaming, sin decodificar JSON, y conserva el
+código de estado y las cabeceras del servicio (ver `stream_request`).
+
+Réplicas: la URL de un servicio puede ser una lista separada por comas
+(`RESERVAS_SERVICE_URL=http://reservas-1:8003,http://reservas-2:8003`). Cada
+petición va a la réplica sana con menos peticiones pendientes. Un chequeo activo
+contra `/health` de cada réplica (GATEWAY_HEALTH_INTERVAL, por defecto 5s) saca
+del pool las réplicas que fallan GATEWAY_HEALTH_UNHEALTHY_THRESHOLD veces
+seguidas y las reincorpora tras GATEWAY_HEALTH_HEALTHY_THRESHOLD chequeos buenos.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Callable, Collection, Dict, List, Optional
+
+import anyio
+import httpx
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from common.tracing import end_span, inject, start_span
+from identity import identity_headers
+
+logger = logging.getLogger(__name__)
+
+# Cabeceras hop-by-hop que no deben reenviarse al servicio destino.
+# `host` y `content-length` los calcula el cliente HTTP para la nueva petición.
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+}
+
+
+# Cabeceras de respuesta que el servidor del gateway genera por su cuenta.
+GATEWAY_RESPONSE_HEADERS = {"date", "server", "x-request-id"}
+
+# Métodos cuyo cuerpo se reenvía al servicio.
+METHODS_WITH_BODY = {"POST", "PUT", "PATCH"}
+
+
+def env_setting(service_name: str, key: str, default: str) -> str:
+    """Lee `<SERVICIO>_<key>` y si no existe cae a `GATEWAY_<key>`."""
+    return os.getenv(f"{service_name.upper()}_{key}", os.getenv(f"GATEWAY_{key}", default))
+
+
+def pool_limits(service_name: str) -> httpx.Limits:
+    """Construye los límites del pool de conexiones para un servicio."""
+    return httpx.Limits(
+        max_connections=int(env_setting(service_name, "POOL_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(env_setting(service_name, "POOL_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(env_setting(service_name, "POOL_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def passthrough_enabled(service_name: str) -> bool:
+    """Indica si el servicio usa el modo passthrough en streaming."""
+    return env_setting(service_name, "PASSTHROUGH", "0").lower() in ("1", "true", "yes")
+
+
+def forward_headers(headers) -> Dict[str, str]:
+    """Filtra las cabeceras entrantes dejando sólo las que deben llegar al servicio.
+
+    También sustituye las cabeceras `X-User-*` por la identidad verificada del
+    token (ver identity.py).
+    """
+    filtered = {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    return identity_headers(filtered, headers.get("authorization"))
+
+
+def response_headers(headers) -> Dict[str, str]:
+    """Cabeceras de la respuesta del servicio que se devuelven al cliente.
+
+    Se conservan content-type, content-encoding, content-length, cache-control,
+    etag, etc.; sólo se descartan las hop-by-hop y las que pone el propio servidor.
+    """
+    excluded = (HOP_BY_HOP_HEADERS - {"content-length"}) | GATEWAY_RESPONSE_HEADERS
+    return {k: v for k, v in headers.items() if k.lower() not in excluded}
+
+
+def parse_replicas(raw: str) -> List[str]:
+    """Convierte "http://a:8003,http://b:8003" en una lista de URLs base."""
+    return [url.strip().rstrip("/") for url in raw.split(",") if url.strip()]
+
+
+class Replica:
+    """Una instancia de un servicio con su estado de salud y carga pendiente."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.last_check = 0.0
+        self.requests = 0
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+        }
+
+
+class ReplicaPool:
+    """Réplicas de un servicio con balanceo por menor número de peticiones pendientes."""
+
+    def __init__(self, service_name: str, urls: List[str]):
+        self.service_name = service_name
+        self.replicas = [Replica(url) for url in urls]
+        self.unhealthy_threshold = int(env_setting(service_name, "HEALTH_UNHEALTHY_THRESHOLD", "2"))
+        self.healthy_threshold = int(env_setting(service_name, "HEALTH_HEALTHY_THRESHOLD", "2"))
+
+    def pick(self, exclude: Collection[str] = ()) -> Replica:
+        """Elige la réplica sana con menos peticiones pendientes (empates al azar).
+
+        Si no queda ninguna sana se usan todas: es preferible intentar que
+        rechazar cuando el propio chequeo es el que falla. `exclude` son URLs ya
+        probadas (reintentos, hedging); se evitan mientras quede alternativa.
+        """
+        healthy = [r for r in self.replicas if r.healthy] or self.replicas
+        candidates = [r for r in healthy if r.url not in exclude] or healthy
+        least = min(r.outstanding for r in candidates)
+        replica = random.choice([r for r in candidates if r.outstanding == least])
+        replica.outstanding += 1
+        replica.requests += 1
+        return replica
+
+    def record(self, replica: Replica, success: bool):
+        """Registra el resultado de una petición o de un chequeo de salud."""
+        if success:
+            replica.consecutive_failures = 0
+            replica.consecutive_successes += 1
+            if not replica.healthy and replica.consecutive_successes >= self.healthy_threshold:
+                replica.healthy = True
+                logger.info(f"replica healthy service={self.service_name} url={replica.url}")
+            return
+        replica.consecutive_successes = 0
+        replica.consecutive_failures += 1
+        if replica.healthy and replica.consecutive_failures >= self.unhealthy_threshold:
+            replica.healthy = False
+            logger.warning(f"replica unhealthy service={self.service_name} url={replica.url}")
+
+    def stats(self) -> List[dict]:
+        return [r.stats() for r in self.replicas]
+
+
+async def stream_request(
+    clients: "UpstreamClients",
+    service_name: str,
+    method: str,
+    path: str,
+    request: Request,
+    on_close: Optional[Callable[[httpx.Response], None]] = None,
+    timeout: Optional[httpx.Timeout] = None,
+) -> StreamingResponse:
+    """Reenvía la petición en modo passthrough.
+
+    El cuerpo de entrada se envía por trozos tal como llega (sin `json.loads`) y la
+    respuesta se devuelve con `aiter_raw`, es decir, sin descomprimir ni parsear.
+    La memoria usada no depende del tamaño del payload. Si el cliente indicó
+    Content-Length se reutiliza; si no, el cuerpo viaja con chunked encoding.
+
+    `on_close` se invoca una vez cuando la respuesta del servicio termina de
+    enviarse (o se aborta), con la respuesta como argumento. `timeout` sustituye
+    al del cliente (p. ej. sin límite de lectura para Server-Sent Events).
+    """
+    headers = forward_headers(request.headers)
+    content = None
+    if method in METHODS_WITH_BODY:
+        content = request.stream()
+        if "content-length" in request.headers:
+            headers["content-length"] = request.headers["content-length"]
+
+    extra = {"timeout": timeout} if timeout is not None else {}
+    response, release = await clients.open_stream(
+        service_name, method, path, params=request.query_params, headers=headers, content=content, **extra
+    )
+
+    def closed(upstream: httpx.Response):
+        release()
+        if on_close is not None:
+            on_close(upstream)
+
+    return UpstreamStreamingResponse(response, closed)
+
+
+class UpstreamStreamingResponse(StreamingResponse):
+    """StreamingResponse con el cuerpo de una respuesta abierta de un servicio.
+
+    La respuesta del servicio se cierra y `on_close` se invoca una sola vez al
+    terminar el envío, tanto si el cuerpo se leyó entero como si el cliente se
+    desconectó antes de empezar (el generador del cuerpo no llega a ejecutarse).
+    Quien descarte la respuesta sin enviarla debe llamar a `aclose`.
+    """
+
+    def __init__(self, upstream: httpx.Response, on_close: Callable[[httpx.Response], None]):
+        self.upstream = upstream
+        self._on_close = on_close
+        self._closed = False
+        super().__init__(
+            upstream.aiter_raw(),
+            status_code=upstream.status_code,
+            headers=response_headers(upstream.headers),
+        )
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # También si la petición se cancela: sin cerrar, la conexión y el hueco quedarían ocupados
+            with anyio.CancelScope(shield=True):
+                await self.aclose()
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.upstream.aclose()
+        finally:
+            self._on_close(self.upstream)
+
+
+class UpstreamClients:
+    """Registro de clientes `httpx.AsyncClient` y réplicas, uno por servicio.
+
+    Los clientes se crean en el arranque de la aplicación y se cierran en el
+    apagado, de modo que las conexiones del pool se liberan limpiamente. Los
+    límites del pool se comparten entre las réplicas del servicio. `policies`
+    (ver retries.py) decide timeouts, reintentos y hedging de `send`.
+    """
+
+    def __init__(self, services: Dict[str, List[str]], timeout: float, policies: Dict[str, "RetryPolicy"]):
+        self.services = services
+        self.timeout = timeout
+        self.policies = policies
+        self.pools = {name: ReplicaPool(name, urls) for name, urls in services.items()}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _create(self, service_name: str) -> httpx.AsyncClient:
+        limits = pool_limits(service_name)
+        logger.info(
+            f"upstream pool service={service_name} replicas={','.join(self.services[service_name])} "
+            f"max_connections={limits.max_connections} max_keepalive={limits.max_keepalive_connections}"
+        )
+        return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(self.timeout))
+
+    async def startup(self):
+        for service_name in self.services:
+            if service_name not in self._clients:
+                self._clients[service_name] = self._create(service_name)
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def shutdown(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        clients, self._clients = self._clients, {}
+        for service_name, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error cerrando cliente de {service_name}: {e}")
+
+    def get(self, service_name: str) -> Optional[httpx.AsyncClient]:
+        """Devuelve el cliente del servicio, creándolo bajo demanda si hace falta."""
+        if service_name not in self.services:
+            return None
+        client = self._clients.get(service_name)
+        if client is None or client.is_closed:
+            client = self._create(service_name)
+            self._clients[service_name] = client
+        return client
+
+    def _release(self, service_name: str, replica: Replica, success: Optional[bool]):
+        replica.outstanding -= 1
+        if success is not None:
+            self.pools[service_name].record(replica, success)
+
+    async def send(self, service_name: str, method: str, path: str, **kwargs) -> httpx.Response:
+        """Envía la petición a una réplica del servicio y lee la respuesta completa.
+
+        Los errores de conexión cuentan como fallo de la réplica (chequeo pasivo).
+        Los GET y DELETE pueden reintentarse o duplicarse (hedging) en otra
+        réplica según la política del servicio.
+        Como httpx descomprime el cuerpo al leerlo, se pide `identity` al servicio
+        para no comprimir y descomprimir dentro de la red interna; la compresión
+        hacia el cliente la hace CompressionMiddleware.
+        """
+        kwargs["headers"] = {**(kwargs.get("headers") or {}), "accept-encoding": "identity"}
+        pool = self.pools[service_name]
+
+        async def attempt(tried, timeout: float) -> httpx.Response:
+            replica = pool.pick(exclude=tried)
+            tried.add(replica.url)
+            span = start_span(f"{method} {service_name}/{path}", "client", upstream=replica.url, attempt=len(tried))
+            success = None
+            error = None
+            try:
+                response = await self.get(service_name).request(
+                    method,
+                    f"{replica.url}/{path}",
+                    timeout=timeout,
+                    **{**kwargs, "headers": inject(kwargs["headers"], span)},
+                )
+                span.attrs["status"] = response.status_code
+                success = True
+                return response
+            except httpx.TransportError as e:
+                success = False
+                error = e
+                raise
+            finally:
+                self._release(service_name, replica, success)
+                end_span(span, error)
+
+        return await self.policies[service_name].execute(method, attempt, len(pool.replicas))
+
+    async def open_stream(self, service_name: str, method: str, path: str, **kwargs):
+        """Como `send` pero sin leer el cuerpo. Devuelve `(response, release)`;
+        `release()` debe llamarse al terminar de consumir la respuesta."""
+        replica = self.pools[service_name].pick()
+        client = self.get(service_name)
+        span = start_span(f"{method} {service_name}/{path}", "client", upstream=replica.url, stream=True)
+        kwargs["headers"] = inject(kwargs.get("headers"), span)
+        try:
+            upstream_request = client.build_request(method, f"{replica.url}/{path}", **kwargs)
+            response = await client.send(upstream_request, stream=True)
+        except httpx.TransportError as e:
+            self._release(service_name, replica, False)
+            end_span(span, e)
+            raise
+        except BaseException as e:
+            self._release(service_name, replica, None)
+            end_span(span, e)
+            raise
+        span.attrs["status"] = response.status_code
+
+        def release():
+            self._release(service_name, replica, True)
+            end_span(span)
+
+        return response, release
+
+    async def _check(self, service_name: str, replica: Replica, timeout: float):
+        try:
+            response = await self.get(service_name).get(f"{replica.url}/health", timeout=timeout)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        replica.last_check = time.time()
+        self.pools[service_name].record(replica, ok)
+
+    async def _health_loop(self):
+        """Chequeo activo periódico de `/health` en todas las réplicas."""
+        interval = float(os.getenv("GATEWAY_HEALTH_INTERVAL", "5"))
+        timeout = float(os.getenv("GATEWAY_HEALTH_TIMEOUT", "1"))
+        while True:
+            checks = [
+                self._check(service_name, replica, timeout)
+                for service_name, pool in self.pools.items()
+                for replica in pool.replicas
+            ]
+            await asyncio.gather(*checks, return_exceptions=True)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, List[dict]]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
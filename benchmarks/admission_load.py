@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Prueba de carga del control de admisión: reservas frente a una avalancha de navegación.
+
+El servicio falso atiende `GET /restaurantes/` y `POST /reservas/` compartiendo
+una capacidad limitada (`--capacity` peticiones a la vez, `--service-time` cada
+una), como cuando ambos servicios comparten la misma base de datos. Se lanza
+una avalancha de GET de navegación (bucle cerrado, `--browse-concurrency`) y a
+la vez reservas a ritmo fijo (`--booking-rate` por segundo), y se mide la
+latencia de las reservas.
+
+Uso:
+  # 1) Servicio falso (puerto 9001)
+  python3 benchmarks/admission_load.py upstream --port 9001
+
+  # 2) Gateway apuntando al servicio falso, sin caché para que la navegación llegue al servicio
+  cd api-gateway && RESTAURANTES_SERVICE_URL=http://127.0.0.1:9001 RESERVAS_SERVICE_URL=http://127.0.0.1:9001 \
+      GATEWAY_CACHE_TTLS= GATEWAY_MAX_IN_FLIGHT=10000 GATEWAY_ADMISSION_MAX_CONCURRENCY=16 \
+      uvicorn main:app --port 8000
+  #    (GATEWAY_ADMISSION_MAX_CONCURRENCY=100000 para comparar sin control de admisión)
+
+  # 3) Carga
+  python3 benchmarks/admission_load.py load --gateway http://127.0.0.1:8000 --duration 15
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+
+def run_upstream(port: int, capacity: int, service_time: float):
+    import uvicorn
+    from fastapi import FastAPI, Request
+
+    app = FastAPI(title="Upstream falso con capacidad compartida")
+    slots = None
+
+    async def work():
+        nonlocal slots
+        if slots is None:
+            slots = asyncio.Semaphore(capacity)
+        async with slots:
+            await asyncio.sleep(service_time)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/restaurantes/")
+    async def restaurantes():
+        await work()
+        return [{"id": i, "nombre": f"Restaurante {i}"} for i in range(10)]
+
+    @app.post("/reservas/")
+    async def reservas(request: Request):
+        await request.body()
+        await work()
+        return {"id": random.randint(1, 10**6), "estado": "pendiente"}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _summary(name: str, values, shed: int, errors: int) -> str:
+    if not values:
+        return f"  {name:>8}: n=0 descartadas={shed} errores={errors}"
+    return (
+        f"  {name:>8}: n={len(values)} p50={statistics.median(values) * 1000:.1f}ms "
+        f"p99={_percentile(values, 99) * 1000:.1f}ms descartadas={shed} errores={errors}"
+    )
+
+
+async def run_load(gateway: str, browse_concurrency: int, booking_rate: float, duration: float):
+    import httpx
+
+    latencies = {"browse": [], "booking": []}
+    shed = {"browse": 0, "booking": 0}
+    errors = {"browse": 0, "booking": 0}
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=browse_concurrency + 200, max_keepalive_connections=browse_concurrency + 200)
+
+    async with httpx.AsyncClient(base_url=gateway, limits=limits, timeout=30) as client:
+        async def call(kind: str, send):
+            start = time.perf_counter()
+            try:
+                resp = await send()
+            except httpx.HTTPError:
+                errors[kind] += 1
+                return
+            if resp.status_code == 503:
+                shed[kind] += 1
+            elif resp.status_code >= 400:
+                errors[kind] += 1
+            else:
+                latencies[kind].append(time.perf_counter() - start)
+
+        async def browse_worker():
+            while time.perf_counter() < deadline:
+                # Query distinta para que no se unan en una sola llamada (single-flight)
+                await call("browse", lambda: client.get("/api/v1/restaurantes/restaurantes/", params={"r": random.random()}))
+
+        async def bookings():
+            pending = []
+            while time.perf_counter() < deadline:
+                body = {"restaurante_id": 1, "nombre_cliente": "Carga", "personas": 2}
+                pending.append(asyncio.create_task(call("booking", lambda: client.post("/api/v1/reservas/reservas/", json=body))))
+                await asyncio.sleep(1 / booking_rate)
+            await asyncio.gather(*pending)
+
+        await asyncio.gather(bookings(), *(browse_worker() for _ in range(browse_concurrency)))
+
+    print(f"gateway={gateway} browse_concurrency={browse_concurrency} booking_rate={booking_rate}/s duration={duration}s")
+    print(_summary("reservas", latencies["booking"], shed["booking"], errors["booking"]))
+    print(_summary("browse", latencies["browse"], shed["browse"], errors["browse"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    up = sub.add_parser("upstream", help="Servir el servicio falso")
+    up.add_argument("--port", type=int, default=9001)
+    up.add_argument("--capacity", type=int, default=8)
+    up.add_argument("--service-time", type=float, default=0.01)
+
+    load = sub.add_parser("load", help="Generar carga contra el gateway")
+    load.add_argument("--gateway", default="http://127.0.0.1:8000")
+    load.add_argument("--browse-concurrency", type=int, default=200)
+    load.add_argument("--booking-rate", type=float, default=20)
+    load.add_argument("--duration", type=float, default=15)
+
+    args = parser.parse_args()
+    if args.command == "upstream":
+        run_upstream(args.port, args.capacity, args.service_time)
+    else:
+        asyncio.run(run_load(args.gateway, args.browse_concurrency, args.booking_rate, args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Mide el ahorro de bytes y latencia del GET condicional (ETag / 304) en polling.
+
+Simula el panel del propietario: pide la misma URL repetidamente, primero sin
+`If-None-Match` (descarga completa en cada tick) y después reenviando el último
+ETag recibido, como hace el navegador.
+
+Uso:
+  python3 benchmarks/conditional_polling.py \
+      --url http://127.0.0.1:8000/api/v1/reservas/reservas/ --polls 200
+"""
+import argparse
+import statistics
+import time
+
+import httpx
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def poll(client: httpx.Client, url: str, polls: int, conditional: bool):
+    etag = None
+    downloaded = 0
+    latencies = []
+    not_modified = 0
+    for _ in range(polls):
+        headers = {"If-None-Match": etag} if conditional and etag else {}
+        start = time.perf_counter()
+        resp = client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        downloaded += resp.num_bytes_downloaded
+        if resp.status_code == 304:
+            not_modified += 1
+        etag = resp.headers.get("etag", etag)
+    return downloaded, latencies, not_modified
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--polls", type=int, default=200)
+    args = parser.parse_args()
+
+    with httpx.Client(timeout=30) as client:
+        client.get(args.url)  # calentar conexión y cachés
+        for conditional in (False, True):
+            downloaded, latencies, not_modified = poll(client, args.url, args.polls, conditional)
+            label = "If-None-Match" if conditional else "sin ETag"
+            print(
+                f"{label:>14}: bytes={downloaded} ({downloaded / args.polls:.0f}/poll) "
+                f"304={not_modified} p50={statistics.median(latencies) * 1000:.2f}ms "
+                f"p99={_percentile(latencies, 99) * 1000:.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Benchmark de throughput del API Gateway con servicios rápidos y lentos.
+
+Levanta un servicio falso con dos rutas (`/fast` responde inmediatamente y
+`/slow` tarda `--slow-delay` segundos) y lanza carga concurrente contra el
+gateway, que debe apuntar a ese servicio falso.
+
+Uso:
+  # 1) Servicio falso (puerto 9001)
+  python3 benchmarks/gateway_throughput.py upstream --port 9001
+
+  # 2) Gateway apuntando al servicio falso
+  cd api-gateway && RESTAURANTES_SERVICE_URL=http://127.0.0.1:9001 \
+      uvicorn main:app --port 8000 --workers 1
+
+  # 3) Carga: 50 clientes concurrentes durante 10s, 20% de peticiones lentas
+  python3 benchmarks/gateway_throughput.py load --gateway http://127.0.0.1:8000 \
+      --concurrency 50 --duration 10 --slow-ratio 0.2
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+
+def run_upstream(port: int, slow_delay: float):
+    import uvicorn
+    from fastapi import FastAPI
+
+    app = FastAPI(title="Upstream falso")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/fast")
+    async def fast():
+        return {"items": list(range(20))}
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(slow_delay)
+        return {"items": list(range(20))}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run_load(gateway: str, service: str, concurrency: int, duration: float, slow_ratio: float):
+    import httpx
+
+    latencies = {"fast": [], "slow": []}
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=gateway, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                kind = "slow" if random.random() < slow_ratio else "fast"
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(f"/api/v1/{service}/{kind}")
+                    if resp.status_code >= 400:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies[kind].append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    total = len(latencies["fast"]) + len(latencies["slow"])
+    print(f"gateway={gateway} concurrency={concurrency} duration={duration}s slow_ratio={slow_ratio}")
+    print(f"  throughput: {total / duration:.1f} req/s  (errores: {errors})")
+    for kind in ("fast", "slow"):
+        values = latencies[kind]
+        if not values:
+            continue
+        print(
+            f"  {kind:>4}: n={len(values)} p50={statistics.median(values) * 1000:.1f}ms "
+            f"p99={_percentile(values, 99) * 1000:.1f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    up = sub.add_parser("upstream", help="Servir el servicio falso")
+    up.add_argument("--port", type=int, default=9001)
+    up.add_argument("--slow-delay", type=float, default=0.5)
+
+    load = sub.add_parser("load", help="Generar carga contra el gateway")
+    load.add_argument("--gateway", default="http://127.0.0.1:8000")
+    load.add_argument("--service", default="restaurantes", help="Nombre del servicio en SERVICES")
+    load.add_argument("--concurrency", type=int, default=50)
+    load.add_argument("--duration", type=float, default=10)
+    load.add_argument("--slow-ratio", type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == "upstream":
+        run_upstream(args.port, args.slow_delay)
+    else:
+        asyncio.run(run_load(args.gateway, args.service, args.concurrency, args.duration, args.slow_ratio))
+
+
+if __name__ == "__main__":
+    main()
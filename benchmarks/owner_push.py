@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Panel del propietario con muchos suscriptores: polling frente a push (SSE).
+
+Abre `--subscribers` clientes repartidos entre los restaurantes de
+`--restaurantes` y, mientras tanto, crea una reserva cada `--write-interval`
+segundos. Mide cuánto tarda cada cliente en ver cada reserva nueva y cuántas
+peticiones y bytes llegan al servicio:
+
+- poll: cada cliente relee todas las reservas de su restaurante cada `--interval`
+  segundos (`GET /reservas/?restaurante_id=..&cursor=`), como el polling del panel
+- sse: cada cliente abre su propio `GET /reservas/cambios/stream?restaurante_id=..`
+- hub: una sola conexión al stream repartida entre los clientes, como hace el
+  frontend (`frontend/cambios.py`)
+
+Uso:
+  python3 benchmarks/owner_push.py --url http://127.0.0.1:8003 --subscribers 500 --duration 30
+  # a través del gateway
+  python3 benchmarks/owner_push.py --url http://127.0.0.1:8000/api/v1/reservas --subscribers 500
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import asyncio
+import argparse
+import statistics
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend"))
+
+
+class Stats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.created = {}  # id -> instante de creación
+        self.seen = {}  # (cliente, id) -> instante en que lo vio
+        self.lock = threading.Lock()
+
+    def see(self, client: int, reserva_id: int):
+        with self.lock:
+            self.seen.setdefault((client, reserva_id), time.perf_counter())
+
+    def latencies(self, clients_of):
+        samples = []
+        missing = 0
+        for reserva_id, (restaurante_id, created) in self.created.items():
+            for client in clients_of[restaurante_id]:
+                seen = self.seen.get((client, reserva_id))
+                if seen is None:
+                    missing += 1
+                else:
+                    samples.append(max(0.0, seen - created))
+        return samples, missing
+
+
+async def writer(client, url, restaurantes, stats, args, stop):
+    import httpx
+
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=random.randint(400, 4000))
+    run = random.randint(0, 10**6)
+    n = 0
+    while not stop.is_set():
+        restaurante_id = random.choice(restaurantes)
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post(f"{url}/reservas/", json={
+                "cliente_nombre": "Push",
+                "cliente_email": f"push{run}-{n}@example.com",
+                "restaurante_id": restaurante_id,
+                "fecha_reserva": (start + timedelta(hours=n)).isoformat(),
+                "numero_personas": 2,
+            })
+        except httpx.HTTPError:
+            resp = None
+        if resp is not None and resp.status_code == 200:
+            stats.created[resp.json()["id"]] = (restaurante_id, t0)
+        else:
+            stats.errors += 1
+        n += 1
+        try:
+            await asyncio.wait_for(stop.wait(), args.write_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def poller(client, url, i, restaurante_id, stats, args, stop):
+    import httpx
+
+    # Arranques escalonados, como navegadores que abren el panel en momentos distintos
+    await asyncio.sleep(random.random() * args.interval)
+    while not stop.is_set():
+        cursor = ""
+        while cursor is not None:
+            stats.requests += 1
+            try:
+                resp = await client.get(f"{url}/reservas/", params={
+                    "restaurante_id": restaurante_id, "cursor": cursor, "limit": 100,
+                })
+                resp.raise_for_status()
+            except httpx.HTTPError:
+                # Servicio saturado: se cuenta y se reintenta en la siguiente vuelta
+                stats.errors += 1
+                break
+            stats.bytes += len(resp.content)
+            page = resp.json()
+            for r in page["items"]:
+                stats.see(i, r["id"])
+            cursor = page.get("next_cursor")
+        try:
+            await asyncio.wait_for(stop.wait(), args.interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def subscriber(client, url, i, restaurante_id, stats, stop):
+    stats.requests += 1
+    async with client.stream("GET", f"{url}/reservas/cambios/stream",
+                             params={"restaurante_id": restaurante_id},
+                             headers={"Accept": "text/event-stream"}) as resp:
+        async for line in resp.aiter_lines():
+            stats.bytes += len(line) + 1
+            if line.startswith("data:"):
+                for r in json.loads(line[5:])["items"]:
+                    stats.see(i, r["id"])
+            if stop.is_set():
+                break
+
+
+def hub_subscribers(url, assignment, stats, stop):
+    from cambios import ChangeHub
+
+    hub = ChangeHub(f"{url}/reservas/cambios/stream")
+    stats.requests += 1
+
+    def consume(i, sub):
+        while not stop.is_set():
+            try:
+                cambios = sub.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            for r in (cambios or {}).get("items", []):
+                stats.see(i, r["id"])
+        hub.unsubscribe(sub)
+
+    threads = []
+    for i, restaurante_id in enumerate(assignment):
+        t = threading.Thread(target=consume, args=(i, hub.subscribe([restaurante_id])), daemon=True)
+        t.start()
+        threads.append(t)
+    return hub, threads
+
+
+async def run(args):
+    import httpx
+
+    restaurantes = [int(r) for r in args.restaurantes.split(",")]
+    assignment = [restaurantes[i % len(restaurantes)] for i in range(args.subscribers)]
+    clients_of = {r: [i for i, a in enumerate(assignment) if a == r] for r in restaurantes}
+    stats = Stats()
+    stop = asyncio.Event()
+    thread_stop = threading.Event()
+    limits = httpx.Limits(max_connections=args.subscribers + 10, max_keepalive_connections=args.subscribers + 10)
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(30, read=None), limits=limits) as client:
+        tasks = []
+        hub = None
+        if args.mode == "poll":
+            tasks = [asyncio.create_task(poller(client, args.url, i, r, stats, args, stop)) for i, r in enumerate(assignment)]
+        elif args.mode == "sse":
+            tasks = [asyncio.create_task(subscriber(client, args.url, i, r, stats, stop)) for i, r in enumerate(assignment)]
+        else:
+            hub, _ = hub_subscribers(args.url, assignment, stats, thread_stop)
+        await asyncio.sleep(2)  # conexiones y primera lectura
+
+        with httpx.Client(timeout=30) as counter:
+            def metrics_count():
+                try:
+                    text = counter.get(f"{args.metrics_url}").text
+                except Exception:
+                    return None
+                return sum(float(l.rsplit(" ", 1)[1]) for l in text.splitlines()
+                           if l.startswith("http_requests_total{") and "/metrics" not in l)
+
+            before = metrics_count() if args.metrics_url else None
+            bytes_before, requests_before, errors_before = stats.bytes, stats.requests, stats.errors
+            t0 = time.perf_counter()
+            async with httpx.AsyncClient(timeout=30) as wclient:
+                wtask = asyncio.create_task(writer(wclient, args.url, restaurantes, stats, args, stop))
+                await asyncio.sleep(args.duration)
+                stop.set()
+                await wtask
+            # Margen para que lleguen los últimos cambios
+            await asyncio.sleep(args.interval if args.mode == "poll" else 1)
+            elapsed = time.perf_counter() - t0
+            after = metrics_count() if args.metrics_url else None
+
+        thread_stop.set()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    samples, missing = stats.latencies(clients_of)
+    samples.sort()
+    writes = len(stats.created)
+    print(f"  modo={args.mode} suscriptores={args.subscribers} reservas creadas={writes} en {elapsed:.1f}s")
+    if samples:
+        p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+        print(f"  latencia hasta verla: p50 {statistics.median(samples) * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms"
+              f" ({len(samples)} entregas, {missing} sin ver)")
+    print(f"  peticiones de lectura de los clientes: {stats.requests - requests_before} "
+          f"({(stats.requests - requests_before) / elapsed:.1f}/s), "
+          f"{(stats.bytes - bytes_before) / elapsed / 1024:.1f} KB/s recibidos, "
+          f"{stats.errors - errors_before} con error")
+    if before is not None and after is not None:
+        print(f"  peticiones atendidas por el servicio: {after - before:.0f} ({(after - before) / elapsed:.1f}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8003")
+    parser.add_argument("--mode", choices=("poll", "sse", "hub"), default="hub")
+    parser.add_argument("--subscribers", type=int, default=200)
+    parser.add_argument("--restaurantes", default="1,2,3")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--interval", type=float, default=10, help="segundos entre lecturas en modo poll")
+    parser.add_argument("--write-interval", type=float, default=0.5)
+    parser.add_argument("--metrics-url", default=None, help="/metrics del servicio para contar sus peticiones")
+    args = parser.parse_args()
+    print(f"url={args.url}")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
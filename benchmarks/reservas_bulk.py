@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Rendimiento de la importación por lotes de reservas frente a una petición por reserva.
+
+Genera `--rows` reservas repartidas en franjas futuras de los restaurantes de
+`--restaurantes` (cada franja recibe `--per-slot` reservas, así que con más de
+RESERVAS_SLOT_CAPACITY algunas se rechazan) y las envía:
+
+- individual: un `POST /reservas/` por reserva, con `--concurrency` en paralelo
+- lote: `POST /reservas/lote` en lotes de `--batch-size`
+
+Uso:
+  python3 benchmarks/reservas_bulk.py --url http://127.0.0.1:8003 --rows 5000 --batch-size 500
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+
+def generate(rows: int, restaurantes, per_slot: int):
+    # Empieza en una fecha al azar lejana para no chocar con ejecuciones anteriores
+    start = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=random.randint(400, 4000))
+    run = random.randint(0, 10**6)
+    items = []
+    slot = 0
+    while len(items) < rows:
+        day, hour = divmod(slot, 11)
+        for restaurante_id in restaurantes:
+            fecha = start + timedelta(days=day, hours=hour)
+            for k in range(per_slot):
+                items.append({
+                    "cliente_nombre": f"Canal {run}",
+                    "cliente_email": f"canal{run}-{len(items)}@example.com",
+                    "restaurante_id": restaurante_id,
+                    "fecha_reserva": (fecha + timedelta(minutes=k)).isoformat(),
+                    "numero_personas": 2,
+                })
+        slot += 1
+    return items[:rows]
+
+
+async def individual(client, url: str, items, concurrency: int):
+    created = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        nonlocal created
+        async with semaphore:
+            resp = await client.post(f"{url}/reservas/", json=item)
+            created += resp.status_code == 200
+
+    await asyncio.gather(*(one(item) for item in items))
+    return created
+
+
+async def bulk(client, url: str, items, batch_size: int):
+    created = 0
+    for first in range(0, len(items), batch_size):
+        resp = await client.post(f"{url}/reservas/lote", json=items[first:first + batch_size])
+        resp.raise_for_status()
+        created += resp.json()["creadas"]
+    return created
+
+
+async def run(args):
+    import httpx
+
+    restaurantes = [int(r) for r in args.restaurantes.split(",")]
+    async with httpx.AsyncClient(timeout=300) as client:
+        for mode in args.modes.split(","):
+            items = generate(args.rows, restaurantes, args.per_slot)
+            t0 = time.perf_counter()
+            if mode == "individual":
+                created = await individual(client, args.url, items, args.concurrency)
+            else:
+                created = await bulk(client, args.url, items, args.batch_size)
+            elapsed = time.perf_counter() - t0
+            print(f"  {mode:>10}: {len(items)} reservas en {elapsed:.2f}s -> {len(items) / elapsed:,.0f} reservas/s "
+                  f"(creadas {created}, rechazadas {len(items) - created})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8003")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--restaurantes", default="1,2,3")
+    parser.add_argument("--per-slot", type=int, default=3)
+    parser.add_argument("--modes", default="individual,lote")
+    args = parser.parse_args()
+    print(f"url={args.url} rows={args.rows} batch_size={args.batch_size} per_slot={args.per_slot}")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Prueba de contención: cientos de reservas simultáneas sobre la misma franja.
+
+Lanza `--bookings` POST en paralelo (todas a la vez, `--concurrency` conexiones)
+contra el mismo restaurante y la misma hora, y comprueba después con
+`GET /reservas/` cuántas reservas activas quedaron en esa franja. Con el
+contador atómico de `ocupacion_franjas` deben crearse exactamente
+`--capacity` reservas (RESERVAS_SLOT_CAPACITY) y el resto recibir 400.
+
+Uso:
+  # contra el servicio de reservas directamente (el gateway limitaría por IP)
+  python3 benchmarks/reservas_contention.py --url http://127.0.0.1:8003/reservas/ \\
+      --restaurante-id 1 --bookings 300
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run(url: str, restaurante_id: int, bookings: int, concurrency: int, capacity: int, slot_minutes: int):
+    import httpx
+
+    # Una hora al azar dentro de un año, alineada al inicio de franja, para no chocar con ejecuciones anteriores
+    base = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=random.randint(30, 365))
+    fecha = base + timedelta(minutes=slot_minutes // 2)
+    status = {}
+    latencies = []
+    errors = 0
+    start_gate = asyncio.Event()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def book(i: int):
+            nonlocal errors
+            body = {
+                "cliente_nombre": f"Carga {i}",
+                "cliente_email": f"carga{i}@example.com",
+                "restaurante_id": restaurante_id,
+                "fecha_reserva": fecha.isoformat(),
+                "numero_personas": 2,
+            }
+            await start_gate.wait()
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post(url, json=body)
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+            status[resp.status_code] = status.get(resp.status_code, 0) + 1
+
+        tasks = [asyncio.create_task(book(i)) for i in range(bookings)]
+        await asyncio.sleep(0.1)
+        t0 = time.perf_counter()
+        start_gate.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+
+        resp = await client.get(url, params={
+            "restaurante_id": restaurante_id,
+            "fecha_inicio": base.isoformat(),
+            "fecha_fin": (base + timedelta(minutes=slot_minutes) - timedelta(seconds=1)).isoformat(),
+            "limit": 100,
+        })
+        resp.raise_for_status()
+        active = [r for r in resp.json() if r["estado"] != "cancelada"]
+
+    print(f"url={url} restaurante={restaurante_id} franja={base.isoformat()} bookings={bookings} concurrency={concurrency}")
+    print(f"  tiempo total: {elapsed:.2f}s ({bookings / elapsed:.0f} peticiones/s)")
+    if latencies:
+        print(f"  latencia: p50={statistics.median(latencies) * 1000:.1f}ms p99={_percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"  respuestas: {dict(sorted(status.items()))} errores de red={errors}")
+    print(f"  reservas activas en la franja: {len(active)} (capacidad {capacity})")
+    if len(active) > capacity:
+        raise SystemExit(f"SOBRERRESERVA: {len(active)} reservas para {capacity} plazas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8003/reservas/")
+    parser.add_argument("--restaurante-id", type=int, default=1)
+    parser.add_argument("--bookings", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--capacity", type=int, default=3, help="RESERVAS_SLOT_CAPACITY del servicio")
+    parser.add_argument("--slot-minutes", type=int, default=60, help="RESERVAS_SLOT_MINUTES del servicio")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.restaurante_id, args.bookings, args.concurrency, args.capacity, args.slot_minutes))
+
+
+if __name__ == "__main__":
+    main()
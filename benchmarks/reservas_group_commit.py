@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Altas de reservas en pico: un commit por petición frente a commit agrupado.
+
+Lanza `--bookings` POST /reservas/ con `--concurrency` clientes en paralelo,
+cada una a una franja distinta (restaurantes de `--restaurantes`, fechas al
+azar) para que la disponibilidad no las rechace. Mide peticiones por segundo,
+latencia p50/p99 y, con `--dsn`, los commits por segundo de la base
+(`xact_commit` de pg_stat_database).
+
+Para comparar, el mismo servicio arrancado dos veces:
+
+  uvicorn main:app --port 8003                              # un commit por petición
+  RESERVAS_GROUP_COMMIT=1 uvicorn main:app --port 8013      # commit agrupado
+
+  python3 benchmarks/reservas_group_commit.py --url http://127.0.0.1:8003/reservas/ \\
+      --dsn postgresql://admin@127.0.0.1:5432/reserva
+  python3 benchmarks/reservas_group_commit.py --url http://127.0.0.1:8013/reservas/ \\
+      --dsn postgresql://admin@127.0.0.1:5432/reserva
+
+`benchmarks/reservas_contention.py` contra el modo agrupado comprueba que la
+capacidad de una franja se sigue respetando con las altas en el mismo lote.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _xact_commit(dsn: str):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def run(args):
+    import httpx
+
+    restaurantes = [int(r) for r in args.restaurantes.split(",")]
+    # Franjas de una hora a partir de un día al azar dentro de diez años: cada reserva en la suya
+    base = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=random.randint(400, 3650))
+    run_id = random.randint(0, 10**6)
+    bodies = [
+        {
+            "cliente_nombre": f"Pico {i}",
+            "cliente_email": f"pico{run_id}-{i}@example.com",
+            "restaurante_id": restaurantes[i % len(restaurantes)],
+            "fecha_reserva": (base + timedelta(hours=i // len(restaurantes))).isoformat(),
+            "numero_personas": 2,
+        }
+        for i in range(args.bookings)
+    ]
+    status = {}
+    latencies = []
+    errors = 0
+    pending = iter(bodies)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            for body in pending:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post(args.url, json=body)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - t0)
+                status[resp.status_code] = status.get(resp.status_code, 0) + 1
+
+        commits_before = _xact_commit(args.dsn) if args.dsn else None
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+        commits_after = _xact_commit(args.dsn) if args.dsn else None
+
+    created = status.get(200, 0)
+    print(f"url={args.url} bookings={args.bookings} concurrency={args.concurrency}")
+    print(f"  tiempo total: {elapsed:.2f}s ({args.bookings / elapsed:.0f} peticiones/s, {created / elapsed:.0f} reservas/s)")
+    if latencies:
+        print(f"  latencia: p50={statistics.median(latencies) * 1000:.1f}ms p99={_percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"  respuestas: {dict(sorted(status.items()))} errores de red={errors}")
+    if commits_before is not None:
+        commits = commits_after - commits_before
+        print(f"  commits en la base: {commits} ({commits / elapsed:.0f}/s, {created / max(commits, 1):.1f} reservas por commit)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8003/reservas/")
+    parser.add_argument("--restaurantes", default="1,2,3")
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--dsn", default=None, help="PostgreSQL del servicio para contar commits (psycopg2)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import requests
 from typing import Any
 from datetime import datetime
 
+from common.tracing import inject, span
+
 # TODO: Define funciones de ayuda que puedan ser útiles en varios microservicios.
 
 def send_request_to_service(url: str, method: str = "GET", data: Any = None):
@@ -20,13 +22,16 @@ def send_request_to_service(url: str, method: str = "GET", data: Any = None):
     Raises:
         requests.exceptions.RequestException: Si la petición falla.
     """
-    try:
-        response = requests.request(method, url, json=data)
-        response.raise_for_status()  # Lanza una excepción si la respuesta es un error
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error en la petición: {e}")
-        raise e
+    # Span `client` y cabecera `traceparent` para enlazar la traza con el servicio destino
+    with span(f"{method} {url}", "client", url=url) as s:
+        try:
+            response = requests.request(method, url, json=data, headers=inject(None, s))
+            s.attrs["status"] = response.status_code
+            response.raise_for_status()  # Lanza una excepción si la respuesta es un error
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Error en la petición: {e}")
+            raise e
 
 
 def format_date(dt_object: datetime):
@@ -0,0 +1,256 @@
+"""Métricas HTTP en formato de exposición de Prometheus (`GET /metrics`).
+
+Compartido por el gateway, los servicios FastAPI y el frontend Flask:
+
+- `http_requests_total{method,route,status}`: contador por código de estado.
+- `http_request_duration_seconds{method,route}`: histograma de latencia.
+- `http_requests_in_flight`: peticiones en curso.
+
+`route` es la plantilla de la ruta (`/reservas/{reserva_id}`), no la URL, para
+que el número de series no crezca con los ids. Las peticiones que no casan con
+ninguna ruta se agrupan en `route="unmatched"`.
+
+Para que el coste por petición sea mínimo no hay locks: cada hilo escribe en su
+propio `_Shard` (en asyncio sólo hay uno) y los shards se suman al servir
+`/metrics`. Los shards de hilos que ya terminaron (el servidor de Flask abre un
+hilo por petición) se acumulan en un shard único bajo lock y se descartan, así
+que su número no crece con el tráfico. Con varios workers de uvicorn cada
+proceso expone sus propias métricas y es Prometheus quien las agrega.
+"""
+import time
+import bisect
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "unmatched"
+
+# Un colector extra devuelve (nombre, tipo, ayuda, [(labels, valor)]).
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class _Shard:
+    """Contadores de un hilo. Sólo ese hilo escribe; `render` sólo lee."""
+
+    def __init__(self, n_buckets: int):
+        self.requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        # (method, route) -> [cuenta por bucket..., +Inf]
+        self.buckets: Dict[Tuple[str, str], List[int]] = {}
+        self.sums: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.in_flight = 0
+        self.n_buckets = n_buckets
+
+    def merge(self, other: "_Shard"):
+        self.in_flight += other.in_flight
+        for key, value in list(other.requests.items()):
+            self.requests[key] += value
+        for key, counts in list(other.buckets.items()):
+            merged = self.buckets.setdefault(key, [0] * len(counts))
+            for i, c in enumerate(counts):
+                merged[i] += c
+        for key, value in list(other.sums.items()):
+            self.sums[key] += value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    def __init__(self, service: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.service = service
+        self.bucket_bounds = tuple(sorted(buckets))
+        self._local = threading.local()
+        # Shards de los hilos vivos, con su hilo, y suma de los de hilos terminados
+        self._shards: Dict[int, Tuple[threading.Thread, _Shard]] = {}
+        self._retired = _Shard(len(self.bucket_bounds) + 1)
+        self._lock = threading.Lock()
+        self._collectors: List[Collector] = []
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard(len(self.bucket_bounds) + 1)
+            self._local.shard = shard
+            with self._lock:
+                self._retire_dead()
+                self._shards[id(shard)] = (threading.current_thread(), shard)
+        return shard
+
+    def _retire_dead(self):
+        """Suma en `_retired` los shards de hilos terminados (con el lock tomado)."""
+        for key, (thread, shard) in list(self._shards.items()):
+            if not thread.is_alive():
+                self._retired.merge(shard)
+                del self._shards[key]
+
+    def shard_count(self) -> int:
+        with self._lock:
+            self._retire_dead()
+            return len(self._shards)
+
+    def started(self):
+        self._shard().in_flight += 1
+
+    def finished(self, method: str, route: str, status: int, seconds: float):
+        shard = self._shard()
+        shard.in_flight -= 1
+        shard.requests[(method, route, str(status))] += 1
+        key = (method, route)
+        counts = shard.buckets.get(key)
+        if counts is None:
+            counts = shard.buckets[key] = [0] * shard.n_buckets
+        counts[bisect.bisect_left(self.bucket_bounds, seconds)] += 1
+        shard.sums[key] += seconds
+
+    def add_collector(self, collector: Collector):
+        """Registra métricas adicionales que se calculan al servir `/metrics`."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        total = _Shard(len(self.bucket_bounds) + 1)
+        with self._lock:
+            self._retire_dead()
+            total.merge(self._retired)
+            shards = [shard for _, shard in self._shards.values()]
+        for shard in shards:
+            total.merge(shard)
+        requests, buckets, sums, in_flight = total.requests, total.buckets, total.sums, total.in_flight
+
+        service = {"service": self.service}
+        lines = [
+            "# HELP http_requests_total Peticiones HTTP atendidas por ruta y código de estado.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), value in sorted(requests.items()):
+            labels = {**service, "method": method, "route": route, "status": status}
+            lines.append(f"http_requests_total{_labels(labels)} {value}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Latencia de las peticiones HTTP por ruta.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        bounds = self.bucket_bounds + (float("inf"),)
+        for (method, route), counts in sorted(buckets.items()):
+            labels = {**service, "method": method, "route": route}
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                bucket_labels = {**labels, "le": _number(bound)}
+                lines.append(f"http_request_duration_seconds_bucket{_labels(bucket_labels)} {cumulative}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(labels)} {sums[(method, route)]!r}")
+            lines.append(f"http_request_duration_seconds_count{_labels(labels)} {cumulative}")
+
+        lines += [
+            "# HELP http_requests_in_flight Peticiones HTTP en curso.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight{_labels(service)} {in_flight}",
+        ]
+
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels({**service, **labels})} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide cada petición HTTP.
+
+    `route_label(scope, template)` permite concretar la plantilla, p. ej. el
+    gateway sustituye `{service_name}` por el servicio destino.
+    """
+
+    def __init__(self, app, metrics: Metrics, route_label: Optional[Callable[[dict, str], str]] = None):
+        self.app = app
+        self.metrics = metrics
+        self.route_label = route_label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+        self.metrics.started()
+
+        async def wrapped_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            # El router de FastAPI deja la ruta resuelta en el scope
+            route = scope.get("route")
+            template = getattr(route, "path", None) or UNMATCHED_ROUTE
+            if self.route_label is not None and template != UNMATCHED_ROUTE:
+                template = self.route_label(scope, template)
+            self.metrics.finished(scope["method"], template, status, time.perf_counter() - start)
+
+
+def instrument_fastapi(app, service: str, route_label: Optional[Callable[[dict, str], str]] = None) -> Metrics:
+    """Añade el middleware de métricas y `GET /metrics` a una app FastAPI/Starlette."""
+    from starlette.responses import Response
+
+    metrics = Metrics(service)
+    app.add_middleware(MetricsMiddleware, metrics=metrics, route_label=route_label)
+
+    async def metrics_endpoint():
+        return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+    return metrics
+
+
+def instrument_flask(app, service: str) -> Metrics:
+    """Equivalente para Flask: hooks before/teardown y `GET /metrics`."""
+    from flask import Response, g, request
+
+    metrics = Metrics(service)
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        metrics.started()
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        start = g.pop("_metrics_start", None)
+        if start is None:
+            return
+        status = 500 if exc is not None else g.pop("_metrics_status", 500)
+        rule = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        metrics.finished(request.method, rule, status, time.perf_counter() - start)
+
+    @app.route("/metrics")
+    def _metrics_endpoint():
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+    return metrics
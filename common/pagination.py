@@ -0,0 +1,62 @@
+"""Paginación por cursor (keyset) para los listados de los servicios.
+
+En lugar de `OFFSET n`, que recorre y descarta n filas y se desplaza si se
+insertan filas mientras se pagina, cada página continúa a partir de la clave de
+la última fila devuelta:
+
+    WHERE (fecha_reserva, id) > (:fecha, :id) ORDER BY fecha_reserva, id LIMIT :n
+
+Con un índice sobre esas columnas el coste de una página no depende de su
+profundidad. El cursor es opaco para el cliente (JSON en base64 URL-safe con los
+valores de la clave) y sólo sirve con el mismo orden que lo generó.
+"""
+import json
+import base64
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[Callable[[Any], Any]]) -> Tuple[Any, ...]:
+    """Valores de la clave del cursor convertidos con `types`. ValueError si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor inválido") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Cursor inválido")
+    try:
+        return tuple(t(v) for t, v in zip(types, values))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def keyset_page(query, columns: Sequence, types: Sequence[Callable[[Any], Any]], cursor: Optional[str], limit: int):
+    """Una página de `query` ordenada por `columns` a partir de `cursor` ("" o None: la primera).
+
+    Devuelve (filas, next_cursor); next_cursor es None en la última página.
+    """
+    if cursor:
+        values = decode_cursor(cursor, types)
+        if len(columns) == 1:
+            query = query.filter(columns[0] > values[0])
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+    # Una fila de más indica si hay página siguiente sin un COUNT aparte
+    rows: List = query.order_by(*columns).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, c.key) for c in columns])
+
+
+def parse_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value)
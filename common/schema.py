@@ -0,0 +1,27 @@
+"""Versión del esquema registrada por las migraciones (scripts/migrations.py).
+
+Los servicios declaran la versión mínima que necesitan. Si la base ya la tiene,
+el arranque se salta `create_all` y la inspección de columnas; si no (base
+de desarrollo sin migrar), conservan su comportamiento anterior.
+"""
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def schema_version(engine) -> Optional[int]:
+    """Versión aplicada, o None si la tabla `schema_migrations` no existe o no se puede leer."""
+    try:
+        with engine.connect() as conn:
+            return conn.exec_driver_sql("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").scalar()
+    except Exception:
+        return None
+
+
+def schema_is_current(engine, required: int) -> bool:
+    version = schema_version(engine)
+    if version is not None and version >= required:
+        logger.info(f"Esquema en la versión {version} (se requiere {required}): sin introspección")
+        return True
+    return False
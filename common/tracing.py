@@ -0,0 +1,353 @@
+"""Trazas distribuidas mínimas con contexto W3C (`traceparent`).
+
+Cada petición que entra en el frontend, el gateway o un servicio abre un span
+`server`; las llamadas salientes (`request_api`, gateway -> servicio,
+`send_request_to_service`) abren un span `client` y envían su contexto en la
+cabecera `traceparent`, y las consultas SQL un span `db`. Todos los spans de
+una página comparten el mismo `trace_id`, que se devuelve al cliente en
+`X-Request-ID`.
+
+Exportación:
+
+- En memoria: los últimos TRACE_BUFFER_SIZE spans (2000). Con
+  TRACE_ENDPOINT_ENABLED=1 se consultan en `GET /traces/{trace_id}` de cada
+  aplicación; está desactivado por defecto porque no tiene autenticación y
+  los spans incluyen rutas y sentencias SQL.
+- Fichero (opcional): si TRACE_FILE está definido, un JSON por línea. Lo
+  escribe un hilo aparte desde una cola acotada (TRACE_QUEUE_SIZE, 10000; si
+  se llena se descartan spans en lugar de frenar las peticiones) y el fichero
+  rota al pasar de TRACE_FILE_MAX_BYTES (50 MB) conservando TRACE_FILE_BACKUPS
+  copias (`.1`, `.2`...). Con los ficheros de todos los servicios
+  `scripts/trace_waterfall.py` reconstruye la cascada.
+
+TRACING_ENABLED=0 lo desactiva (las cabeceras entrantes se siguen propagando).
+"""
+import os
+import json
+import time
+import queue
+import logging
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() in ("1", "true", "yes")
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
+TRACE_ENDPOINT_ENABLED = os.getenv("TRACE_ENDPOINT_ENABLED", "0").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+# Longitud máxima de las sentencias SQL guardadas en los spans `db`.
+MAX_STATEMENT_LENGTH = 300
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "_t0", "duration_ms", "attrs")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], attrs: dict):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.attrs = attrs
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "service": _service,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+        }
+
+
+_service = "unknown"
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_buffer: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+_exporter: Optional["FileExporter"] = None
+
+
+class FileExporter:
+    """Escribe los spans en JSONL desde un hilo propio, rotando el fichero por tamaño.
+
+    `export()` sólo encola: las peticiones no esperan al disco. Con la cola llena
+    el span se descarta y se cuenta en `dropped`.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int, queue_size: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=queue_size)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: dict):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0):
+        """Espera a que se escriba lo encolado (pruebas y parada)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Lo ya encolado se escribe de una vez
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._file.write("".join(json.dumps(s, default=str) + "\n" for s in batch))
+                self._file.flush()
+                if self.max_bytes and self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except Exception as e:
+                logger.warning(f"No se pudieron escribir {len(batch)} spans en {self.path}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{i}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "w", encoding="utf-8")
+
+
+def configure(service: str):
+    """Nombre del servicio en los spans y arranque del exportador a fichero."""
+    global _service, _exporter
+    _service = service
+    if TRACE_FILE and _exporter is None:
+        _exporter = FileExporter(TRACE_FILE, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUPS, TRACE_QUEUE_SIZE)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """`00-<trace_id>-<span_id>-<flags>` -> (trace_id, span_id), o None si no es válido."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, kind: str, parent: Optional[Tuple[str, str]] = None, **attrs) -> Span:
+    """Crea un span hijo de `parent` (o del span actual; si no hay, abre una traza nueva).
+
+    No lo convierte en span actual: para eso está `span()`.
+    """
+    if parent is None:
+        current = _current.get()
+        if current is not None:
+            parent = (current.trace_id, current.span_id)
+    if parent is None:
+        return Span(name, kind, secrets.token_hex(16), None, attrs)
+    return Span(name, kind, parent[0], parent[1], attrs)
+
+
+def end_span(span: Span, error: Optional[BaseException] = None):
+    span.duration_ms = round((time.perf_counter() - span._t0) * 1000, 3)
+    if error is not None:
+        span.attrs["error"] = repr(error)
+    if not TRACING_ENABLED:
+        return
+    _buffer.append(span)
+    if _exporter is not None:
+        _exporter.export(span.to_dict())
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", parent: Optional[Tuple[str, str]] = None, **attrs):
+    """Context manager que abre un span y lo deja como actual mientras dura."""
+    s = start_span(name, kind, parent, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        end_span(s, e)
+        raise
+    else:
+        end_span(s)
+    finally:
+        _current.reset(token)
+
+
+def inject(headers: Optional[Dict[str, str]], s: Optional[Span] = None) -> Dict[str, str]:
+    """Copia de `headers` con el `traceparent` de `s` (o del span actual)."""
+    headers = dict(headers or {})
+    s = s or _current.get()
+    if s is not None:
+        headers["traceparent"] = s.traceparent()
+    return headers
+
+
+def spans_for(trace_id: str) -> List[dict]:
+    return [s.to_dict() for s in list(_buffer) if s.trace_id == trace_id]
+
+
+class TracingMiddleware:
+    """Middleware ASGI: un span `server` por petición y `X-Request-ID` en la respuesta.
+
+    `route_label(scope, template)` concreta el nombre del span, igual que en
+    `common.metrics.MetricsMiddleware`.
+    """
+
+    def __init__(self, app, route_label: Optional[Callable[[dict, str], str]] = None):
+        self.app = app
+        self.route_label = route_label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with span(
+            f"{scope['method']} {scope['path']}",
+            "server",
+            parent=parse_traceparent(traceparent),
+            path=scope["path"],
+        ) as s:
+
+            async def wrapped_send(message):
+                if message["type"] == "http.response.start":
+                    s.attrs["status"] = message["status"]
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-request-id", s.trace_id.encode("latin-1"))
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, wrapped_send)
+            finally:
+                template = getattr(scope.get("route"), "path", None)
+                if template:
+                    if self.route_label is not None:
+                        template = self.route_label(scope, template)
+                    s.name = f"{scope['method']} {template}"
+
+
+def trace_fastapi(app, service: str, route_label: Optional[Callable[[dict, str], str]] = None):
+    """Activa las trazas en una app FastAPI y, con TRACE_ENDPOINT_ENABLED, `GET /traces/{trace_id}`."""
+    configure(service)
+    app.add_middleware(TracingMiddleware, route_label=route_label)
+    if not TRACE_ENDPOINT_ENABLED:
+        return
+
+    async def traces_endpoint(trace_id: str):
+        return spans_for(trace_id)
+
+    app.add_api_route("/traces/{trace_id}", traces_endpoint, methods=["GET"], include_in_schema=False)
+
+
+def trace_flask(app, service: str):
+    """Equivalente para Flask: span `server` por petición y, con TRACE_ENDPOINT_ENABLED, `GET /traces/<trace_id>`."""
+    from flask import g, jsonify, request
+
+    configure(service)
+
+    @app.before_request
+    def _trace_start():
+        s = start_span(
+            f"{request.method} {request.path}",
+            "server",
+            parent=parse_traceparent(request.headers.get("traceparent")),
+            path=request.path,
+        )
+        g._trace_span = s
+        g._trace_token = _current.set(s)
+
+    @app.after_request
+    def _trace_status(response):
+        s = g.get("_trace_span")
+        if s is not None:
+            s.attrs["status"] = response.status_code
+            response.headers["X-Request-ID"] = s.trace_id
+        return response
+
+    @app.teardown_request
+    def _trace_finish(exc):
+        s = g.pop("_trace_span", None)
+        if s is None:
+            return
+        if request.url_rule is not None:
+            s.name = f"{request.method} {request.url_rule.rule}"
+        end_span(s, exc)
+        _current.reset(g.pop("_trace_token"))
+
+    if TRACE_ENDPOINT_ENABLED:
+
+        @app.route("/traces/<trace_id>")
+        def _traces_endpoint(trace_id):
+            return jsonify(spans_for(trace_id))
+
+
+def trace_sqlalchemy(engine):
+    """Un span `db` por sentencia SQL ejecutada dentro de una petición trazada."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+            context._trace_span = start_span(f"db {verb}", "db", statement=statement[:MAX_STATEMENT_LENGTH])
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        s = getattr(context, "_trace_span", None)
+        if s is not None:
+            context._trace_span = None
+            s.attrs["rows"] = cursor.rowcount
+            end_span(s)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        s = getattr(context, "_trace_span", None) if context is not None else None
+        if s is not None:
+            context._trace_span = None
+            end_span(s, exception_context.original_exception)
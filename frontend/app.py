@@ -1,16 +1,76 @@
 # /frontend/app.py
 
-from flask import Flask, render_template, flash, request, redirect, url_for, jsonify, session
+from flask import (
+    Flask, Response, render_template, flash, request, redirect, url_for, jsonify, session, has_request_context,
+)
 import os
+import json
+import time
+import uuid
+import queue
 import requests
 from datetime import datetime, timedelta
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él sólo se ofrece gzip
+    brotli = None
+
+from cambios import ChangeHub
+from common.metrics import instrument_flask
+from common.tracing import inject, span, trace_flask
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret")
 
+# Métricas Prometheus en /metrics (latencia por ruta, códigos de estado, en curso)
+instrument_flask(app, "frontend")
+
+# Trazas: span por página y por llamada al gateway, que recibe el `traceparent`
+trace_flask(app, "frontend")
+
 API_GATEWAY_URL = os.getenv("API_GATEWAY_URL", "http://localhost:8000")
 API_PREFIX = "/api/v1"  # Prefijo del gateway
 
+# Compresión de respuestas (páginas HTML y JSON de polling)
+COMPRESS_MIN_SIZE = int(os.getenv("FRONTEND_COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("FRONTEND_COMPRESS_LEVEL", "6"))
+COMPRESSIBLE_MIMETYPES = {"text/html", "text/css", "text/plain", "application/json", "application/javascript"}
+
+# Páginas máximas que request_api_all lee de un listado (100 filas cada una)
+MAX_LIST_PAGES = int(os.getenv("FRONTEND_MAX_LIST_PAGES", "50"))
+
+# Reintentos de las peticiones con Idempotency-Key ante fallos de red o 502/503/504:
+# el gateway y el servicio devuelven la respuesta original si la primera llegó a ejecutarse
+IDEMPOTENT_RETRIES = int(os.getenv("FRONTEND_IDEMPOTENT_RETRIES", "2"))
+RETRYABLE_STATUS = (502, 503, 504)
+
+# Horas de reserva que se ofrecen en el formulario (primera y última, incluidas)
+HORA_APERTURA = 12
+HORA_CIERRE = 22
+
+# Push de cambios al panel del propietario (SSE). Desactivado, el panel hace polling.
+SSE_ENABLED = os.getenv("FRONTEND_SSE_ENABLED", "1").lower() in ("1", "true", "yes")
+SSE_HEARTBEAT = float(os.getenv("FRONTEND_SSE_HEARTBEAT", "15"))
+# Cada panel conectado ocupa un hilo del servidor: por encima del límite, polling
+SSE_MAX_SUBSCRIBERS = int(os.getenv("FRONTEND_SSE_MAX_SUBSCRIBERS", "100"))
+
+# Una sola suscripción al stream de cambios de reservas para todos los paneles (ver cambios.py)
+change_hub = ChangeHub(
+    f"{API_GATEWAY_URL}{API_PREFIX}/reservas/reservas/cambios/stream", max_subscribers=SSE_MAX_SUBSCRIBERS
+)
+
+
+def client_headers(headers: dict = None) -> dict:
+    """Añade X-Forwarded-For con la IP del navegador para que el gateway aplique
+    sus límites por cliente y no al frontend en conjunto."""
+    headers = dict(headers or {})
+    if has_request_context() and request.remote_addr:
+        previous = request.headers.get("X-Forwarded-For")
+        headers["X-Forwarded-For"] = f"{previous}, {request.remote_addr}" if previous else request.remote_addr
+    return headers
+
 
 def request_api(method: str, service: str, path: str, token: str = None, **kwargs):
     """Helper para consumir el API Gateway con reintento automático usando refresh token.
@@ -18,19 +78,40 @@ def request_api(method: str, service: str, path: str, token: str = None, **kwarg
     - Si la respuesta es 401 y existe refresh_token en sesión, intenta un /auth/refresh
       y reintenta la solicitud original una única vez.
     - Si el refresh falla, limpia la sesión y lanza error.
+    - Con `idempotency_key` se envía la cabecera Idempotency-Key y la petición se
+      reintenta ante fallos de red o 502/503/504 (IDEMPOTENT_RETRIES).
     - Retorna JSON (dict/list) o {} si no hay contenido.
     """
     url = f"{API_GATEWAY_URL}{API_PREFIX}/{service}/{path}"
-    headers = kwargs.pop("headers", {})
+    headers = client_headers(kwargs.pop("headers", {}))
     if token:
         headers["Authorization"] = f"Bearer {token}"
     timeout = kwargs.pop("timeout", 6)
+    idempotency_key = kwargs.pop("idempotency_key", None)
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    retries = IDEMPOTENT_RETRIES if idempotency_key else 0
+
+    def _send(current_token):
+        with span(f"{method} {service}/{path}", "client", url=url) as s:
+            local_headers = inject(headers, s)
+            if current_token:
+                local_headers["Authorization"] = f"Bearer {current_token}"
+            resp = requests.request(method, url, headers=local_headers, timeout=timeout, **kwargs)
+            s.attrs["status"] = resp.status_code
+            return resp
 
     def _do_request(current_token):
-        local_headers = dict(headers)
-        if current_token:
-            local_headers["Authorization"] = f"Bearer {current_token}"
-        return requests.request(method, url, headers=local_headers, timeout=timeout, **kwargs)
+        for attempt in range(retries + 1):
+            try:
+                resp = _send(current_token)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == retries:
+                    raise
+            else:
+                if resp.status_code not in RETRYABLE_STATUS or attempt == retries:
+                    return resp
+            time.sleep(0.2 * 2 ** attempt)
 
     try:
         resp = _do_request(token)
@@ -38,7 +119,12 @@ def request_api(method: str, service: str, path: str, token: str = None, **kwarg
             # Intentar refresh
             try:
                 refresh_payload = {"refresh_token": session.get("refresh_token")}
-                r_refresh = requests.post(f"{API_GATEWAY_URL}{API_PREFIX}/auth/refresh", json=refresh_payload, timeout=timeout)
+                r_refresh = requests.post(
+                    f"{API_GATEWAY_URL}{API_PREFIX}/auth/refresh",
+                    json=refresh_payload,
+                    headers=client_headers(),
+                    timeout=timeout,
+                )
                 if r_refresh.status_code == 200:
                     data_refresh = r_refresh.json()
                     # Actualizar sesión
@@ -70,6 +156,98 @@ def request_api(method: str, service: str, path: str, token: str = None, **kwarg
         raise RuntimeError(f"Fallo de red al llamar {url}: {e}") from e
 
 
+def request_api_all(service: str, path: str, params: dict = None, token: str = None, page_size: int = 100):
+    """Recorre un listado paginado por cursor (`cursor`/`next_cursor`) y devuelve todas las filas.
+
+    Como mucho MAX_LIST_PAGES páginas, para no quedarse sin límite en un panel.
+    """
+    items = []
+    cursor = ""
+    for _ in range(MAX_LIST_PAGES):
+        page = request_api(
+            "GET", service, path, token=token,
+            params={**(params or {}), "cursor": cursor, "limit": page_size},
+        )
+        items.extend(page.get("items", []))
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+    return items
+
+
+def request_api_batch(items: list, token: str = None, timeout: float = 6):
+    """Ejecuta varias peticiones al gateway en un solo round-trip (POST /api/v1/batch).
+
+    `items` es una lista de dicts {method, service, path, query, body}. Devuelve la
+    lista de resultados {status, body} en el mismo orden.
+    """
+    if not items:
+        return []
+    headers = client_headers({"Authorization": f"Bearer {token}"} if token else {})
+    try:
+        with span("POST batch", "client", items=len(items)) as s:
+            resp = requests.post(
+                f"{API_GATEWAY_URL}{API_PREFIX}/batch", json=items, headers=inject(headers, s), timeout=timeout
+            )
+            s.attrs["status"] = resp.status_code
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Fallo de red al llamar al batch del gateway: {e}") from e
+    if resp.status_code >= 400:
+        raise RuntimeError(f"Error HTTP {resp.status_code}: {resp.text}")
+    return resp.json().get("results", [])
+
+
+def attach_menus(restaurantes: list):
+    """Añade a cada restaurante su lista de platos (`menu`) con una sola llamada batch."""
+    items = [
+        {"method": "GET", "service": "menu", "path": "platos/", "query": {"restaurante_id": r["id"]}}
+        for r in restaurantes
+    ]
+    try:
+        results = request_api_batch(items)
+    except Exception:
+        results = []
+    for i, r in enumerate(restaurantes):
+        result = results[i] if i < len(results) else None
+        r["menu"] = result["body"] if result and result.get("status", 500) < 400 else []
+
+
+@app.after_request
+def compress_response(response):
+    """Comprime con brotli o gzip según Accept-Encoding si la respuesta lo merece.
+
+    Sólo respuestas 200 de tipos de texto/JSON por encima de COMPRESS_MIN_SIZE.
+    El ETag (p. ej. el de /owner/reservas_json) pasa a ser débil porque cambia la
+    representación, no el contenido; los 304 no se ven afectados.
+    """
+    if response.mimetype in COMPRESSIBLE_MIMETYPES:
+        response.vary.add("Accept-Encoding")
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == "br":
+        body = brotli.compress(body, quality=min(COMPRESS_LEVEL, 11))
+    else:
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
 @app.route("/")
 def index():
     reservas = []
@@ -95,13 +273,8 @@ def restaurantes():
     except Exception as e:
         flash(f"No se pudieron cargar restaurantes: {e}", "error")
 
-    # Para cada restaurante obtener su menú (platos filtrando por restaurante_id)
-    for r in restaurantes:
-        try:
-            platos = request_api("GET", "menu", f"platos/?restaurante_id={r['id']}")
-            r["menu"] = platos
-        except Exception:
-            r["menu"] = []
+    # Menú de todos los restaurantes (platos filtrando por restaurante_id) en un solo batch
+    attach_menus(restaurantes)
 
     return render_template("restaurantes.html", title="Restaurantes", restaurantes=restaurantes)
 
@@ -115,11 +288,7 @@ def menu():
         flash(f"No se pudieron cargar restaurantes: {e}", "error")
         return render_template("menu.html", title="Menú", restaurantes=[])
 
-    for r in restaurantes:
-        try:
-            r["menu"] = request_api("GET", "menu", f"platos/?restaurante_id={r['id']}")
-        except Exception:
-            r["menu"] = []
+    attach_menus(restaurantes)
 
     return render_template("menu.html", title="Menú", restaurantes=restaurantes)
 
@@ -152,7 +321,11 @@ def reservas():
         try:
             token = session.get("access_token")
             # Reservas actualmente no requieren auth, se deja token si existe
-            request_api("POST", "reservas", "reservas/", json=reserva_payload, token=token)
+            # La clave viene del formulario: un doble envío o un reintento no crea otra reserva
+            request_api(
+                "POST", "reservas", "reservas/", json=reserva_payload, token=token,
+                idempotency_key=request.form.get("idempotency_key") or None,
+            )
             flash("¡Reserva creada con éxito!", "success")
             return redirect(url_for("index"))
         except Exception as e:
@@ -167,7 +340,7 @@ def reservas():
 
     fecha_minima = datetime.now().strftime("%Y-%m-%d")
     fecha_maxima = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
-    horas_disponibles = [f"{h:02d}:00" for h in range(12, 23)]
+    horas_disponibles = [f"{h:02d}:00" for h in range(HORA_APERTURA, HORA_CIERRE + 1)]
 
     return render_template("reservas.html",
                            title="Reservas",
@@ -175,7 +348,48 @@ def reservas():
                            fecha_minima=fecha_minima,
                            fecha_maxima=fecha_maxima,
                            horas_disponibles=horas_disponibles,
-                           restaurante_pre=restaurante_pre)
+                           restaurante_pre=restaurante_pre,
+                           idempotency_key=uuid.uuid4().hex)
+
+
+@app.route("/api/horas-disponibles/<int:restaurante_id>")
+@app.route("/api/horas-disponibles/<int:restaurante_id>/<fecha>")
+def horas_disponibles(restaurante_id, fecha=None):
+    """Horas con plazas libres de un restaurante en una fecha (formulario de reservas).
+
+    Una sola llamada a `reservas/disponibilidad` (cacheada en el gateway). Sin
+    fecha se devuelven todas las horas del horario.
+    """
+    horas = [f"{h:02d}:00" for h in range(HORA_APERTURA, HORA_CIERRE + 1)]
+    if fecha is None:
+        return jsonify({"horas": horas, "franjas": []})
+    try:
+        datetime.strptime(fecha, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "Fecha inválida, formato YYYY-MM-DD"}), 400
+
+    try:
+        data = request_api(
+            "GET", "reservas", "reservas/disponibilidad",
+            params={
+                "restaurante_id": restaurante_id,
+                "fecha_inicio": fecha,
+                "hora_inicio": HORA_APERTURA,
+                "hora_fin": HORA_CIERRE,
+            },
+        )
+    except Exception as e:
+        return jsonify({"horas": horas, "franjas": [], "error": str(e)}), 502
+
+    franjas = data["dias"][0]["franjas"] if data.get("dias") else []
+    resp = jsonify({
+        "horas": [f["hora"] for f in franjas if f["libres"] > 0],
+        "franjas": franjas,
+    })
+    # Revalidación con ETag como en /owner/reservas_json: la ocupación cambia con cada reserva
+    resp.add_etag()
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
 
 
 # ------------------ AUTH ------------------
@@ -310,7 +524,7 @@ def owner_dashboard():
     all_reservas = []
     for r in my_restaurants:
         try:
-            reservas = request_api("GET", "reservas", f"reservas/?restaurante_id={r['id']}")
+            reservas = request_api_all("reservas", "reservas/", {"restaurante_id": r["id"]})
             # Mostrar todas las reservas independientemente del estado
             for res in reservas:
                 res["restaurante_nombre"] = r.get("nombre")
@@ -322,7 +536,9 @@ def owner_dashboard():
     # Ordenar por fecha descendente (más recientes primero)
     all_reservas.sort(key=lambda x: x.get("fecha_reserva", ""), reverse=True)
 
-    return render_template("restaurant_panel.html", title="Panel Restaurante", reservas=all_reservas, user=user)
+    return render_template(
+        "restaurant_panel.html", title="Panel Restaurante", reservas=all_reservas, user=user, sse_enabled=SSE_ENABLED
+    )
 
 
 @app.route("/owner/reservas_json")
@@ -352,7 +568,7 @@ def owner_reservas_json():
     all_reservas = []
     for r in my_restaurants:
         try:
-            reservas = request_api("GET", "reservas", f"reservas/?restaurante_id={r['id']}")
+            reservas = request_api_all("reservas", "reservas/", {"restaurante_id": r["id"]})
             for res in reservas:
                 res["restaurante_nombre"] = r.get("nombre")
                 res["restaurante_id"] = r.get("id")
@@ -361,7 +577,65 @@ def owner_reservas_json():
             pass
 
     all_reservas.sort(key=lambda x: x.get("fecha_reserva", ""), reverse=True)
-    return jsonify(all_reservas)
+    # ETag + no-cache: el navegador revalida en cada tick con If-None-Match y
+    # recibe un 304 sin cuerpo cuando no hay cambios.
+    resp = jsonify(all_reservas)
+    resp.add_etag()
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+
+@app.route("/owner/reservas_stream")
+def owner_reservas_stream():
+    """Server-Sent Events con las reservas nuevas o modificadas de los restaurantes del propietario.
+
+    Evento `cambios`: {"items": [...], "eliminadas": [{"id", "restaurante_id", "updated_at"}]}.
+    Evento `resync`: el panel debe recargar el listado completo (`/owner/reservas_json`).
+    Si el push está desactivado o ya hay FRONTEND_SSE_MAX_SUBSCRIBERS paneles
+    conectados responde 503 y el panel sigue con polling.
+    """
+    if not session.get("access_token"):
+        return jsonify({"error": "No autenticado"}), 401
+    if not SSE_ENABLED:
+        return jsonify({"error": "Push de cambios desactivado"}), 503
+
+    token = session.get("access_token")
+    try:
+        user = request_api("GET", "auth", "me", token=token)
+        restaurantes = request_api("GET", "restaurantes", "restaurantes/")
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+
+    owner_email = user.get("email")
+    nombres = {r["id"]: r.get("nombre") for r in restaurantes if r.get("owner_email") == owner_email}
+    subscriber = change_hub.subscribe(nombres)
+    if subscriber is None:
+        return jsonify({"error": "Demasiados paneles conectados"}), 503, {"Retry-After": "60"}
+
+    def eventos():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    cambios = subscriber.queue.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    # Latido: mantiene la conexión y detecta navegadores desconectados
+                    yield ": ping\n\n"
+                    continue
+                if cambios is None:
+                    yield "event: resync\ndata: {}\n\n"
+                    continue
+                for res in cambios["items"]:
+                    res["restaurante_nombre"] = nombres.get(res.get("restaurante_id"))
+                yield f"event: cambios\ndata: {json.dumps(cambios)}\n\n"
+        finally:
+            change_hub.unsubscribe(subscriber)
+
+    return Response(
+        eventos(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/mis-reservas")
@@ -468,6 +742,42 @@ def update_reserva_estado():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/update-reservas", methods=["PUT"])
+def update_reservas_estado():
+    """Endpoint para cambiar el estado de varias reservas en una sola llamada.
+    Acceso: solo restaurantes propietarios de las reservas.
+
+    Payload: {"reserva_ids": [int], "nuevo_estado": str}
+    Respuesta: {"actualizadas", "rechazadas", "resultados": [{"id", "status", "estado", "detail"}]}
+    """
+    if not session.get("access_token"):
+        return jsonify({"error": "No autenticado"}), 401
+
+    if session.get("user_role") != "restaurant":
+        return jsonify({"error": "Solo restaurantes pueden actualizar reservas"}), 403
+
+    data = request.get_json() or {}
+    reserva_ids = data.get("reserva_ids")
+    nuevo_estado = data.get("nuevo_estado")
+
+    if not reserva_ids or not isinstance(reserva_ids, list) or not nuevo_estado:
+        return jsonify({"error": "Faltan parámetros (reserva_ids, nuevo_estado)"}), 400
+
+    try:
+        result = request_api(
+            "PUT",
+            "reservas",
+            "reservas/lote/estado",
+            token=session.get("access_token"),
+            json={"ids": [int(i) for i in reserva_ids], "estado": nuevo_estado.lower()},
+        )
+        return jsonify(result), 200
+    except (TypeError, ValueError):
+        return jsonify({"error": "reserva_ids debe ser una lista de enteros"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
 
@@ -0,0 +1,147 @@
+"""Suscripción compartida al stream de cambios de reservas para el panel del propietario.
+
+El frontend mantiene una sola conexión SSE con `reservas/cambios/stream` (a
+través del gateway), sin filtro de restaurante, y reparte cada evento entre los
+navegadores conectados a `/owner/reservas_stream` según los restaurantes de cada
+propietario. Así la carga sobre el gateway y el servicio no crece con el número
+de paneles abiertos.
+
+Si la conexión se corta se reabre con `Last-Event-ID` (el cursor del último
+evento), de modo que no se pierden cambios. Cuando no queda ningún navegador
+suscrito el hilo cierra la conexión en el siguiente evento o latido.
+
+Con el servidor de Flask cada navegador suscrito ocupa un hilo mientras dura
+el stream, así que `max_subscribers` limita cuántos puede haber a la vez; por
+encima `subscribe()` devuelve None y el panel hace polling.
+"""
+import json
+import queue
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Eventos pendientes por navegador; si se llena, el navegador recarga el listado completo
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscriber:
+    def __init__(self, restaurante_ids: Iterable[int]):
+        self.restaurante_ids: Set[int] = set(restaurante_ids)
+        self.queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+
+class ChangeHub:
+    def __init__(
+        self,
+        url: str,
+        read_timeout: float = 60,
+        headers: Optional[Dict[str, str]] = None,
+        max_subscribers: int = 0,
+    ):
+        self.url = url
+        self.read_timeout = read_timeout
+        self.headers = headers or {}
+        # 0 = sin límite
+        self.max_subscribers = max_subscribers
+        self.subscribers: Set[Subscriber] = set()
+        self.last_event_id: Optional[str] = None
+        self.events = 0
+        self.reconnects = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, restaurante_ids: Iterable[int]) -> Optional[Subscriber]:
+        """Nuevo suscriptor, o None si ya hay `max_subscribers`."""
+        subscriber = Subscriber(restaurante_ids)
+        with self._lock:
+            if self.max_subscribers and len(self.subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            self.subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="reservas-stream", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "max_subscribers": self.max_subscribers,
+            "rejected": self.rejected,
+            "events": self.events,
+            "reconnects": self.reconnects,
+        }
+
+    def _dispatch(self, data: dict):
+        """Entrega a cada navegador sólo los cambios de sus restaurantes."""
+        self.events += 1
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            mine = subscriber.restaurante_ids
+            cambios = {
+                "items": [r for r in data.get("items", []) if r.get("restaurante_id") in mine],
+                "eliminadas": [r for r in data.get("eliminadas", []) if r.get("restaurante_id") in mine],
+            }
+            if not cambios["items"] and not cambios["eliminadas"]:
+                continue
+            try:
+                subscriber.queue.put_nowait(cambios)
+            except queue.Full:
+                # Navegador lento: se vacía su cola y se le pide una recarga completa
+                with subscriber.queue.mutex:
+                    subscriber.queue.queue.clear()
+                subscriber.queue.put_nowait(None)
+
+    def _idle(self) -> bool:
+        with self._lock:
+            if not self.subscribers:
+                self._thread = None
+                return True
+            return False
+
+    def _run(self):
+        backoff = 1.0
+        while not self._idle():
+            headers = {**self.headers, "Accept": "text/event-stream"}
+            if self.last_event_id:
+                headers["Last-Event-ID"] = self.last_event_id
+            try:
+                with requests.get(self.url, headers=headers, stream=True, timeout=(5, self.read_timeout)) as resp:
+                    resp.raise_for_status()
+                    backoff = 1.0
+                    event, data, event_id = None, [], None
+                    for line in resp.iter_lines(decode_unicode=True):
+                        if line:
+                            field, _, value = line.partition(":")
+                            value = value[1:] if value.startswith(" ") else value
+                            if field == "event":
+                                event = value
+                            elif field == "data":
+                                data.append(value)
+                            elif field == "id":
+                                event_id = value
+                            continue
+                        # Línea en blanco: fin de un evento (o de un latido)
+                        if event_id:
+                            self.last_event_id = event_id
+                        if event == "cambios" and data:
+                            self._dispatch(json.loads("\n".join(data)))
+                        event, data, event_id = None, [], None
+                        if self._idle():
+                            return
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.reconnects += 1
+                logger.warning(f"Stream de cambios cortado ({e}); reintento en {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
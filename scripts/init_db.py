@@ -5,6 +5,8 @@ from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from datetime import datetime, timedelta
 import logging
 
+from migrations import FRANJA_RESERVA, RESERVA_ACTIVA, migrate
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -102,6 +104,7 @@ def create_tables():
         """
         )
 
+        # Índices, restricciones y tablas posteriores: migraciones versionadas (migrations.py)
         logger.info("Tablas creadas (si no existían)")
 
         # Intentar consolidar duplicados: reasignar dependencias y eliminar filas duplicadas
@@ -125,6 +128,7 @@ def create_tables():
             """
             )
 
+            # updated_at: las reservas movidas aparecen en el feed de cambios del restaurante destino
             cur.execute(
                 """
             WITH dup AS (
@@ -134,7 +138,7 @@ def create_tables():
                 HAVING COUNT(*) > 1
             )
             UPDATE reservas res
-            SET restaurante_id = dup.keep_id
+            SET restaurante_id = dup.keep_id, updated_at = (now() AT TIME ZONE 'utc')
             FROM restaurantes r
             JOIN dup ON r.nombre = dup.nombre
             WHERE res.restaurante_id = r.id AND r.id <> dup.keep_id
@@ -159,14 +163,24 @@ def create_tables():
             """
             )
 
-            # Eliminar reservas duplicadas exactas (cliente_email, restaurante_id, fecha_reserva)
+            # Eliminar reservas duplicadas exactas (cliente_email, restaurante_id, fecha_reserva).
+            # Sólo hace falta antes de la migración 2: desde entonces la restricción UNIQUE
+            # (el índice único parcial desde la 8) impide los duplicados y los reintentos
+            # usan Idempotency-Key, así que no se recorre la tabla en cada arranque.
             cur.execute(
                 """
-            DELETE FROM reservas r
-            USING reservas r2
-            WHERE r.cliente_email = r2.cliente_email AND r.restaurante_id = r2.restaurante_id AND r.fecha_reserva = r2.fecha_reserva AND r.id > r2.id
+            SELECT 1 FROM pg_class
+            WHERE relname IN ('uq_reservas_cliente_restaurante_fecha', 'uq_reservas_activas_cliente_restaurante_fecha')
             """
             )
+            if cur.fetchone() is None:
+                cur.execute(
+                    """
+                DELETE FROM reservas r
+                USING reservas r2
+                WHERE r.cliente_email = r2.cliente_email AND r.restaurante_id = r2.restaurante_id AND r.fecha_reserva = r2.fecha_reserva AND r.id > r2.id
+                """
+                )
 
             conn.commit()
             logger.info("Consolidación/eliminación de duplicados completada (si había)")
@@ -213,14 +227,21 @@ def insert_sample_data():
         """
         )
 
-        # Insertar algunas reservas de prueba (idempotente)
+        # Insertar algunas reservas de prueba (idempotente) y ocupar sus plazas
+        # (los contadores de franja se recalculan sólo en la migración 4)
         cur.execute(
-            """
-        INSERT INTO reservas (cliente_nombre, cliente_email, cliente_telefono, restaurante_id, fecha_reserva, numero_personas) VALUES
-        (%s, %s, %s, %s, %s, %s),
-        (%s, %s, %s, %s, %s, %s),
-        (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (cliente_email, restaurante_id, fecha_reserva) DO NOTHING
+            f"""
+        WITH nuevas AS (
+            INSERT INTO reservas (cliente_nombre, cliente_email, cliente_telefono, restaurante_id, fecha_reserva, numero_personas) VALUES
+            (%s, %s, %s, %s, %s, %s),
+            (%s, %s, %s, %s, %s, %s),
+            (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (cliente_email, restaurante_id, fecha_reserva) WHERE {RESERVA_ACTIVA} DO NOTHING
+            RETURNING restaurante_id, fecha_reserva
+        )
+        INSERT INTO ocupacion_franjas (restaurante_id, franja, reservas)
+        SELECT restaurante_id, {FRANJA_RESERVA}, COUNT(*) FROM nuevas GROUP BY 1, 2
+        ON CONFLICT (restaurante_id, franja) DO UPDATE SET reservas = ocupacion_franjas.reservas + EXCLUDED.reservas
         """,
             (
                 'Juan Pérez', 'juan@email.com', '555-1111', 1, datetime.now() + timedelta(days=1), 4,
@@ -251,6 +272,8 @@ def main():
 
     try:
         create_tables()
+        # Antes de los datos de prueba: sus ON CONFLICT necesitan las restricciones UNIQUE
+        migrate(DB_CONFIG)
         insert_sample_data()
         logger.info("Inicialización completada exitosamente")
         return True
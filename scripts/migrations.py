@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Migraciones versionadas del esquema PostgreSQL compartido.
+
+Cada migración tiene un número de versión creciente y una lista de pasos. Las
+versiones aplicadas se registran en `schema_migrations`; al arrancar sólo se
+ejecutan las pendientes, en orden. Los servicios comparan la versión registrada
+con la que necesitan (common/schema.py) para no inspeccionar el esquema en cada
+arranque.
+
+- Los índices se crean con `CREATE INDEX CONCURRENTLY` para no bloquear las
+  escrituras en las tablas durante un despliegue. No puede ir dentro de una
+  transacción, así que la conexión trabaja en autocommit y la versión se
+  registra cuando han terminado todos los pasos. Si una construcción concurrente
+  falla deja un índice inválido: se borra y se vuelve a crear en el siguiente
+  intento.
+- Las restricciones UNIQUE se añaden sobre un índice único ya construido
+  (`ADD CONSTRAINT ... UNIQUE USING INDEX`), que sólo bloquea un instante.
+- Un advisory lock evita que dos procesos migren a la vez.
+
+Usage:
+  python3 scripts/migrations.py            # aplicar las pendientes
+  python3 scripts/migrations.py --status   # versión actual y pendientes
+"""
+
+import os
+import argparse
+import logging
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+logger = logging.getLogger(__name__)
+
+DB_CONFIG = {
+    "dbname": os.getenv("POSTGRES_DB", "reserva"),
+    "user": os.getenv("POSTGRES_USER", "admin"),
+    "password": os.getenv("POSTGRES_PASSWORD", "password123"),
+    "host": os.getenv("POSTGRES_HOST", "postgres"),
+    "port": os.getenv("POSTGRES_PORT", "5432")
+}
+
+# Clave arbitraria del advisory lock de migraciones
+MIGRATION_LOCK_KEY = 726_001
+
+# Predicado del índice único parcial de reservas (migración 8). Los
+# `ON CONFLICT (cliente_email, restaurante_id, fecha_reserva) WHERE ...` lo repiten
+# tal cual para que PostgreSQL infiera el índice.
+RESERVA_ACTIVA = "COALESCE(estado, 'pendiente') <> 'cancelada'"
+
+# Tamaño de las franjas de ocupación; debe coincidir con el del servicio de reservas
+RESERVAS_SLOT_MINUTES = int(os.getenv("RESERVAS_SLOT_MINUTES", "60"))
+
+# Inicio de la franja de `fecha_reserva` (misma cuenta que franja_de en services/reservas/ocupacion.py)
+FRANJA_RESERVA = (
+    f"to_timestamp(floor(extract(epoch FROM fecha_reserva) / {RESERVAS_SLOT_MINUTES * 60})"
+    f" * {RESERVAS_SLOT_MINUTES * 60}) AT TIME ZONE 'UTC'"
+)
+
+
+class Index:
+    """`CREATE [UNIQUE] INDEX CONCURRENTLY IF NOT EXISTS <name> ON <definition>`."""
+
+    def __init__(self, name, definition, unique=False):
+        self.name = name
+        self.definition = definition
+        self.unique = unique
+
+    def apply(self, cur):
+        # Un CONCURRENTLY interrumpido deja el índice marcado como inválido
+        cur.execute(
+            """
+        SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+        """,
+            (self.name,),
+        )
+        row = cur.fetchone()
+        if row and row[0]:
+            logger.warning(f"Índice inválido {self.name}: se vuelve a crear")
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}")
+        unique = "UNIQUE " if self.unique else ""
+        cur.execute(f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.definition}")
+
+
+class UniqueConstraint:
+    """Restricción UNIQUE construida primero como índice único concurrente."""
+
+    def __init__(self, name, table, columns):
+        self.name = name
+        self.table = table
+        self.columns = columns
+
+    def apply(self, cur):
+        cur.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", (self.name,))
+        if cur.fetchone():
+            return
+        Index(self.name, f"{self.table} ({', '.join(self.columns)})", unique=True).apply(cur)
+        cur.execute(f"ALTER TABLE {self.table} ADD CONSTRAINT {self.name} UNIQUE USING INDEX {self.name}")
+
+
+class RebuildSlotOccupancy:
+    """Recalcular los contadores de `ocupacion_franjas` a partir de las reservas activas.
+
+    Va en una transacción que bloquea la tabla de contadores: las reservas que se
+    creen a la vez esperan y se suman sobre el recuento ya hecho. Desde entonces
+    los servicios mantienen los contadores, así que sólo se ejecuta al crearla.
+    """
+
+    def apply(self, cur):
+        cur.execute("BEGIN")
+        try:
+            cur.execute("LOCK TABLE ocupacion_franjas IN EXCLUSIVE MODE")
+            cur.execute("DELETE FROM ocupacion_franjas")
+            cur.execute(
+                f"""
+            INSERT INTO ocupacion_franjas (restaurante_id, franja, reservas)
+            SELECT restaurante_id, {FRANJA_RESERVA} AS franja, COUNT(*)
+            FROM reservas
+            WHERE {RESERVA_ACTIVA} AND restaurante_id IS NOT NULL
+            GROUP BY 1, 2
+            """
+            )
+            logger.info(f"Ocupación de franjas recalculada ({cur.rowcount} franjas)")
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+
+
+# (versión, descripción, pasos). Los pasos son SQL u objetos con `apply(cur)` y
+# deben poder repetirse sin efecto si una migración se interrumpe a medias.
+MIGRATIONS = [
+    (1, "owner_email en restaurantes", [
+        "ALTER TABLE restaurantes ADD COLUMN IF NOT EXISTS owner_email VARCHAR(150)",
+        Index("ix_restaurantes_owner_email", "restaurantes (owner_email)"),
+    ]),
+    (2, "restricciones UNIQUE de los ON CONFLICT de init_db", [
+        UniqueConstraint("uq_restaurantes_nombre", "restaurantes", ["nombre"]),
+        UniqueConstraint("uq_platos_restaurante_nombre", "platos", ["restaurante_id", "nombre"]),
+        UniqueConstraint("uq_reservas_cliente_restaurante_fecha", "reservas",
+                         ["cliente_email", "restaurante_id", "fecha_reserva"]),
+    ]),
+    (3, "índices compuestos de los listados de reservas y platos", [
+        # obtener_reservas: orden (fecha_reserva, id) y filtros por restaurante, estado o cliente
+        Index("ix_reservas_fecha_id", "reservas (fecha_reserva, id)"),
+        Index("ix_reservas_restaurante_fecha_id", "reservas (restaurante_id, fecha_reserva, id)"),
+        Index("ix_reservas_estado_fecha_id", "reservas (estado, fecha_reserva, id)"),
+        Index("ix_reservas_cliente_email_fecha_id", "reservas (cliente_email, fecha_reserva, id)"),
+        # obtener_platos: orden por id con filtro por restaurante o categoría
+        Index("ix_platos_restaurante_id_id", "platos (restaurante_id, id)"),
+        Index("ix_platos_categoria_id", "platos (categoria, id)"),
+    ]),
+    (4, "ocupación de franjas horarias (crear_reserva)", [
+        """
+        CREATE TABLE IF NOT EXISTS ocupacion_franjas (
+            restaurante_id INTEGER NOT NULL,
+            franja TIMESTAMP NOT NULL,
+            reservas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (restaurante_id, franja)
+        )
+        """,
+        RebuildSlotOccupancy(),
+    ]),
+    (5, "feed de cambios de reservas por (updated_at, id)", [
+        # Las filas sin updated_at quedarían fuera de la comparación por tupla del cursor
+        "UPDATE reservas SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL",
+        Index("ix_reservas_restaurante_updated_id", "reservas (restaurante_id, updated_at, id)"),
+        Index("ix_reservas_updated_id", "reservas (updated_at, id)"),
+    ]),
+    (6, "avisos NOTIFY de cambios en reservas (stream de cambios)", [
+        # pg_notify se entrega al confirmar y une los avisos iguales de una misma
+        # transacción: un lote de 500 reservas de 3 restaurantes envía 3 avisos
+        """
+        CREATE OR REPLACE FUNCTION reservas_notificar_cambio() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('reservas_cambios', NEW.restaurante_id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS reservas_notificar_cambio ON reservas",
+        """
+        CREATE TRIGGER reservas_notificar_cambio
+        AFTER INSERT OR UPDATE ON reservas
+        FOR EACH ROW EXECUTE FUNCTION reservas_notificar_cambio()
+        """,
+    ]),
+    (7, "claves de idempotencia de POST /reservas", [
+        """
+        CREATE TABLE IF NOT EXISTS idempotencia_reservas (
+            clave VARCHAR(255) PRIMARY KEY,
+            huella VARCHAR(32) NOT NULL,
+            respuesta TEXT,
+            expira TIMESTAMP NOT NULL
+        )
+        """,
+        # Purga de las claves caducadas
+        Index("ix_idempotencia_reservas_expira", "idempotencia_reservas (expira)"),
+    ]),
+    (8, "reservas únicas sólo entre las no canceladas", [
+        # Un cliente que cancela puede volver a reservar la misma hora. Un índice
+        # parcial no admite ADD CONSTRAINT, así que los ON CONFLICT lo infieren
+        # repitiendo el mismo WHERE. Se crea antes de borrar la restricción para
+        # que los duplicados no tengan hueco.
+        Index("uq_reservas_activas_cliente_restaurante_fecha",
+              f"reservas (cliente_email, restaurante_id, fecha_reserva) WHERE {RESERVA_ACTIVA}", unique=True),
+        "ALTER TABLE reservas DROP CONSTRAINT IF EXISTS uq_reservas_cliente_restaurante_fecha",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cur):
+    cur.execute(
+        """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+    )
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cur.fetchone()[0]
+
+
+def migrate(db_config=None):
+    """Aplicar las migraciones pendientes. Devuelve la versión final del esquema."""
+    conn = psycopg2.connect(**(db_config or DB_CONFIG))
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = conn.cursor()
+
+    try:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        version = current_version(cur)
+        pending = [m for m in MIGRATIONS if m[0] > version]
+        if not pending:
+            logger.info(f"Esquema al día (versión {version})")
+            return version
+
+        for number, description, steps in pending:
+            logger.info(f"Aplicando migración {number}: {description}")
+            for step in steps:
+                if isinstance(step, str):
+                    cur.execute(step)
+                else:
+                    step.apply(cur)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (number, description),
+            )
+            version = number
+        logger.info(f"Esquema migrado a la versión {version}")
+        return version
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        cur.close()
+        conn.close()
+
+
+def status(db_config=None):
+    conn = psycopg2.connect(**(db_config or DB_CONFIG))
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = conn.cursor()
+    try:
+        version = current_version(cur)
+    finally:
+        cur.close()
+        conn.close()
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    print(f"Versión del esquema: {version} (última: {LATEST_VERSION})")
+    for number, description, _ in pending:
+        print(f"  pendiente {number}: {description}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="Mostrar la versión sin migrar")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.status:
+        status()
+    else:
+        migrate()
+
+
+if __name__ == "__main__":
+    main()
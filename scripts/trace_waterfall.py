@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Reconstruye la cascada (waterfall) de una traza a partir de sus spans.
+
+Usage:
+  # desde los ficheros TRACE_FILE de cada servicio (por defecto la última traza)
+  python3 scripts/trace_waterfall.py traces/*.jsonl
+
+  # una traza concreta (el X-Request-ID de la respuesta)
+  python3 scripts/trace_waterfall.py traces/*.jsonl --trace 4bf92f3577b34da6a3ce929d0e0e4736
+
+  # desde los buffers en memoria de las aplicaciones en marcha (TRACE_ENDPOINT_ENABLED=1)
+  python3 scripts/trace_waterfall.py http://localhost:5000 http://localhost:8000 \\
+      http://localhost:8003 --trace 4bf92f3577b34da6a3ce929d0e0e4736
+
+Cada línea muestra el desfase respecto al inicio de la traza, la duración, el
+servicio y el nombre del span, sangrado según la jerarquía padre/hijo.
+"""
+
+import json
+import argparse
+from collections import defaultdict
+
+import requests
+
+BAR_WIDTH = 40
+
+
+def load_spans(sources, trace_id):
+    spans = []
+    for source in sources:
+        if source.startswith("http://") or source.startswith("https://"):
+            if trace_id is None:
+                raise SystemExit("--trace es obligatorio al leer de una URL")
+            resp = requests.get(f"{source.rstrip('/')}/traces/{trace_id}", timeout=5)
+            resp.raise_for_status()
+            spans.extend(resp.json())
+            continue
+        with open(source, encoding="utf-8") as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+    if not spans:
+        return []
+    if trace_id is None:
+        trace_id = max(spans, key=lambda s: s["start"])["trace_id"]
+    return [s for s in spans if s["trace_id"] == trace_id]
+
+
+def render(spans):
+    by_id = {s["span_id"]: s for s in spans}
+    children = defaultdict(list)
+    roots = []
+    for s in spans:
+        if s["parent_id"] in by_id:
+            children[s["parent_id"]].append(s)
+        else:
+            roots.append(s)
+
+    t0 = min(s["start"] for s in spans)
+    total_ms = max((s["start"] - t0) * 1000 + (s["duration_ms"] or 0) for s in spans) or 1.0
+    lines = [f"trace {spans[0]['trace_id']}  {len(spans)} spans  {total_ms:.1f} ms"]
+
+    def walk(s, depth):
+        offset = (s["start"] - t0) * 1000
+        duration = s["duration_ms"] or 0
+        begin = int(offset / total_ms * BAR_WIDTH)
+        width = max(1, int(duration / total_ms * BAR_WIDTH))
+        bar = " " * begin + "█" * width
+        status = s["attrs"].get("status", "")
+        label = f"{'  ' * depth}{s['service']}: {s['name']} {status}".rstrip()
+        lines.append(f"{offset:8.1f} {duration:8.1f}  |{bar:<{BAR_WIDTH}}|  {label}")
+        for child in sorted(children[s["span_id"]], key=lambda c: c["start"]):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda r: r["start"]):
+        walk(root, 0)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="Ficheros JSONL de spans o URLs base de las aplicaciones")
+    parser.add_argument("--trace", help="trace_id a mostrar (por defecto, la traza más reciente)")
+    args = parser.parse_args()
+
+    spans = load_spans(args.sources, args.trace)
+    if not spans:
+        raise SystemExit("No se encontraron spans")
+    print(render(spans))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,9 @@ import motor.motor_asyncio
 import os
 import logging
 
+from common.metrics import instrument_fastapi
+from common.tracing import trace_fastapi
+
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017/")
 MONGO_DB = os.getenv("MONGO_DB", "auth_db")
 JWT_SECRET = os.getenv("JWT_SECRET", "devsecret_change_me")
@@ -30,6 +33,12 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Servicio de Autenticación", version="0.1.0")
 
+# Métricas Prometheus en /metrics (latencia por ruta, códigos de estado, en curso)
+instrument_fastapi(app, "authentication")
+
+# Trazas: span por petición, contexto `traceparent` del gateway (ver common/tracing.py)
+trace_fastapi(app, "authentication")
+
 class UserBase(BaseModel):
     email: EmailStr
     full_name: Optional[str] = None
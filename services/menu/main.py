@@ -1,14 +1,22 @@
 from fastapi import FastAPI, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime
 
-from models import Base, Plato, PlatoCreate, PlatoRead, PlatoUpdate
+from models import Base, Plato, PlatoCreate, PlatoRead, PlatoPage, PlatoUpdate
 from database import engine, SessionLocal
+from common.metrics import instrument_fastapi
+from common.pagination import keyset_page
+from common.schema import schema_is_current
+from common.tracing import trace_fastapi, trace_sqlalchemy
 
-# Crear las tablas
-Base.metadata.create_all(bind=engine)
+# Versión de scripts/migrations.py con los índices y restricciones de `platos`
+REQUIRED_SCHEMA_VERSION = 3
+
+# Crear las tablas (sólo si la base no está migrada, p. ej. en desarrollo)
+if not schema_is_current(engine, REQUIRED_SCHEMA_VERSION):
+    Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Servicio de Menú",
@@ -16,6 +24,13 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Métricas Prometheus en /metrics (latencia por ruta, códigos de estado, en curso)
+instrument_fastapi(app, "menu")
+
+# Trazas: span por petición y por consulta SQL, contexto `traceparent` del gateway (ver common/tracing.py)
+trace_fastapi(app, "menu")
+trace_sqlalchemy(engine)
+
 # Dependencia para obtener la sesión de base de datos
 def get_db():
     db = SessionLocal()
@@ -61,7 +76,7 @@ def crear_plato(plato: PlatoCreate, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/platos/", response_model=List[PlatoRead], tags=["Platos"])
+@app.get("/platos/", response_model=Union[List[PlatoRead], PlatoPage], tags=["Platos"])
 def obtener_platos(
     restaurante_id: Optional[int] = None,
     categoria: Optional[str] = None,
@@ -69,10 +84,11 @@ def obtener_platos(
     search: Optional[str] = Query(None, description="Buscar por nombre o descripción"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Paginación por cursor: vacío para la primera página"),
     db: Session = Depends(get_db)
 ):
     """
-    Obtener lista de platos con filtros opcionales.
+    Obtener lista de platos con filtros opcionales, ordenados por id.
     
     - **restaurante_id**: Filtrar por restaurante
     - **categoria**: Filtrar por categoría
@@ -80,6 +96,8 @@ def obtener_platos(
     - **search**: Buscar en nombre o descripción
     - **skip**: Número de registros a saltar (paginación)
     - **limit**: Número máximo de registros a retornar
+    - **cursor**: Si se indica (vacío para empezar) se pagina por id y la respuesta es
+      `{items, next_cursor}`; la siguiente página se pide con `cursor=next_cursor`
     """
     query = db.query(Plato)
     
@@ -97,7 +115,14 @@ def obtener_platos(
             )
         )
     
-    return query.offset(skip).limit(limit).all()
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_page(query, (Plato.id,), (int,), cursor, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"items": items, "next_cursor": next_cursor}
+    
+    return query.order_by(Plato.id).offset(skip).limit(limit).all()
 
 @app.get("/platos/{plato_id}", response_model=PlatoRead, tags=["Platos"])
 def obtener_plato(plato_id: int, db: Session = Depends(get_db)):
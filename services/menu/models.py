@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 from pydantic import BaseModel, Field, validator
@@ -22,6 +22,13 @@ class Plato(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Mismos índices que la migración 3 de scripts/migrations.py (filtros de obtener_platos
+    # y claves de la paginación por cursor)
+    __table_args__ = (
+        Index("ix_platos_restaurante_id_id", "restaurante_id", "id"),
+        Index("ix_platos_categoria_id", "categoria", "id"),
+    )
+
     def __repr__(self):
         return f"<Plato(id={self.id}, nombre='{self.nombre}', precio={self.precio})>"
 
@@ -59,6 +66,13 @@ class PlatoRead(PlatoBase):
         # Compatibilidad Pydantic v2
         from_attributes = True
 
+class PlatoPage(BaseModel):
+    """
+    Página de platos con el cursor de la siguiente (None si es la última).
+    """
+    items: List[PlatoRead]
+    next_cursor: Optional[str] = None
+
 class PlatoUpdate(BaseModel):
     """
     Modelo Pydantic usado para actualizar un plato existente.
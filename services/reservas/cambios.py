@@ -0,0 +1,177 @@
+"""Feed de cambios de reservas y avisos de cambio para el streaming (SSE).
+
+`leer_cambios` devuelve las reservas modificadas después de un cursor
+(updated_at, id); lo usan `GET /reservas/cambios` y `GET /reservas/cambios/stream`.
+
+Avisos: en PostgreSQL un trigger de `reservas` (migración 6) hace
+`pg_notify('reservas_cambios', restaurante_id)` al confirmar cada transacción.
+`Notificador` escucha ese canal con una conexión propia en un hilo y despierta
+sólo a las suscripciones de ese restaurante, que entonces leen su delta. Con
+otra base (SQLite en desarrollo) no hay avisos y las suscripciones consultan
+el feed cada RESERVAS_STREAM_POLL_SECONDS.
+"""
+import os
+import time
+import select
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from models import Reserva
+
+logger = logging.getLogger(__name__)
+
+# Margen del feed de cambios: una transacción puede confirmar después de otra
+# posterior, con un updated_at anterior al último ya devuelto. El cursor no
+# avanza más allá de ahora - margen, así que los cambios de los últimos segundos
+# se vuelven a enviar (el cliente los aplica por id) en lugar de perderse.
+MARGEN_CAMBIOS = timedelta(seconds=float(os.getenv("RESERVAS_CHANGES_MARGIN_SECONDS", "5")))
+
+CANAL = "reservas_cambios"
+
+# Sin avisos de la base (no PostgreSQL), cada suscripción consulta el feed con este intervalo
+POLL_SECONDS = float(os.getenv("RESERVAS_STREAM_POLL_SECONDS", "2"))
+
+
+def leer_cambios(
+    db: Session, desde: Optional[Tuple[datetime, int]], restaurante_ids: Optional[List[int]], limit: int
+) -> Tuple[List[Reserva], Tuple[datetime, int], bool]:
+    """Cambios posteriores a `desde` ordenados por (updated_at, id).
+
+    Devuelve (filas, siguiente cursor, has_more). El cursor siguiente nunca pasa
+    de ahora - MARGEN_CAMBIOS salvo que la página venga llena.
+    """
+    query = db.query(Reserva)
+    if restaurante_ids:
+        query = query.filter(Reserva.restaurante_id.in_(restaurante_ids))
+    clave = (Reserva.updated_at, Reserva.id)
+    if desde:
+        query = query.filter(tuple_(*clave) > tuple_(*desde))
+
+    # Una fila de más indica si quedan cambios, como en keyset_page
+    filas = query.order_by(*clave).limit(limit + 1).all()
+    has_more = len(filas) > limit
+    filas = filas[:limit]
+
+    corte = cursor_inicial()
+    if filas and (has_more or (filas[-1].updated_at, filas[-1].id) <= corte):
+        siguiente = (filas[-1].updated_at, filas[-1].id)
+    elif filas:
+        # Cola del feed: el cursor se queda en el corte para repetir los cambios recientes
+        siguiente = max(corte, desde) if desde else corte
+    else:
+        siguiente = desde or corte
+    return filas, siguiente, has_more
+
+
+def cursor_inicial() -> Tuple[datetime, int]:
+    """Cursor que empieza en los cambios de ahora (menos el margen)."""
+    return (datetime.utcnow() - MARGEN_CAMBIOS, 0)
+
+
+class Suscripcion:
+    """Un cliente del stream: se despierta cuando cambia alguno de sus restaurantes."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, restaurante_ids: Optional[Iterable[int]]):
+        self.loop = loop
+        self.restaurante_ids: Optional[Set[int]] = set(restaurante_ids) if restaurante_ids else None
+        self.evento = asyncio.Event()
+
+    def interesa(self, restaurante_ids: Optional[Set[int]]) -> bool:
+        return restaurante_ids is None or self.restaurante_ids is None or bool(self.restaurante_ids & restaurante_ids)
+
+    async def esperar(self, timeout: float) -> bool:
+        """True si llegó un aviso antes de `timeout` segundos."""
+        try:
+            await asyncio.wait_for(self.evento.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.evento.clear()
+        return True
+
+
+class Notificador:
+    """Escucha `LISTEN reservas_cambios` y reparte los avisos entre las suscripciones."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.activo = engine.dialect.name == "postgresql"
+        self.suscripciones: Set[Suscripcion] = set()
+        self.avisos = 0
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+
+    @property
+    def intervalo(self) -> float:
+        """Cada cuánto se consulta el feed sin aviso: latido con LISTEN, sondeo sin él."""
+        return float(os.getenv("RESERVAS_STREAM_HEARTBEAT_SECONDS", "15")) if self.activo else POLL_SECONDS
+
+    def iniciar(self):
+        if self.activo and self._hilo is None:
+            self._hilo = threading.Thread(target=self._escuchar, name="reservas-listen", daemon=True)
+            self._hilo.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def suscribir(self, restaurante_ids: Optional[Iterable[int]]) -> Suscripcion:
+        suscripcion = Suscripcion(asyncio.get_running_loop(), restaurante_ids)
+        with self._lock:
+            self.suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        with self._lock:
+            self.suscripciones.discard(suscripcion)
+
+    def avisar(self, restaurante_ids: Optional[Set[int]]):
+        """Despierta a las suscripciones afectadas (None: a todas). Se puede llamar desde cualquier hilo."""
+        with self._lock:
+            afectadas = [s for s in self.suscripciones if s.interesa(restaurante_ids)]
+        for suscripcion in afectadas:
+            suscripcion.loop.call_soon_threadsafe(suscripcion.evento.set)
+
+    def stats(self) -> dict:
+        return {"listen": self.activo, "suscripciones": len(self.suscripciones), "avisos": self.avisos}
+
+    def _escuchar(self):
+        espera = 1.0
+        while not self._parar.is_set():
+            conexion = None
+            try:
+                conexion = self.engine.raw_connection()
+                driver = conexion.driver_connection
+                driver.autocommit = True
+                with driver.cursor() as cur:
+                    cur.execute(f"LISTEN {CANAL}")
+                logger.info(f"Escuchando avisos de cambios en el canal {CANAL}")
+                espera = 1.0
+                # Al (re)conectar se pudieron perder avisos: todos vuelven a leer su delta
+                self.avisar(None)
+                while not self._parar.is_set():
+                    if select.select([driver], [], [], 5)[0]:
+                        driver.poll()
+                        restaurantes = set()
+                        while driver.notifies:
+                            aviso = driver.notifies.pop(0)
+                            self.avisos += 1
+                            if aviso.payload.isdigit():
+                                restaurantes.add(int(aviso.payload))
+                        if restaurantes:
+                            self.avisar(restaurantes)
+            except Exception as e:
+                logger.warning(f"Conexión LISTEN perdida ({e}); reintento en {espera:.0f}s")
+                time.sleep(espera)
+                espera = min(espera * 2, 30.0)
+            finally:
+                if conexion is not None:
+                    try:
+                        conexion.invalidate()
+                    except Exception:
+                        pass
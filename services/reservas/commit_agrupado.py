@@ -0,0 +1,179 @@
+"""Commit agrupado (group commit) de `POST /reservas/` para picos de altas.
+
+Con RESERVAS_GROUP_COMMIT=1 cada petición no abre su propia transacción: deja
+su reserva en una cola y espera. Un hilo escritor toma lo que haya en la cola
+(como mucho RESERVAS_GROUP_COMMIT_MAX_BATCH reservas, esperando hasta
+RESERVAS_GROUP_COMMIT_MAX_DELAY_MS desde la primera) y lo escribe en una sola
+transacción, así que el fsync del commit se paga una vez por lote y no una vez
+por reserva.
+
+Cada reserva del lote se crea con la misma función que el camino normal
+(`insertar`), dentro de un SAVEPOINT: la disponibilidad de su franja, la
+restricción de duplicados y la Idempotency-Key se comprueban por fila, y una
+reserva rechazada sólo deshace su savepoint. Cada petición recibe su propio
+resultado cuando el lote ha confirmado.
+
+- El lote se procesa ordenado por (restaurante_id, franja). Los contadores de
+  `ocupacion_franjas` se bloquean siempre en el mismo orden y dos lotes de
+  réplicas distintas no se interbloquean. Dentro de una franja se respeta el
+  orden de llegada.
+- Si el commit del lote falla (conexión perdida, conflicto de serialización),
+  sus reservas se reintentan una a una en transacciones separadas.
+- La petición espera su resultado en un `asyncio.Future` que el hilo escritor
+  resuelve con `call_soon_threadsafe`: mientras espera no ocupa ningún hilo del
+  threadpool (que siguen libres para el resto de endpoints síncronos), y el
+  tamaño del lote no queda limitado por el número de hilos.
+"""
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from models import ReservaCreate
+from ocupacion import franja_de
+
+logger = logging.getLogger(__name__)
+
+ACTIVO = os.getenv("RESERVAS_GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+MAX_ESPERA = float(os.getenv("RESERVAS_GROUP_COMMIT_MAX_DELAY_MS", "2")) / 1000
+MAX_LOTE = int(os.getenv("RESERVAS_GROUP_COMMIT_MAX_BATCH", "64"))
+
+# Crea la reserva en la transacción de la sesión sin confirmarla: (respuesta JSON, repetida)
+Insertar = Callable[[Session, ReservaCreate, Optional[str]], Tuple[str, bool]]
+
+
+class Pendiente:
+    """Una petición esperando a que se confirme el lote que contiene su reserva."""
+
+    def __init__(self, reserva: ReservaCreate, clave: Optional[str]):
+        self.reserva = reserva
+        self.clave = clave
+        self.resultado: Optional[Tuple[str, bool]] = None
+        self.error: Optional[HTTPException] = None
+        self.loop = asyncio.get_running_loop()
+        self.futuro: "asyncio.Future[Tuple[str, bool]]" = self.loop.create_future()
+
+    def resolver(self):
+        """Entrega el resultado a la petición (en su event loop)."""
+        # La petición pudo cancelarse si el cliente se desconectó
+        if self.futuro.done():
+            return
+        if self.error is not None:
+            self.futuro.set_exception(self.error)
+        else:
+            self.futuro.set_result(self.resultado)
+
+
+class CommitAgrupado:
+    def __init__(self, session_factory, insertar: Insertar, max_espera: float = MAX_ESPERA, max_lote: int = MAX_LOTE):
+        self.session_factory = session_factory
+        self.insertar = insertar
+        self.max_espera = max_espera
+        self.max_lote = max_lote
+        self.cola: "queue.Queue[Pendiente]" = queue.Queue()
+        # Transacciones confirmadas y reservas creadas o rechazadas en ellas
+        self.lotes = 0
+        self.reservas = 0
+        self.rechazadas = 0
+        self.reintentos = 0
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+
+    async def crear(self, reserva: ReservaCreate, clave: Optional[str]) -> Tuple[str, bool]:
+        """Encola la reserva y espera al commit de su lote. Lanza HTTPException si se rechaza."""
+        pendiente = Pendiente(reserva, clave)
+        self._arrancar()
+        self.cola.put(pendiente)
+        return await pendiente.futuro
+
+    def stats(self) -> dict:
+        return {
+            "lotes": self.lotes,
+            "reservas": self.reservas,
+            "rechazadas": self.rechazadas,
+            "reservas_por_lote": round(self.reservas / self.lotes, 2) if self.lotes else 0,
+            "en_cola": self.cola.qsize(),
+            "reintentos": self.reintentos,
+        }
+
+    def _arrancar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escribir_siempre, name="reservas-group-commit", daemon=True)
+                self._hilo.start()
+
+    def _escribir_siempre(self):
+        while True:
+            lote = [self.cola.get()]
+            limite = time.monotonic() + self.max_espera
+            while len(lote) < self.max_lote:
+                try:
+                    # Lo ya encolado entra sin esperar; después, como mucho hasta el límite
+                    lote.append(self.cola.get(timeout=max(0.0, limite - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._escribir(lote)
+            except Exception as e:
+                logger.exception(f"Error en el commit agrupado: {e}")
+                for pendiente in lote:
+                    if pendiente.resultado is None and pendiente.error is None:
+                        pendiente.error = HTTPException(status_code=500, detail="Error guardando la reserva")
+            finally:
+                for pendiente in lote:
+                    pendiente.loop.call_soon_threadsafe(pendiente.resolver)
+
+    def _escribir(self, lote: List[Pendiente]):
+        orden = sorted(lote, key=lambda p: (p.reserva.restaurante_id, franja_de(p.reserva.fecha_reserva)))
+        db = self.session_factory()
+        try:
+            for pendiente in orden:
+                self._insertar_en_savepoint(db, pendiente)
+            db.commit()
+            self._contar(lote)
+            return
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Commit de un lote de {len(lote)} reservas fallido ({e}); se reintentan una a una")
+        finally:
+            db.close()
+
+        self.reintentos += 1
+        for pendiente in orden:
+            pendiente.resultado, pendiente.error = None, None
+            db = self.session_factory()
+            try:
+                self._insertar_en_savepoint(db, pendiente)
+                db.commit()
+                self._contar([pendiente])
+            except Exception as e:
+                db.rollback()
+                pendiente.resultado, pendiente.error = None, HTTPException(status_code=400, detail=str(e))
+                self.rechazadas += 1
+            finally:
+                db.close()
+
+    def _contar(self, confirmadas: List[Pendiente]):
+        """Suma una transacción confirmada; sus reservas con error se deshicieron en su savepoint."""
+        creadas = sum(1 for p in confirmadas if p.error is None)
+        self.lotes += 1
+        self.reservas += creadas
+        self.rechazadas += len(confirmadas) - creadas
+
+    def _insertar_en_savepoint(self, db: Session, pendiente: Pendiente):
+        savepoint = db.begin_nested()
+        try:
+            pendiente.resultado = self.insertar(db, pendiente.reserva, pendiente.clave)
+            savepoint.commit()
+        except HTTPException as e:
+            savepoint.rollback()
+            pendiente.error = e
+        except Exception as e:
+            savepoint.rollback()
+            pendiente.error = HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,82 @@
+"""Claves de idempotencia de `POST /reservas/` (cabecera `Idempotency-Key`).
+
+La clave se registra en `idempotencia_reservas` en la misma transacción que la
+reserva, antes de tomar la plaza:
+
+    INSERT ... ON CONFLICT (clave) DO UPDATE ... WHERE expira < ahora RETURNING clave
+
+- Sin fila previa (o con una caducada) la inserción devuelve la clave y la
+  reserva se crea normalmente; al final se guarda su respuesta en la fila.
+- Si la clave ya existe no devuelve nada y se responde la respuesta guardada,
+  sin consultar la disponibilidad ni insertar. Con una petición igual en curso,
+  PostgreSQL hace esperar a la inserción hasta que la otra transacción termina:
+  si confirma se devuelve su respuesta, si se deshace (franja llena, error) la
+  clave queda libre y esta petición se ejecuta.
+
+La fila guarda una huella del cuerpo (otra reserva con la misma clave es un
+error del cliente, 422) y la respuesta en JSON. Las claves caducan a las
+RESERVAS_IDEMPOTENCY_TTL_HOURS horas (24) y se borran como mucho una vez por
+RESERVAS_IDEMPOTENCY_PURGE_SECONDS (300) desde las propias peticiones.
+"""
+import os
+import time
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+
+from models import ClaveIdempotencia, ReservaCreate
+
+TTL = timedelta(hours=float(os.getenv("RESERVAS_IDEMPOTENCY_TTL_HOURS", "24")))
+PURGA_SEGUNDOS = float(os.getenv("RESERVAS_IDEMPOTENCY_PURGE_SECONDS", "300"))
+MAX_CLAVE = 255
+
+_RESERVAR_CLAVE = text(
+    """
+    INSERT INTO idempotencia_reservas (clave, huella, expira)
+    VALUES (:clave, :huella, :expira)
+    ON CONFLICT (clave)
+    DO UPDATE SET huella = excluded.huella, respuesta = NULL, expira = excluded.expira
+    WHERE idempotencia_reservas.expira < :ahora
+    RETURNING clave
+    """
+).bindparams(bindparam("expira", type_=DateTime), bindparam("ahora", type_=DateTime))
+
+_PURGAR = text("DELETE FROM idempotencia_reservas WHERE expira < :ahora").bindparams(
+    bindparam("ahora", type_=DateTime)
+)
+
+_proxima_purga = 0.0
+
+
+def huella(reserva: ReservaCreate) -> str:
+    cuerpo = reserva.model_dump_json().encode()
+    return hashlib.blake2b(cuerpo, digest_size=16).hexdigest()
+
+
+def reservar_clave(db: Session, clave: str, huella_cuerpo: str) -> Optional[ClaveIdempotencia]:
+    """Registra la clave en la transacción de `db`.
+
+    Devuelve None si es nueva (hay que crear la reserva) o la fila ya guardada
+    si la clave se usó antes.
+    """
+    global _proxima_purga
+    ahora = datetime.utcnow()
+    if time.monotonic() >= _proxima_purga:
+        _proxima_purga = time.monotonic() + PURGA_SEGUNDOS
+        db.execute(_PURGAR, {"ahora": ahora})
+
+    nueva = db.execute(
+        _RESERVAR_CLAVE, {"clave": clave, "huella": huella_cuerpo, "expira": ahora + TTL, "ahora": ahora}
+    ).first()
+    if nueva is not None:
+        return None
+    return db.get(ClaveIdempotencia, clave)
+
+
+def guardar_respuesta(db: Session, clave: str, respuesta: str):
+    db.query(ClaveIdempotencia).filter(ClaveIdempotencia.clave == clave).update(
+        {ClaveIdempotencia.respuesta: respuesta}, synchronize_session=False
+    )
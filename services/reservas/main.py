@@ -1,17 +1,69 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime, timedelta
-from sqlalchemy import or_, and_
+from typing import List, Optional, Tuple, Union
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, or_, and_, insert, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from collections import Counter
+import os
+import json
+import time
+import asyncio
 from pydantic import BaseModel
 
-from models import Reserva, ReservaCreate, ReservaUpdate, ReservaRead, Base
+from models import (
+    Reserva, ReservaCreate, ReservaUpdate, ReservaRead, ReservaPage, ResultadoLote, ResultadoEstadoLote, CambiosReservas, Disponibilidad,
+    Base,
+)
 from database import SessionLocal, engine
+from ocupacion import (
+    SLOT_CAPACITY, SLOT_MINUTES, tomar_plaza, tomar_plazas, liberar_plaza, liberar_plazas, mover_plaza, es_activa,
+    franja_de, franjas_del_dia, ocupacion_rango,
+)
+from cambios import Notificador, cursor_inicial, leer_cambios
+from idempotencia import MAX_CLAVE, guardar_respuesta, huella, reservar_clave
+from commit_agrupado import ACTIVO as GROUP_COMMIT, CommitAgrupado
+from common.metrics import instrument_fastapi
+from common.pagination import encode_cursor, decode_cursor, keyset_page, parse_datetime
+from common.tracing import trace_fastapi, trace_sqlalchemy
+
+# Máximo de días por consulta de disponibilidad
+MAX_DIAS_DISPONIBILIDAD = 31
+
+# Máximo de reservas por petición de importación por lotes
+MAX_RESERVAS_LOTE = int(os.getenv("RESERVAS_BULK_MAX_ITEMS", "5000"))
+
+# Transiciones admitidas por el cambio de estado por lotes (origen -> destinos).
+# Las canceladas y completadas no se reabren en lote: reactivar una reserva
+# necesita plaza en su franja y se hace de una en una con PUT /reservas/{id}/estado.
+TRANSICIONES_LOTE = {
+    "pendiente": ("confirmada", "en_proceso", "cancelada", "completada"),
+    "confirmada": ("pendiente", "en_proceso", "cancelada", "completada"),
+    "en_proceso": ("confirmada", "cancelada", "completada"),
+    "cancelada": (),
+    "completada": (),
+}
+
+# Stream de cambios: filas por lectura del feed y latido sin cambios (segundos)
+LIMITE_STREAM = 500
+LATIDO_STREAM = float(os.getenv("RESERVAS_STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Lecturas del feed simultáneas de todos los streams. Un aviso despierta a la vez
+# a todos los suscriptores del restaurante; sin límite ocuparían el threadpool y
+# el pool de conexiones que necesitan el resto de peticiones.
+lecturas_stream = asyncio.Semaphore(int(os.getenv("RESERVAS_STREAM_MAX_READS", "4")))
 
 class ActualizarEstado(BaseModel):
     """Modelo para actualizar el estado de una reserva."""
     estado: str
 
+class ActualizarEstadoLote(BaseModel):
+    """Modelo para cambiar el estado de varias reservas a la vez."""
+    ids: List[int]
+    estado: str
+
 # Las tablas son creadas por el script de inicialización
 # Base.metadata.create_all(bind=engine)
 
@@ -21,6 +73,24 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Métricas Prometheus en /metrics (latencia por ruta, códigos de estado, en curso)
+metrics = instrument_fastapi(app, "reservas")
+
+# Trazas: span por petición y por consulta SQL, contexto `traceparent` del gateway (ver common/tracing.py)
+trace_fastapi(app, "reservas")
+trace_sqlalchemy(engine)
+
+# Avisos de cambios (LISTEN/NOTIFY) para /reservas/cambios/stream (ver cambios.py)
+notificador = Notificador(engine)
+
+@app.on_event("startup")
+def startup_event():
+    notificador.iniciar()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    notificador.parar()
+
 def get_db():
     db = SessionLocal()
     try:
@@ -41,8 +111,80 @@ def health_check():
     """Endpoint para health check"""
     return {"status": "ok", "timestamp": datetime.now().isoformat()}
 
-@app.post("/reservas/", response_model=ReservaRead, tags=["Reservas"])
-def crear_reserva(reserva: ReservaCreate, db: Session = Depends(get_db)):
+def _reserva_duplicada(e: IntegrityError):
+    """409 si `e` viene del índice único de reservas activas (en lugar del SQL del error)."""
+    # unique_violation en PostgreSQL; SQLite no da código, sólo el mensaje
+    if getattr(e.orig, "pgcode", None) == "23505" or "UNIQUE constraint failed" in str(e.orig):
+        raise HTTPException(
+            status_code=409, detail="El cliente ya tiene una reserva en ese restaurante a esa hora"
+        ) from None
+
+def _insertar_reserva(db: Session, reserva: ReservaCreate, idempotency_key: Optional[str]) -> Tuple[str, bool]:
+    """Valida y crea una reserva en la transacción de `db`, sin confirmarla.
+
+    Devuelve la respuesta en JSON y si es la repetición de una Idempotency-Key ya
+    usada. La comparten `crear_reserva` y el commit agrupado (commit_agrupado.py).
+    """
+    # La repetición de una clave ya usada devuelve la respuesta guardada aunque la
+    # fecha haya pasado desde entonces: se busca antes de validar
+    if idempotency_key:
+        if len(idempotency_key) > MAX_CLAVE:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key admite como máximo {MAX_CLAVE} caracteres")
+        huella_cuerpo = huella(reserva)
+        guardada = reservar_clave(db, idempotency_key, huella_cuerpo)
+        if guardada is not None:
+            if guardada.huella != huella_cuerpo:
+                raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con otra reserva")
+            return guardada.respuesta, True
+    
+    # Validar que la fecha no sea en el pasado
+    if reserva.fecha_reserva < datetime.now():
+        raise HTTPException(status_code=400, detail="La fecha de reserva no puede ser en el pasado")
+    
+    # Validar disponibilidad: ocupa una plaza de la franja de forma atómica
+    # (la fila del contador queda bloqueada hasta el commit, ver ocupacion.py)
+    try:
+        disponible = tomar_plaza(db, reserva.restaurante_id, reserva.fecha_reserva)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not disponible:
+        raise HTTPException(status_code=400, detail="No hay disponibilidad en ese horario")
+    
+    nueva_reserva = Reserva(**reserva.dict())
+    db.add(nueva_reserva)
+    try:
+        db.flush()
+    except IntegrityError as e:
+        _reserva_duplicada(e)
+        raise
+    respuesta = ReservaRead.model_validate(nueva_reserva).model_dump_json()
+    if idempotency_key:
+        # La respuesta se guarda con la clave en la misma transacción que la reserva
+        guardar_respuesta(db, idempotency_key, respuesta)
+    return respuesta, False
+
+# Commit agrupado de las altas (RESERVAS_GROUP_COMMIT=1, ver commit_agrupado.py)
+commit_agrupado = CommitAgrupado(SessionLocal, _insertar_reserva) if GROUP_COMMIT else None
+
+def commit_agrupado_metrics():
+    if commit_agrupado is None:
+        return
+    yield "reservas_group_commit_batches_total", "counter", "Transacciones confirmadas por el commit agrupado.", [
+        ({}, commit_agrupado.lotes)
+    ]
+    yield "reservas_group_commit_items_total", "counter", "Reservas procesadas por el commit agrupado, por resultado.", [
+        ({"resultado": "creada"}, commit_agrupado.reservas),
+        ({"resultado": "rechazada"}, commit_agrupado.rechazadas),
+    ]
+    yield "reservas_group_commit_queued", "gauge", "Reservas esperando lote.", [({}, commit_agrupado.cola.qsize())]
+
+metrics.add_collector(commit_agrupado_metrics)
+
+def crear_reserva(
+    reserva: ReservaCreate,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
     """
     Crear una nueva reserva.
     
@@ -53,37 +195,187 @@ def crear_reserva(reserva: ReservaCreate, db: Session = Depends(get_db)):
     - **fecha_reserva**: Fecha y hora de la reserva
     - **numero_personas**: Número de personas
     - **notas**: Notas adicionales (opcional)
+    
+    Con la cabecera `Idempotency-Key`, repetir la petición con la misma clave
+    devuelve la reserva creada la primera vez (con `Idempotent-Replayed: true`)
+    en lugar de crear otra (ver idempotencia.py).
     """
-    # Validar que la fecha no sea en el pasado
-    if reserva.fecha_reserva < datetime.now():
-        raise HTTPException(status_code=400, detail="La fecha de reserva no puede ser en el pasado")
+    try:
+        respuesta, repetida = _insertar_reserva(db, reserva, idempotency_key)
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    return _respuesta_reserva(respuesta, repetida)
+
+async def crear_reserva_agrupada(reserva: ReservaCreate, idempotency_key: Optional[str] = Header(None)):
+    """
+    Crear una nueva reserva (mismos campos y cabeceras que en el modo normal).
+    
+    Con RESERVAS_GROUP_COMMIT=1 la reserva se confirma en el lote del hilo
+    escritor (ver commit_agrupado.py); la petición lo espera en el event loop
+    sin ocupar un hilo del threadpool ni una sesión propia.
+    """
+    respuesta, repetida = await commit_agrupado.crear(reserva, idempotency_key)
+    return _respuesta_reserva(respuesta, repetida)
+
+def _respuesta_reserva(respuesta: str, repetida: bool) -> Response:
+    headers = {"Idempotent-Replayed": "true"} if repetida else None
+    return Response(content=respuesta, media_type="application/json", headers=headers)
+
+app.post("/reservas/", response_model=ReservaRead, tags=["Reservas"], name="crear_reserva")(
+    crear_reserva_agrupada if commit_agrupado is not None else crear_reserva
+)
+
+@app.post("/reservas/lote", response_model=ResultadoLote, tags=["Reservas"])
+def crear_reservas_lote(reservas: List[ReservaCreate], db: Session = Depends(get_db)):
+    """
+    Crear varias reservas en una sola transacción (importación desde canales externos).
     
-    # Validar disponibilidad
-    reservas_existentes = db.query(Reserva).filter(
-        and_(
-            Reserva.restaurante_id == reserva.restaurante_id,
-            Reserva.fecha_reserva.between(
-                reserva.fecha_reserva - timedelta(hours=2),
-                reserva.fecha_reserva + timedelta(hours=2)
-            ),
-            Reserva.estado != "cancelada"
+    Cada reserva se valida como en `POST /reservas/`, pero la disponibilidad de todo el
+    lote se comprueba con una sola consulta de los contadores de franja y las aceptadas
+    se insertan en un único INSERT de varias filas. Devuelve el resultado de cada
+    reserva en el orden recibido:
+    
+    - **201**: creada (con su `id`)
+    - **400**: fecha en el pasado o franja sin plazas
+    - **409**: duplicada (mismo cliente, restaurante y fecha) en el lote o en la base
+    
+    Dentro de una franja las plazas se asignan por orden de llegada en el lote.
+    """
+    if len(reservas) > MAX_RESERVAS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Como máximo {MAX_RESERVAS_LOTE} reservas por lote")
+    
+    resultados = [None] * len(reservas)
+    ahora = datetime.now()
+    candidatas = []
+    for i, reserva in enumerate(reservas):
+        if reserva.fecha_reserva < ahora:
+            resultados[i] = {"indice": i, "status": 400, "detail": "La fecha de reserva no puede ser en el pasado"}
+        else:
+            candidatas.append((i, reserva))
+    
+    # Duplicados (índice uq_reservas_activas_cliente_restaurante_fecha) con una sola
+    # consulta; las canceladas no cuentan
+    clave = (Reserva.cliente_email, Reserva.restaurante_id, Reserva.fecha_reserva)
+    claves = {(r.cliente_email, r.restaurante_id, r.fecha_reserva) for _, r in candidatas}
+    vistas = set(
+        db.query(*clave)
+        .filter(tuple_(*clave).in_(list(claves)), func.coalesce(Reserva.estado, "pendiente") != "cancelada")
+        .all()
+    ) if claves else set()
+    unicas = []
+    for i, reserva in candidatas:
+        k = (reserva.cliente_email, reserva.restaurante_id, reserva.fecha_reserva)
+        if k in vistas:
+            resultados[i] = {"indice": i, "status": 409, "detail": "Reserva duplicada"}
+        else:
+            vistas.add(k)
+            unicas.append((i, reserva))
+    
+    try:
+        libres = tomar_plazas(db, Counter((r.restaurante_id, franja_de(r.fecha_reserva)) for _, r in unicas))
+        aceptadas = []
+        for i, reserva in unicas:
+            franja = (reserva.restaurante_id, franja_de(reserva.fecha_reserva))
+            if libres[franja] > 0:
+                libres[franja] -= 1
+                aceptadas.append((i, reserva))
+            else:
+                resultados[i] = {"indice": i, "status": 400, "detail": "No hay disponibilidad en ese horario"}
+        
+        ids = []
+        if aceptadas:
+            ids = db.execute(
+                insert(Reserva).returning(Reserva.id, sort_by_parameter_order=True),
+                [reserva.dict() for _, reserva in aceptadas],
+            ).scalars().all()
+        db.commit()
+    except IntegrityError:
+        # Otra petición creó a la vez una reserva con la misma clave: se deshace el lote
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Conflicto con reservas creadas a la vez, reintente el lote")
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    for (i, _), reserva_id in zip(aceptadas, ids):
+        resultados[i] = {"indice": i, "status": 201, "id": reserva_id}
+    return {"creadas": len(aceptadas), "rechazadas": len(reservas) - len(aceptadas), "resultados": resultados}
+
+@app.put("/reservas/lote/estado", response_model=ResultadoEstadoLote, tags=["Reservas"])
+def actualizar_estado_lote(data: ActualizarEstadoLote, db: Session = Depends(get_db)):
+    """
+    Cambiar el estado de varias reservas con un único UPDATE ... RETURNING.
+    
+    - **ids**: IDs de las reservas
+    - **estado**: Nuevo estado (pendiente, confirmada, en_proceso, cancelada, completada)
+    
+    Sólo se actualizan las reservas cuyo estado actual admite la transición
+    (ver `TRANSICIONES_LOTE`). Devuelve el resultado de cada id en el orden recibido:
+    
+    - **200**: actualizada o ya estaba en ese estado
+    - **404**: la reserva no existe
+    - **409**: transición no permitida desde su estado actual
+    """
+    estado = data.estado.lower()
+    if estado not in TRANSICIONES_LOTE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Estado inválido. Permitidos: {', '.join(TRANSICIONES_LOTE)}"
         )
-    ).count()
+    ids = list(dict.fromkeys(data.ids))
+    if len(ids) > MAX_RESERVAS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Como máximo {MAX_RESERVAS_LOTE} reservas por lote")
     
-    if reservas_existentes >= 3:  # Límite de reservas por franja horaria
-        raise HTTPException(status_code=400, detail="No hay disponibilidad en ese horario")
+    origenes = [origen for origen, destinos in TRANSICIONES_LOTE.items() if estado in destinos]
+    condicion = Reserva.estado.in_(origenes)
+    if "pendiente" in origenes:
+        condicion = or_(condicion, Reserva.estado.is_(None))
     
-    nueva_reserva = Reserva(**reserva.dict())
-    db.add(nueva_reserva)
     try:
+        actualizadas = db.execute(
+            update(Reserva)
+            .where(Reserva.id.in_(ids), condicion)
+            .values(estado=estado)
+            .returning(Reserva.id, Reserva.restaurante_id, Reserva.fecha_reserva)
+            .execution_options(synchronize_session=False)
+        ).all() if ids else []
+        # Todos los orígenes admitidos son estados activos: sólo cancelar libera plazas
+        if estado == "cancelada":
+            liberar_plazas(db, Counter((r.restaurante_id, franja_de(r.fecha_reserva)) for r in actualizadas))
+        hechas = {r.id for r in actualizadas}
+        restantes = [i for i in ids if i not in hechas]
+        actuales = dict(
+            db.query(Reserva.id, Reserva.estado).filter(Reserva.id.in_(restantes)).all()
+        ) if restantes else {}
         db.commit()
-        db.refresh(nueva_reserva)
-        return nueva_reserva
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
+    
+    resultados = []
+    for reserva_id in ids:
+        if reserva_id in hechas:
+            resultados.append({"id": reserva_id, "status": 200, "estado": estado})
+        elif reserva_id not in actuales:
+            resultados.append({"id": reserva_id, "status": 404, "detail": "Reserva no encontrada"})
+        else:
+            actual = actuales[reserva_id] or "pendiente"
+            if actual == estado:
+                resultados.append({"id": reserva_id, "status": 200, "estado": estado})
+            else:
+                resultados.append({
+                    "id": reserva_id, "status": 409, "estado": actual,
+                    "detail": f"No se puede pasar de {actual} a {estado}",
+                })
+    correctas = sum(1 for r in resultados if r["status"] == 200)
+    return {"actualizadas": correctas, "rechazadas": len(resultados) - correctas, "resultados": resultados}
 
-@app.get("/reservas/", response_model=List[ReservaRead], tags=["Reservas"])
+@app.get("/reservas/", response_model=Union[List[ReservaRead], ReservaPage], tags=["Reservas"])
 def obtener_reservas(
     restaurante_id: Optional[int] = None,
     estado: Optional[str] = None,
@@ -92,10 +384,11 @@ def obtener_reservas(
     cliente_email: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Paginación por cursor: vacío para la primera página"),
     db: Session = Depends(get_db)
 ):
     """
-    Obtener lista de reservas con filtros opcionales.
+    Obtener lista de reservas con filtros opcionales, ordenadas por fecha_reserva e id.
     
     - **restaurante_id**: Filtrar por restaurante
     - **estado**: Filtrar por estado de la reserva
@@ -104,6 +397,8 @@ def obtener_reservas(
     - **cliente_email**: Filtrar por email del cliente
     - **skip**: Número de registros a saltar (paginación)
     - **limit**: Número máximo de registros a retornar
+    - **cursor**: Si se indica (vacío para empezar) se pagina por (fecha_reserva, id) y la
+      respuesta es `{items, next_cursor}`; la siguiente página se pide con `cursor=next_cursor`
     """
     query = db.query(Reserva)
     
@@ -118,7 +413,179 @@ def obtener_reservas(
     if cliente_email:
         query = query.filter(Reserva.cliente_email == cliente_email)
     
-    return query.offset(skip).limit(limit).all()
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_page(
+                query, (Reserva.fecha_reserva, Reserva.id), (parse_datetime, int), cursor, limit
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"items": items, "next_cursor": next_cursor}
+    
+    return query.order_by(Reserva.fecha_reserva, Reserva.id).offset(skip).limit(limit).all()
+
+# Declarada antes de /reservas/{reserva_id} para que "cambios" no se tome como ID
+@app.get("/reservas/cambios", response_model=CambiosReservas, tags=["Reservas"])
+def obtener_cambios(
+    cursor: Optional[str] = Query(None, description="next_cursor de la consulta anterior; vacío para empezar"),
+    restaurante_id: Optional[List[int]] = Query(None),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Feed de cambios para sincronización incremental, ordenado por (updated_at, id).
+    
+    - **cursor**: `next_cursor` de la consulta anterior (sin cursor, todas las reservas)
+    - **restaurante_id**: Filtrar por uno o varios restaurantes (`?restaurante_id=1&restaurante_id=2`)
+    - **limit**: Número máximo de cambios por consulta
+    
+    Las reservas canceladas llegan como marcas en `eliminadas` (id, restaurante_id,
+    updated_at). Mientras `has_more` sea true hay más cambios pendientes.
+    """
+    try:
+        desde = decode_cursor(cursor, (parse_datetime, int)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filas, siguiente, has_more = leer_cambios(db, desde, restaurante_id, limit)
+    return {
+        "items": [r for r in filas if es_activa(r.estado)],
+        "eliminadas": [r for r in filas if not es_activa(r.estado)],
+        "next_cursor": encode_cursor(siguiente),
+        "has_more": has_more,
+    }
+
+def _leer_cambios_stream(desde, restaurante_ids):
+    """Lectura del feed para el stream, con su propia sesión (se ejecuta en el threadpool)."""
+    db = SessionLocal()
+    try:
+        filas, siguiente, has_more = leer_cambios(db, desde, restaurante_ids, LIMITE_STREAM)
+        return [(r.id, r.updated_at, ReservaRead.model_validate(r)) for r in filas], siguiente, has_more
+    finally:
+        db.close()
+
+@app.get("/reservas/cambios/stream", tags=["Reservas"])
+async def stream_cambios(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor del feed; sin él, los cambios a partir de ahora"),
+    restaurante_id: Optional[List[int]] = Query(None),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events con los cambios del feed en cuanto se confirman.
+    
+    - **cursor**: Cursor desde el que empezar (sin él, desde ahora)
+    - **restaurante_id**: Filtrar por uno o varios restaurantes
+    
+    Cada evento `cambios` lleva `{items, eliminadas, next_cursor}` como
+    `GET /reservas/cambios` y su `id` es el cursor: al reconectar, `Last-Event-ID`
+    continúa donde se quedó. Sin cambios se envía un comentario de latido.
+    """
+    try:
+        inicial = last_event_id or cursor
+        desde = decode_cursor(inicial, (parse_datetime, int)) if inicial else cursor_inicial()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    suscripcion = notificador.suscribir(restaurante_id)
+
+    async def eventos():
+        nonlocal desde
+        # Cambios ya enviados que el cursor (retenido por el margen) volverá a leer
+        enviados = {}
+        ultimo_envio = time.monotonic()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                async with lecturas_stream:
+                    filas, desde, has_more = await run_in_threadpool(_leer_cambios_stream, desde, restaurante_id)
+                nuevas = [r for id_, updated_at, r in filas if enviados.get(id_) != updated_at]
+                for id_, updated_at, _ in filas:
+                    enviados[id_] = updated_at
+                enviados = {k: v for k, v in enviados.items() if (v, k) >= desde}
+                if nuevas:
+                    datos = {
+                        "items": [r.model_dump(mode="json") for r in nuevas if es_activa(r.estado)],
+                        "eliminadas": [
+                            {"id": r.id, "restaurante_id": r.restaurante_id, "updated_at": r.updated_at.isoformat()}
+                            for r in nuevas if not es_activa(r.estado)
+                        ],
+                        "next_cursor": encode_cursor(desde),
+                    }
+                    yield f"id: {datos['next_cursor']}\nevent: cambios\ndata: {json.dumps(datos)}\n\n"
+                    ultimo_envio = time.monotonic()
+                if has_more:
+                    continue
+                await suscripcion.esperar(notificador.intervalo)
+                if await request.is_disconnected():
+                    break
+                if time.monotonic() - ultimo_envio >= LATIDO_STREAM:
+                    yield ": ping\n\n"
+                    ultimo_envio = time.monotonic()
+        finally:
+            notificador.cancelar(suscripcion)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Declarada antes de /reservas/{reserva_id} para que "disponibilidad" no se tome como ID.
+# El gateway la cachea y la invalida con cualquier escritura en reservas/reservas.
+@app.get("/reservas/disponibilidad", response_model=Disponibilidad, tags=["Reservas"])
+def obtener_disponibilidad(
+    restaurante_id: int,
+    fecha_inicio: date,
+    fecha_fin: Optional[date] = None,
+    hora_inicio: int = Query(12, ge=0, le=23),
+    hora_fin: int = Query(22, ge=0, le=23),
+    db: Session = Depends(get_db)
+):
+    """
+    Plazas libres por franja horaria de un restaurante en un rango de días.
+    
+    - **restaurante_id**: ID del restaurante
+    - **fecha_inicio**: Primer día (YYYY-MM-DD)
+    - **fecha_fin**: Último día, incluido (por defecto, el mismo que fecha_inicio)
+    - **hora_inicio** / **hora_fin**: Primera y última hora de reserva de cada día
+    
+    Las franjas ya pasadas no se incluyen. Se resuelve con una sola lectura de
+    `ocupacion_franjas` para todo el rango.
+    """
+    fecha_fin = fecha_fin or fecha_inicio
+    if fecha_fin < fecha_inicio:
+        raise HTTPException(status_code=400, detail="fecha_fin no puede ser anterior a fecha_inicio")
+    if (fecha_fin - fecha_inicio).days >= MAX_DIAS_DISPONIBILIDAD:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {MAX_DIAS_DISPONIBILIDAD} días")
+    if hora_fin < hora_inicio:
+        raise HTTPException(status_code=400, detail="hora_fin no puede ser anterior a hora_inicio")
+    
+    dias = [fecha_inicio + timedelta(days=i) for i in range((fecha_fin - fecha_inicio).days + 1)]
+    franjas_por_dia = [(dia, franjas_del_dia(dia, hora_inicio, hora_fin)) for dia in dias]
+    desde = franjas_por_dia[0][1][0]
+    hasta = franjas_por_dia[-1][1][-1] + timedelta(minutes=SLOT_MINUTES)
+    ocupacion = ocupacion_rango(db, restaurante_id, desde, hasta)
+    
+    ahora = datetime.now()
+    return {
+        "restaurante_id": restaurante_id,
+        "capacidad": SLOT_CAPACITY,
+        "minutos_franja": SLOT_MINUTES,
+        "dias": [
+            {
+                "fecha": dia,
+                "franjas": [
+                    {
+                        "inicio": franja,
+                        "hora": franja.strftime("%H:%M"),
+                        "libres": max(0, SLOT_CAPACITY - ocupacion.get(franja, 0)),
+                    }
+                    for franja in franjas
+                    if franja >= ahora
+                ],
+            }
+            for dia, franjas in franjas_por_dia
+        ],
+    }
 
 @app.get("/reservas/{reserva_id}", response_model=ReservaRead, tags=["Reservas"])
 def obtener_reserva(reserva_id: int, db: Session = Depends(get_db)):
@@ -144,7 +611,7 @@ def actualizar_reserva(
     - **reserva_id**: ID de la reserva a actualizar
     - **reserva_update**: Datos a actualizar (todos los campos son opcionales)
     """
-    reserva = db.query(Reserva).filter(Reserva.id == reserva_id).first()
+    reserva = db.query(Reserva).filter(Reserva.id == reserva_id).with_for_update().first()
     if reserva is None:
         raise HTTPException(status_code=404, detail="Reserva no encontrada")
     
@@ -155,15 +622,25 @@ def actualizar_reserva(
         if update_data["fecha_reserva"] < datetime.now():
             raise HTTPException(status_code=400, detail="La fecha de reserva no puede ser en el pasado")
     
+    antes = (reserva.restaurante_id, reserva.fecha_reserva, es_activa(reserva.estado))
     for field, value in update_data.items():
         setattr(reserva, field, value)
+    despues = (reserva.restaurante_id, reserva.fecha_reserva, es_activa(reserva.estado))
     
     try:
+        if not mover_plaza(db, antes, despues):
+            db.rollback()
+            raise HTTPException(status_code=400, detail="No hay disponibilidad en ese horario")
         db.commit()
         db.refresh(reserva)
         return reserva
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
+        # Reactivar o mover la reserva puede chocar con otra activa del mismo cliente
+        if isinstance(e, IntegrityError):
+            _reserva_duplicada(e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/reservas/{reserva_id}", status_code=204, tags=["Reservas"])
@@ -173,13 +650,15 @@ def eliminar_reserva(reserva_id: int, db: Session = Depends(get_db)):
     
     - **reserva_id**: ID de la reserva a cancelar
     """
-    reserva = db.query(Reserva).filter(Reserva.id == reserva_id).first()
+    reserva = db.query(Reserva).filter(Reserva.id == reserva_id).with_for_update().first()
     if reserva is None:
         raise HTTPException(status_code=404, detail="Reserva no encontrada")
     
-    # En lugar de eliminar, marcamos como cancelada
-    reserva.estado = "cancelada"
+    # En lugar de eliminar, marcamos como cancelada y se libera su plaza
     try:
+        if es_activa(reserva.estado):
+            liberar_plaza(db, reserva.restaurante_id, reserva.fecha_reserva)
+        reserva.estado = "cancelada"
         db.commit()
     except Exception as e:
         db.rollback()
@@ -197,7 +676,7 @@ def actualizar_estado_reserva(
     - **reserva_id**: ID de la reserva
     - **estado**: Nuevo estado (pendiente, confirmada, en_proceso, cancelada, completada)
     """
-    reserva = db.query(Reserva).filter(Reserva.id == reserva_id).first()
+    reserva = db.query(Reserva).filter(Reserva.id == reserva_id).with_for_update().first()
     if reserva is None:
         raise HTTPException(status_code=404, detail="Reserva no encontrada")
     
@@ -209,11 +688,21 @@ def actualizar_estado_reserva(
             detail=f"Estado inválido. Permitidos: {', '.join(estados_permitidos)}"
         )
     
+    antes = (reserva.restaurante_id, reserva.fecha_reserva, es_activa(reserva.estado))
     reserva.estado = data.estado.lower()
+    despues = (reserva.restaurante_id, reserva.fecha_reserva, es_activa(reserva.estado))
     try:
+        if not mover_plaza(db, antes, despues):
+            db.rollback()
+            raise HTTPException(status_code=400, detail="No hay disponibilidad en ese horario")
         db.commit()
         db.refresh(reserva)
         return reserva
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
+        # Reactivar o mover la reserva puede chocar con otra activa del mismo cliente
+        if isinstance(e, IntegrityError):
+            _reserva_duplicada(e)
         raise HTTPException(status_code=400, detail=str(e))
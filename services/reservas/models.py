@@ -1,9 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, Text, text
 from sqlalchemy.orm import declarative_base
-from datetime import datetime
+from datetime import datetime, date
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 # Define la base declarativa
 Base = declarative_base()
@@ -28,10 +28,66 @@ class Reserva(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Mismos índices que la migración 3 de scripts/migrations.py (filtros de obtener_reservas
+    # y claves de la paginación por cursor)
+    __table_args__ = (
+        Index("ix_reservas_fecha_id", "fecha_reserva", "id"),
+        Index("ix_reservas_restaurante_fecha_id", "restaurante_id", "fecha_reserva", "id"),
+        Index("ix_reservas_estado_fecha_id", "estado", "fecha_reserva", "id"),
+        Index("ix_reservas_cliente_email_fecha_id", "cliente_email", "fecha_reserva", "id"),
+        # Feed de cambios (migración 5): orden (updated_at, id), con o sin filtro por restaurante
+        Index("ix_reservas_restaurante_updated_id", "restaurante_id", "updated_at", "id"),
+        Index("ix_reservas_updated_id", "updated_at", "id"),
+        # Un cliente sin dos reservas activas a la misma hora en un restaurante; las
+        # canceladas no cuentan (migración 8)
+        Index(
+            "uq_reservas_activas_cliente_restaurante_fecha", "cliente_email", "restaurante_id", "fecha_reserva",
+            unique=True,
+            postgresql_where=text("COALESCE(estado, 'pendiente') <> 'cancelada'"),
+            sqlite_where=text("COALESCE(estado, 'pendiente') <> 'cancelada'"),
+        ),
+    )
+
     def __repr__(self):
         return f"<Reserva(id={self.id}, cliente={self.cliente_nombre}, fecha={self.fecha_reserva})>"
 
 
+class OcupacionFranja(Base):
+    """
+    Contador de reservas activas (no canceladas) por restaurante y franja horaria.
+
+    Se actualiza en la misma transacción que la reserva (ver ocupacion.py), así
+    que comprobar la disponibilidad es leer una fila en lugar de contar reservas.
+    """
+    __tablename__ = "ocupacion_franjas"
+
+    restaurante_id = Column(Integer, primary_key=True)
+    franja = Column(DateTime, primary_key=True)  # inicio de la franja
+    reservas = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<OcupacionFranja(restaurante={self.restaurante_id}, franja={self.franja}, reservas={self.reservas})>"
+
+
+class ClaveIdempotencia(Base):
+    """
+    Idempotency-Key de una reserva creada con `POST /reservas/` y su respuesta (ver idempotencia.py).
+    """
+    __tablename__ = "idempotencia_reservas"
+
+    clave = Column(String(255), primary_key=True)
+    huella = Column(String(32), nullable=False)  # hash del cuerpo de la petición
+    respuesta = Column(Text)  # ReservaRead en JSON
+    expira = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotencia_reservas_expira", "expira"),
+    )
+
+    def __repr__(self):
+        return f"<ClaveIdempotencia(clave={self.clave}, expira={self.expira})>"
+
+
 # Modelos Pydantic para validación de datos
 
 class ReservaBase(BaseModel):
@@ -72,3 +128,82 @@ class ReservaRead(ReservaBase):
     class Config:
         # Compatibilidad Pydantic v2
         from_attributes = True
+
+
+class ReservaPage(BaseModel):
+    """Página de reservas con el cursor de la siguiente (None si es la última)."""
+    items: List[ReservaRead]
+    next_cursor: Optional[str] = None
+
+
+class ReservaEliminada(BaseModel):
+    """Marca (tombstone) de una reserva cancelada en el feed de cambios."""
+    id: int
+    restaurante_id: int
+    updated_at: datetime
+
+
+class CambiosReservas(BaseModel):
+    """Cambios posteriores a un cursor del feed: reservas activas y marcas de canceladas.
+
+    `next_cursor` siempre tiene valor y es el que se envía en la siguiente consulta;
+    `has_more` indica que quedan cambios sin devolver en esta página.
+    """
+    items: List[ReservaRead]
+    eliminadas: List[ReservaEliminada]
+    next_cursor: str
+    has_more: bool
+
+
+class ResultadoReservaLote(BaseModel):
+    """Resultado de una reserva de un lote: 201 creada, 400 rechazada o 409 duplicada."""
+    indice: int
+    status: int
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class ResultadoLote(BaseModel):
+    """Resumen de un lote de reservas con el resultado de cada una, en el orden recibido."""
+    creadas: int
+    rechazadas: int
+    resultados: List[ResultadoReservaLote]
+
+
+class ResultadoEstadoReserva(BaseModel):
+    """Resultado de una reserva en un cambio de estado por lotes.
+
+    200 actualizada (o ya estaba en ese estado), 404 no existe o 409 transición no permitida.
+    """
+    id: int
+    status: int
+    estado: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class ResultadoEstadoLote(BaseModel):
+    """Resumen de un cambio de estado por lotes, con el resultado de cada id en el orden recibido."""
+    actualizadas: int
+    rechazadas: int
+    resultados: List[ResultadoEstadoReserva]
+
+
+class FranjaDisponible(BaseModel):
+    """Plazas libres de una franja horaria."""
+    inicio: datetime
+    hora: str
+    libres: int
+
+
+class DiaDisponible(BaseModel):
+    """Franjas de un día, en orden."""
+    fecha: date
+    franjas: List[FranjaDisponible]
+
+
+class Disponibilidad(BaseModel):
+    """Disponibilidad de un restaurante en un rango de días."""
+    restaurante_id: int
+    capacidad: int
+    minutos_franja: int
+    dias: List[DiaDisponible]
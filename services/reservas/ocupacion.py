@@ -0,0 +1,174 @@
+"""Ocupación de franjas horarias con contadores actualizados de forma atómica.
+
+Cada reserva activa (estado distinto de `cancelada`) ocupa una plaza en la
+franja de RESERVAS_SLOT_MINUTES minutos (60 por defecto) que contiene su
+`fecha_reserva`; una franja admite RESERVAS_SLOT_CAPACITY reservas (3).
+
+La plaza se toma con un único upsert condicional sobre `ocupacion_franjas`:
+
+    INSERT ... ON CONFLICT (restaurante_id, franja)
+    DO UPDATE SET reservas = reservas + 1 WHERE reservas < capacidad
+    RETURNING reservas
+
+Si no devuelve fila la franja está llena. La fila queda bloqueada hasta el
+commit de la reserva, de modo que peticiones concurrentes a la misma franja se
+serializan y nunca se supera la capacidad; un rollback deshace el incremento.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import DateTime, bindparam, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import OcupacionFranja
+
+SLOT_MINUTES = int(os.getenv("RESERVAS_SLOT_MINUTES", "60"))
+SLOT_CAPACITY = int(os.getenv("RESERVAS_SLOT_CAPACITY", "3"))
+
+ESTADO_CANCELADA = "cancelada"
+
+_EPOCH = datetime(1970, 1, 1)
+
+_TOMAR_PLAZA = text(
+    """
+    INSERT INTO ocupacion_franjas (restaurante_id, franja, reservas)
+    VALUES (:restaurante_id, :franja, 1)
+    ON CONFLICT (restaurante_id, franja)
+    DO UPDATE SET reservas = ocupacion_franjas.reservas + 1
+    WHERE ocupacion_franjas.reservas < :capacidad
+    RETURNING reservas
+    """
+).bindparams(bindparam("franja", type_=DateTime))
+
+_LIBERAR_PLAZA = text(
+    """
+    UPDATE ocupacion_franjas SET reservas = reservas - 1
+    WHERE restaurante_id = :restaurante_id AND franja = :franja AND reservas > 0
+    """
+).bindparams(bindparam("franja", type_=DateTime))
+
+_LIBERAR_PLAZAS = text(
+    """
+    UPDATE ocupacion_franjas SET reservas = CASE WHEN reservas > :n THEN reservas - :n ELSE 0 END
+    WHERE restaurante_id = :restaurante_id AND franja = :franja
+    """
+).bindparams(bindparam("franja", type_=DateTime))
+
+
+def franja_de(fecha: datetime) -> datetime:
+    """Inicio de la franja que contiene `fecha` (misma cuenta que scripts/init_db.py)."""
+    segundos = SLOT_MINUTES * 60
+    transcurrido = int((fecha.replace(tzinfo=None) - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=transcurrido // segundos * segundos)
+
+
+def es_activa(estado) -> bool:
+    return (estado or "pendiente") != ESTADO_CANCELADA
+
+
+def tomar_plaza(db: Session, restaurante_id: int, fecha: datetime) -> bool:
+    """Ocupa una plaza de la franja dentro de la transacción de `db`. False si está llena."""
+    fila = db.execute(
+        _TOMAR_PLAZA,
+        {"restaurante_id": restaurante_id, "franja": franja_de(fecha), "capacidad": SLOT_CAPACITY},
+    ).first()
+    return fila is not None
+
+
+def liberar_plaza(db: Session, restaurante_id: int, fecha: datetime):
+    db.execute(_LIBERAR_PLAZA, {"restaurante_id": restaurante_id, "franja": franja_de(fecha)})
+
+
+def liberar_plazas(db: Session, liberadas: Dict[Tuple[int, datetime], int]):
+    """Versión por lotes de `liberar_plaza`: {(restaurante_id, franja): plazas liberadas}."""
+    if liberadas:
+        db.execute(
+            _LIBERAR_PLAZAS,
+            [{"restaurante_id": r, "franja": f, "n": n} for (r, f), n in sorted(liberadas.items())],
+        )
+
+
+def mover_plaza(db: Session, antes: tuple, despues: tuple) -> bool:
+    """Ajusta la ocupación al pasar una reserva de `antes` a `despues`.
+
+    Cada estado es (restaurante_id, fecha_reserva, activa). Devuelve False si la
+    nueva franja está llena (la transacción debe deshacerse).
+    """
+    restaurante_antes, fecha_antes, activa_antes = antes
+    restaurante_despues, fecha_despues, activa_despues = despues
+    misma_franja = restaurante_antes == restaurante_despues and franja_de(fecha_antes) == franja_de(fecha_despues)
+    if activa_antes and activa_despues and misma_franja:
+        return True
+    if activa_despues and not tomar_plaza(db, restaurante_despues, fecha_despues):
+        return False
+    if activa_antes:
+        liberar_plaza(db, restaurante_antes, fecha_antes)
+    return True
+
+
+def franjas_del_dia(dia: date, hora_inicio: int, hora_fin: int) -> List[datetime]:
+    """Inicios de franja de `dia` entre hora_inicio:00 y hora_fin:00, ambas incluidas."""
+    inicio = datetime.combine(dia, time(hora_inicio))
+    fin = datetime.combine(dia, time(hora_fin))
+    paso = timedelta(minutes=SLOT_MINUTES)
+    franjas = []
+    actual = franja_de(inicio)
+    while actual <= fin:
+        franjas.append(actual)
+        actual += paso
+    return franjas
+
+
+def ocupacion_rango(db: Session, restaurante_id: int, desde: datetime, hasta: datetime) -> Dict[datetime, int]:
+    """Reservas activas por franja en [desde, hasta): una lectura por rango de la clave primaria."""
+    filas = db.query(OcupacionFranja.franja, OcupacionFranja.reservas).filter(
+        OcupacionFranja.restaurante_id == restaurante_id,
+        OcupacionFranja.franja >= desde,
+        OcupacionFranja.franja < hasta,
+    ).all()
+    return {franja: reservas for franja, reservas in filas}
+
+
+def _insert_ocupacion(db: Session):
+    """INSERT sobre ocupacion_franjas con ON CONFLICT del dialecto en uso (PostgreSQL o SQLite)."""
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialecto.insert(OcupacionFranja.__table__)
+
+
+def tomar_plazas(db: Session, pedidas: Dict[Tuple[int, datetime], int]) -> Dict[Tuple[int, datetime], int]:
+    """Versión por lotes de `tomar_plaza`: {(restaurante_id, franja): plazas pedidas} -> concedidas.
+
+    Tres sentencias sea cual sea el tamaño del lote: crear los contadores que
+    falten, bloquearlos y leerlos todos de una vez (en orden de clave, para que
+    dos lotes no se bloqueen mutuamente) y sumar las plazas concedidas.
+    """
+    if not pedidas:
+        return {}
+    claves = sorted(pedidas)
+    clave = (OcupacionFranja.restaurante_id, OcupacionFranja.franja)
+    insert = _insert_ocupacion(db)
+    db.execute(
+        insert.on_conflict_do_nothing(index_elements=["restaurante_id", "franja"]),
+        [{"restaurante_id": r, "franja": f, "reservas": 0} for r, f in claves],
+    )
+    ocupadas = {
+        (r, f): n
+        for r, f, n in db.query(*clave, OcupacionFranja.reservas)
+        .filter(tuple_(*clave).in_(claves))
+        .order_by(*clave)
+        .with_for_update()
+        .all()
+    }
+    concedidas = {k: max(0, min(pedidas[k], SLOT_CAPACITY - ocupadas.get(k, 0))) for k in claves}
+    incrementos = [{"restaurante_id": r, "franja": f, "reservas": n} for (r, f), n in concedidas.items() if n]
+    if incrementos:
+        db.execute(
+            insert.on_conflict_do_update(
+                index_elements=["restaurante_id", "franja"],
+                set_={"reservas": OcupacionFranja.__table__.c.reservas + insert.excluded.reservas},
+            ),
+            incrementos,
+        )
+    return concedidas
@@ -1,6 +1,6 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import List, Optional, Union
 from sqlalchemy.orm import Session
 import os
 
@@ -9,18 +9,35 @@ from database import get_db, wait_for_db, engine
 import secrets
 import logging
 from common.helpers.utils import send_request_to_service
+from common.metrics import instrument_fastapi
+from common.pagination import keyset_page
+from common.schema import schema_is_current
+from common.tracing import trace_fastapi, trace_sqlalchemy
 
 logger = logging.getLogger(__name__)
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8004")
 
+# Versión de scripts/migrations.py que incluye todo lo que necesita este servicio (owner_email)
+REQUIRED_SCHEMA_VERSION = 1
+
 app = FastAPI(title="Restaurantes Service")
 
+# Métricas Prometheus en /metrics (latencia por ruta, códigos de estado, en curso)
+instrument_fastapi(app, "restaurantes")
+
+# Trazas: span por petición y por consulta SQL, contexto `traceparent` del gateway (ver common/tracing.py)
+trace_fastapi(app, "restaurantes")
+trace_sqlalchemy(engine)
+
 
 @app.on_event("startup")
 def startup_event():
     # Esperar a que la base de datos esté lista antes de aceptar peticiones.
     try:
         wait_for_db(timeout=30)
+        if schema_is_current(engine, REQUIRED_SCHEMA_VERSION):
+            # Esquema gestionado por las migraciones: nada que crear ni inspeccionar
+            return
         # Crear tablas si no existen (útil en entornos de desarrollo)
         models.Base.metadata.create_all(bind=engine)
 
@@ -107,9 +124,30 @@ def create_restaurante(rest: models.RestauranteCreate, db: Session = Depends(get
     return result
 
 
-@app.get("/restaurantes/", response_model=List[models.RestauranteRead], tags=["restaurantes"])
-def list_restaurantes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    items = db.query(models.Restaurante).offset(skip).limit(limit).all()
+@app.get(
+    "/restaurantes/",
+    response_model=Union[List[models.RestauranteRead], models.RestaurantePage],
+    tags=["restaurantes"],
+)
+def list_restaurantes(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Paginación por cursor: vacío para la primera página"),
+    db: Session = Depends(get_db),
+):
+    """Lista de restaurantes ordenada por id.
+
+    Con `cursor` (vacío para empezar) se pagina por id y la respuesta es
+    `{items, next_cursor}`; sin él se mantiene skip/limit y la lista simple.
+    """
+    query = db.query(models.Restaurante)
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_page(query, (models.Restaurante.id,), (int,), cursor, max(1, min(limit, 100)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"items": items, "next_cursor": next_cursor}
+    items = query.order_by(models.Restaurante.id).offset(skip).limit(limit).all()
     return items
 
 
@@ -3,7 +3,7 @@ from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 # Define la base declarativa
 Base = declarative_base()
@@ -77,3 +77,9 @@ class RestauranteRead(RestauranteBase):
 
     class Config:
         orm_mode = True
+
+
+class RestaurantePage(BaseModel):
+    """Página de restaurantes con el cursor de la siguiente (None si es la última)."""
+    items: List[RestauranteRead]
+    next_cursor: Optional[str] = None
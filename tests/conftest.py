@@ -0,0 +1,46 @@
+"""Rutas de importación y base SQLite para las pruebas unitarias.
+
+El gateway (`api-gateway/`, con guion) y los servicios no son paquetes: se
+ejecutan desde su directorio, así que sus módulos se importan por nombre
+(`import cache`, `import ocupacion`) igual que en producción.
+
+services/reservas/main.py exige DATABASE_URL al importarse; las pruebas llaman
+a sus endpoints directamente con una sesión de `reservas_engine` (SQLite en
+memoria), sin arrancar la aplicación.
+"""
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, "api-gateway"), os.path.join(ROOT, "services", "reservas")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+@pytest.fixture
+def reservas_engine():
+    """Esquema de reservas en una base SQLite en memoria compartida entre hilos."""
+    from models import Base
+
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    # pysqlite abre las transacciones por su cuenta y rompe los SAVEPOINT:
+    # se desactiva y el BEGIN lo emite SQLAlchemy
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
@@ -0,0 +1,102 @@
+"""Pruebas unitarias de api-gateway/admission.py (sin docker)."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import admission
+from admission import AdmissionController, parse_rules
+
+
+def _controller(max_concurrency: int = 1, queue_limit: int = 10, max_wait: float = 1.0) -> AdmissionController:
+    return AdmissionController(
+        rules=parse_rules("POST reservas/reservas=critical,* auth=high,GET restaurantes=low"),
+        max_concurrency=max_concurrency,
+        queue_limits={c: queue_limit for c in admission.PRIORITY_CLASSES},
+        target_delay=0.05,
+        interval=0.1,
+        max_wait=max_wait,
+        shed_classes=("low",),
+    )
+
+
+def test_classify():
+    controller = _controller()
+    assert controller.classify("POST", "reservas/reservas/") == "critical"
+    assert controller.classify("GET", "auth/me") == "high"
+    assert controller.classify("GET", "restaurantes/restaurantes/") == "low"
+    assert controller.classify("GET", "reservas/reservas/") == "normal"
+    assert parse_rules("GET x=urgente,POST=low") == []
+
+
+def test_release_hands_slot_to_highest_priority():
+    controller = _controller()
+    order = []
+
+    async def wait(priority):
+        assert await controller.acquire(priority)
+        order.append(priority)
+
+    async def run():
+        assert await controller.acquire("normal")
+        tasks = [asyncio.ensure_future(wait(p)) for p in ("low", "normal", "critical")]
+        await asyncio.sleep(0)
+        for _ in tasks:
+            controller.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["critical", "normal", "low"]
+
+
+def test_full_queue_and_max_wait_are_rejected():
+    controller = _controller(queue_limit=1, max_wait=0.05)
+
+    async def run():
+        assert await controller.acquire("normal")
+        waiting = asyncio.ensure_future(controller.acquire("normal"))
+        await asyncio.sleep(0)
+        # La cola de la clase está llena
+        assert not await controller.acquire("normal")
+        # La que esperaba vence su plazo sin hueco
+        assert not await waiting
+
+    asyncio.run(run())
+    assert controller.shed["normal"] == 2
+    assert controller.stats()["queued"]["normal"] == 0
+
+
+def test_codel_overload_sheds_low_priority(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(admission, "time", SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    controller = _controller()
+
+    # Retardo de cola por encima del objetivo durante un intervalo completo
+    controller._observe_delay(0.2)
+    assert not controller.overloaded
+    clock.now += 0.15
+    controller._observe_delay(0.2)
+    assert controller.overloaded
+
+    async def run():
+        assert await controller.acquire("critical")
+        # Sin hueco y en sobrecarga: las clases descartables no esperan
+        return await controller.acquire("low")
+
+    assert asyncio.run(run()) is False
+    assert controller.shed["low"] == 1
+
+    # Un retardo por debajo del objetivo termina la sobrecarga
+    controller._observe_delay(0.0)
+    assert not controller.overloaded
+
+
+def test_codel_needs_sustained_delay(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(admission, "time", SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    controller = _controller()
+    for delay in (0.2, 0.01, 0.2):
+        controller._observe_delay(delay)
+        clock.now += 0.06
+    # Un retardo bajo en medio reinicia el intervalo
+    assert not controller.overloaded
@@ -0,0 +1,79 @@
+"""Pruebas unitarias de api-gateway/cache.py (sin docker)."""
+from starlette.datastructures import Headers
+from starlette.requests import Request
+
+from cache import ResponseCache, invalidation_scope, parse_ttls
+
+ROUTE = "menu/platos/"
+
+
+def _request(query: str = "", **headers) -> Request:
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": query.encode(), "headers": raw})
+
+
+def _cache(max_bytes: int = 1024 * 1024) -> ResponseCache:
+    return ResponseCache(parse_ttls("menu/platos/=15"), max_bytes, ("authorization",))
+
+
+def _store(cache: ResponseCache, request: Request, body: bytes, ttl: float = 15, **headers):
+    cache.store(ROUTE, request, 200, Headers({k.replace("_", "-"): v for k, v in headers.items()}), body, ttl)
+
+
+def test_ttl_and_scope():
+    cache = _cache()
+    assert cache.ttl_for("menu/platos/4") == 15
+    assert cache.ttl_for("reservas/reservas/") == 0
+    assert invalidation_scope("menu/platos/4") == "menu/platos"
+
+
+def test_query_order_and_vary_headers_in_key():
+    cache = _cache()
+    _store(cache, _request("b=2&a=1", authorization="Bearer a"), b"a")
+    assert cache.get(ROUTE, _request("a=1&b=2", authorization="Bearer a")).body == b"a"
+    assert cache.get(ROUTE, _request("a=1&b=2", authorization="Bearer b")) is None
+
+
+def test_upstream_vary_survives_removal_of_one_variant():
+    cache = _cache()
+    _store(cache, _request(x_tenant="a"), b"a", ttl=0, vary="X-Tenant")
+    _store(cache, _request(x_tenant="b"), b"b", vary="X-Tenant")
+    # La variante "a" ha caducado y se quita al consultarla
+    assert cache.get(ROUTE, _request(x_tenant="a")) is None
+    # La "b" se sigue encontrando con las cabeceras Vary del servicio
+    assert cache.get(ROUTE, _request(x_tenant="b")).body == b"b"
+    assert cache.get(ROUTE, _request(x_tenant="c")) is None
+
+
+def test_vary_forgotten_with_last_variant():
+    cache = _cache()
+    _store(cache, _request(x_tenant="a"), b"a", vary="X-Tenant")
+    _store(cache, _request(x_tenant="b"), b"b", vary="X-Tenant")
+    cache.invalidate("menu/platos/4")
+    assert cache.stats()["entries"] == 0
+    assert cache._vary == {} and cache._variants == {}
+
+
+def test_store_replacing_same_key_keeps_vary():
+    cache = _cache()
+    _store(cache, _request(x_tenant="a"), b"1", vary="X-Tenant")
+    _store(cache, _request(x_tenant="a"), b"2", vary="X-Tenant")
+    _store(cache, _request(x_tenant="b"), b"b", vary="X-Tenant")
+    assert cache.get(ROUTE, _request(x_tenant="a")).body == b"2"
+    assert cache._variants == {"menu/platos?": 2}
+
+
+def test_lru_eviction_by_bytes():
+    cache = _cache(max_bytes=2 * (256 + 100))
+    for n in range(3):
+        _store(cache, _request(f"n={n}"), b"x" * 100)
+    assert cache.get(ROUTE, _request("n=0")) is None
+    assert cache.get(ROUTE, _request("n=2")) is not None
+    assert cache.evictions == 1
+
+
+def test_no_store_and_vary_star_are_not_cached():
+    cache = _cache()
+    _store(cache, _request("a=1"), b"a", cache_control="no-store")
+    _store(cache, _request("a=2"), b"a", vary="*")
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,96 @@
+"""Pruebas del feed de cambios de reservas (services/reservas/cambios.py) sobre SQLite (sin docker)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+import main
+from cambios import MARGEN_CAMBIOS, cursor_inicial, leer_cambios
+from common.pagination import decode_cursor, encode_cursor, parse_datetime
+from models import Reserva
+
+HACE_UNA_HORA = datetime.utcnow() - timedelta(hours=1)
+
+
+@pytest.fixture
+def db(reservas_engine):
+    with Session(reservas_engine) as db:
+        yield db
+
+
+def _reserva(db, reserva_id, updated_at, restaurante_id=1, estado="pendiente"):
+    db.add(Reserva(
+        id=reserva_id, cliente_nombre="Cliente", cliente_email=f"{reserva_id}@x.com", restaurante_id=restaurante_id,
+        fecha_reserva=datetime(2026, 12, 1, 20), numero_personas=2, estado=estado, updated_at=updated_at,
+    ))
+
+
+def _cambios(db, cursor=None, restaurante_id=None, limit=500):
+    return main.obtener_cambios(cursor=cursor, restaurante_id=restaurante_id, limit=limit, db=db)
+
+
+def test_pages_follow_updated_at_then_id(db):
+    # Tres cambios en el mismo instante: el id desempata y ninguno se pierde entre páginas
+    for reserva_id, minutos in [(5, 0), (2, 0), (9, 0), (1, 10), (7, 20)]:
+        _reserva(db, reserva_id, HACE_UNA_HORA + timedelta(minutes=minutos))
+    db.commit()
+
+    vistos, cursor = [], None
+    while True:
+        pagina = _cambios(db, cursor, limit=2)
+        vistos.extend(r.id for r in pagina["items"])
+        cursor = pagina["next_cursor"]
+        if not pagina["has_more"]:
+            break
+    assert vistos == [2, 5, 9, 1, 7]
+    # El último cursor queda en el último cambio (anterior al margen) y no repite nada
+    assert decode_cursor(cursor, (parse_datetime, int)) == (HACE_UNA_HORA + timedelta(minutes=20), 7)
+    assert _cambios(db, cursor)["items"] == []
+
+
+def test_recent_changes_are_repeated_within_the_margin(db):
+    _reserva(db, 1, HACE_UNA_HORA)
+    _reserva(db, 2, datetime.utcnow())
+    db.commit()
+    pagina = _cambios(db)
+    assert [r.id for r in pagina["items"]] == [1, 2]
+    # El cursor no pasa de ahora - margen: el cambio reciente vuelve a llegar
+    desde, _ = decode_cursor(pagina["next_cursor"], (parse_datetime, int))
+    assert desde <= datetime.utcnow() - MARGEN_CAMBIOS
+    assert [r.id for r in _cambios(db, pagina["next_cursor"])["items"]] == [2]
+
+
+def test_cancelled_reservations_arrive_as_tombstones(db):
+    _reserva(db, 1, HACE_UNA_HORA)
+    _reserva(db, 2, HACE_UNA_HORA, restaurante_id=2)
+    db.commit()
+    cursor = _cambios(db)["next_cursor"]
+
+    main.eliminar_reserva(1, db=db)
+    pagina = _cambios(db, cursor)
+    assert pagina["items"] == []
+    assert [(r.id, r.restaurante_id, r.estado) for r in pagina["eliminadas"]] == [(1, 1, "cancelada")]
+    # Otro restaurante no ve la marca
+    assert _cambios(db, cursor, restaurante_id=[2])["eliminadas"] == []
+
+
+def test_restaurant_filter(db):
+    for reserva_id, restaurante_id in [(1, 1), (2, 2), (3, 3)]:
+        _reserva(db, reserva_id, HACE_UNA_HORA, restaurante_id=restaurante_id)
+    db.commit()
+    assert [r.id for r in _cambios(db, restaurante_id=[1, 3])["items"]] == [1, 3]
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", encode_cursor([1]), encode_cursor(["x", 1])])
+def test_invalid_cursor_is_rejected(db, cursor):
+    with pytest.raises(main.HTTPException) as exc:
+        _cambios(db, cursor)
+    assert exc.value.status_code == 400
+
+
+def test_empty_feed_keeps_cursor(db):
+    filas, siguiente, has_more = leer_cambios(db, None, None, 10)
+    assert filas == [] and not has_more
+    assert siguiente <= cursor_inicial()
+    desde = (HACE_UNA_HORA, 3)
+    assert leer_cambios(db, desde, None, 10)[1] == desde
@@ -0,0 +1,37 @@
+"""Pruebas unitarias de frontend/cambios.py (sin docker)."""
+import importlib.util
+import os
+import threading
+
+# `cambios` también es un módulo del servicio de reservas: se carga por ruta
+_spec = importlib.util.spec_from_file_location(
+    "frontend_cambios", os.path.join(os.path.dirname(__file__), os.pardir, "frontend", "cambios.py")
+)
+cambios = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(cambios)
+
+
+def _hub(max_subscribers: int) -> "cambios.ChangeHub":
+    hub = cambios.ChangeHub("http://127.0.0.1:9/stream", max_subscribers=max_subscribers)
+    # Sin conexión real al gateway: con un hilo "vivo" asignado el lector no arranca
+    hub._thread = threading.current_thread()
+    return hub
+
+
+def test_subscribers_are_capped():
+    hub = _hub(max_subscribers=2)
+    first = hub.subscribe([1])
+    assert hub.subscribe([2]) is not None
+    assert hub.subscribe([3]) is None
+    assert hub.stats()["rejected"] == 1
+
+    hub.unsubscribe(first)
+    assert hub.subscribe([3]) is not None
+
+
+def test_dispatch_filters_by_restaurant():
+    hub = _hub(max_subscribers=0)
+    uno, dos = hub.subscribe([1]), hub.subscribe([2])
+    hub._dispatch({"items": [{"id": 10, "restaurante_id": 1}], "eliminadas": []})
+    assert uno.queue.get_nowait()["items"] == [{"id": 10, "restaurante_id": 1}]
+    assert dos.queue.empty()
@@ -0,0 +1,104 @@
+"""Pruebas de services/reservas/commit_agrupado.py sobre SQLite (sin docker)."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+import main
+import ocupacion
+from commit_agrupado import CommitAgrupado
+from models import OcupacionFranja, Reserva, ReservaCreate
+
+FRANJA = (datetime.now() + timedelta(days=7)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def sesiones(reservas_engine, monkeypatch):
+    monkeypatch.setattr(ocupacion, "SLOT_MINUTES", 60)
+    monkeypatch.setattr(ocupacion, "SLOT_CAPACITY", 2)
+    return sessionmaker(bind=reservas_engine)
+
+
+def _reserva(email, fecha=FRANJA):
+    return ReservaCreate(
+        cliente_nombre="Cliente", cliente_email=email, restaurante_id=1, fecha_reserva=fecha, numero_personas=2
+    )
+
+
+def _crear_a_la_vez(agrupado, reservas):
+    """Encola todas las reservas juntas (entran en el mismo lote) y devuelve resultado o excepción de cada una."""
+    async def run():
+        return await asyncio.gather(*(agrupado.crear(r, None) for r in reservas), return_exceptions=True)
+
+    return asyncio.run(run())
+
+
+def _ocupadas(sesiones, franja=FRANJA):
+    with sesiones() as db:
+        fila = db.get(OcupacionFranja, (1, franja))
+        return fila.reservas if fila is not None else 0
+
+
+def test_batch_commits_once_and_rejects_items_individually(sesiones):
+    agrupado = CommitAgrupado(sesiones, main._insertar_reserva, max_espera=0.2)
+    otra = FRANJA + timedelta(hours=1)
+    reservas = [
+        _reserva("a@x.com"),
+        _reserva("a@x.com"),  # duplicada: 409
+        _reserva("b@x.com"),
+        _reserva("c@x.com"),  # franja llena: 400
+        _reserva("d@x.com", fecha=otra),
+    ]
+    resultados = _crear_a_la_vez(agrupado, reservas)
+    estados = [r.status_code if isinstance(r, HTTPException) else 201 for r in resultados]
+    assert estados == [201, 409, 201, 400, 201]
+    assert agrupado.stats() == {
+        "lotes": 1, "reservas": 3, "rechazadas": 2, "reservas_por_lote": 3, "en_cola": 0, "reintentos": 0,
+    }
+    with sesiones() as db:
+        assert sorted(r.cliente_email for r in db.query(Reserva)) == ["a@x.com", "b@x.com", "d@x.com"]
+    # El savepoint de la duplicada deshizo también la plaza que había tomado
+    assert _ocupadas(sesiones) == 2 and _ocupadas(sesiones, otra) == 1
+
+
+def test_unexpected_error_only_rolls_back_its_item(sesiones):
+    def insertar(db, reserva, clave):
+        if reserva.cliente_email == "mal@x.com":
+            ocupacion.tomar_plaza(db, reserva.restaurante_id, reserva.fecha_reserva)
+            raise RuntimeError("fallo de la fila")
+        return main._insertar_reserva(db, reserva, clave)
+
+    agrupado = CommitAgrupado(sesiones, insertar, max_espera=0.2)
+    resultados = _crear_a_la_vez(agrupado, [_reserva("a@x.com"), _reserva("mal@x.com"), _reserva("b@x.com")])
+    assert isinstance(resultados[1], HTTPException) and resultados[1].status_code == 400
+    assert not isinstance(resultados[0], Exception) and not isinstance(resultados[2], Exception)
+    assert _ocupadas(sesiones) == 2
+    assert (agrupado.reservas, agrupado.rechazadas) == (2, 1)
+
+
+def test_failed_batch_commit_is_retried_one_by_one(sesiones):
+    fallos = []
+
+    def sesion():
+        db = sesiones()
+        if not fallos:
+            # El commit del primer lote falla (p. ej. conexión perdida)
+            def commit():
+                fallos.append(1)
+                raise RuntimeError("conexión perdida")
+
+            db.commit = commit
+        return db
+
+    agrupado = CommitAgrupado(sesion, main._insertar_reserva, max_espera=0.2)
+    resultados = _crear_a_la_vez(agrupado, [_reserva("a@x.com"), _reserva("b@x.com"), _reserva("c@x.com")])
+    estados = [r.status_code if isinstance(r, HTTPException) else 201 for r in resultados]
+    assert estados == [201, 201, 400]
+    # En el reintento cada reserva va en su propia transacción
+    assert agrupado.stats()["reintentos"] == 1
+    assert (agrupado.lotes, agrupado.reservas, agrupado.rechazadas) == (3, 2, 1)
+    assert _ocupadas(sesiones) == 2
+    with sesiones() as db:
+        assert db.query(Reserva).count() == 2
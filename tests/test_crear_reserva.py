@@ -0,0 +1,67 @@
+"""Pruebas de POST /reservas/ (services/reservas/main.py) sobre SQLite (sin docker)."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+import main
+import ocupacion
+from models import ReservaCreate
+
+FECHA = (datetime.now() + timedelta(days=7)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def db(reservas_engine, monkeypatch):
+    monkeypatch.setattr(ocupacion, "SLOT_MINUTES", 60)
+    monkeypatch.setattr(ocupacion, "SLOT_CAPACITY", 3)
+    with Session(reservas_engine) as db:
+        yield db
+
+
+def _reserva(email="a@x.com"):
+    return ReservaCreate(
+        cliente_nombre="Cliente", cliente_email=email, restaurante_id=1, fecha_reserva=FECHA, numero_personas=2
+    )
+
+
+def _crear(db, reserva, clave=None):
+    return main.crear_reserva(reserva, idempotency_key=clave, db=db)
+
+
+def test_duplicate_is_409_without_sql(db):
+    _crear(db, _reserva())
+    with pytest.raises(main.HTTPException) as exc:
+        _crear(db, _reserva())
+    assert exc.value.status_code == 409
+    assert "INSERT" not in exc.value.detail
+
+
+def test_cancelled_reservation_can_be_booked_again(db):
+    primera = json.loads(_crear(db, _reserva()).body)
+    main.eliminar_reserva(primera["id"], db=db)
+    segunda = json.loads(_crear(db, _reserva()).body)
+    assert segunda["id"] != primera["id"]
+    # Reactivar la cancelada chocaría con la nueva
+    with pytest.raises(main.HTTPException) as exc:
+        main.actualizar_estado_reserva(primera["id"], main.ActualizarEstado(estado="pendiente"), db=db)
+    assert exc.value.status_code == 409
+
+
+def test_replay_is_answered_before_the_date_check(db, monkeypatch):
+    original = _crear(db, _reserva(), clave="clave-1")
+
+    class Despues(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return FECHA + timedelta(days=1)
+
+    # La reserva ya es pasada cuando llega el reintento
+    monkeypatch.setattr(main, "datetime", Despues)
+    repetida = _crear(db, _reserva(), clave="clave-1")
+    assert repetida.body == original.body
+    assert repetida.headers["idempotent-replayed"] == "true"
+    with pytest.raises(main.HTTPException) as exc:
+        _crear(db, _reserva(), clave="clave-2")
+    assert exc.value.status_code == 400
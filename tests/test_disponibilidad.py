@@ -0,0 +1,90 @@
+"""Pruebas de la disponibilidad por franjas (services/reservas/main.py y su uso en frontend/app.py) sobre SQLite."""
+import importlib.util
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+import main
+import ocupacion
+from models import ReservaCreate
+
+DIA = (datetime.now() + timedelta(days=7)).date()
+FRANJA = datetime.combine(DIA, datetime.min.time()).replace(hour=20)
+
+
+@pytest.fixture
+def db(reservas_engine, monkeypatch):
+    # main importa las constantes por nombre: se fijan en los dos módulos
+    for modulo in (main, ocupacion):
+        monkeypatch.setattr(modulo, "SLOT_MINUTES", 60)
+        monkeypatch.setattr(modulo, "SLOT_CAPACITY", 2)
+    with Session(reservas_engine) as db:
+        yield db
+
+
+def _reservar(db, email, fecha=FRANJA):
+    reserva = ReservaCreate(
+        cliente_nombre="Cliente", cliente_email=email, restaurante_id=1, fecha_reserva=fecha, numero_personas=2
+    )
+    return main.crear_reserva(reserva, idempotency_key=None, db=db)
+
+
+def _libres(db):
+    disponibilidad = main.obtener_disponibilidad(1, DIA, fecha_fin=None, hora_inicio=19, hora_fin=21, db=db)
+    return {f["hora"]: f["libres"] for f in disponibilidad["dias"][0]["franjas"]}
+
+
+def test_full_slot_has_no_free_places(db):
+    assert _libres(db) == {"19:00": 2, "20:00": 2, "21:00": 2}
+    _reservar(db, "a@x.com", FRANJA + timedelta(minutes=15))
+    assert _libres(db)["20:00"] == 1
+    _reservar(db, "b@x.com")
+    assert _libres(db) == {"19:00": 2, "20:00": 0, "21:00": 2}
+    with pytest.raises(main.HTTPException):
+        _reservar(db, "c@x.com")
+
+    # Al cancelar vuelve a ofrecerse
+    reserva_id = json.loads(_reservar(db, "d@x.com", FRANJA + timedelta(hours=1)).body)["id"]
+    assert _libres(db)["21:00"] == 1
+    main.eliminar_reserva(reserva_id, db=db)
+    assert _libres(db)["21:00"] == 2
+
+
+def _frontend(monkeypatch):
+    """frontend/app.py, cargado por ruta con su propio `cambios` (el del servicio tiene el mismo nombre)."""
+    carpeta = os.path.join(os.path.dirname(__file__), os.pardir, "frontend")
+    modulos = {}
+    for nombre in ("cambios", "app"):
+        spec = importlib.util.spec_from_file_location(f"frontend_{nombre}", os.path.join(carpeta, f"{nombre}.py"))
+        modulos[nombre] = importlib.util.module_from_spec(spec)
+        monkeypatch.setitem(sys.modules, nombre, modulos[nombre])
+        spec.loader.exec_module(modulos[nombre])
+    return modulos["app"]
+
+
+def test_frontend_hides_full_hours(db, monkeypatch):
+    frontend = _frontend(monkeypatch)
+    monkeypatch.setattr(frontend, "HORA_APERTURA", 19)
+    monkeypatch.setattr(frontend, "HORA_CIERRE", 21)
+
+    def request_api(method, service, path, params=None, **kwargs):
+        assert path == "reservas/disponibilidad"
+        fecha = datetime.strptime(params["fecha_inicio"], "%Y-%m-%d").date()
+        datos = main.obtener_disponibilidad(
+            params["restaurante_id"], fecha, fecha_fin=None,
+            hora_inicio=params["hora_inicio"], hora_fin=params["hora_fin"], db=db,
+        )
+        return jsonable_encoder(datos)
+
+    monkeypatch.setattr(frontend, "request_api", request_api)
+    _reservar(db, "a@x.com")
+    _reservar(db, "b@x.com")
+
+    respuesta = frontend.app.test_client().get(f"/api/horas-disponibles/1/{DIA.isoformat()}")
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()["horas"] == ["19:00", "21:00"]
@@ -0,0 +1,93 @@
+"""Pruebas unitarias de api-gateway/etag.py (sin docker)."""
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from compression import CompressionMiddleware
+from etag import ETagMiddleware, compute_etag, etag_matches
+
+BODY = {"platos": ["x" * 20] * 100}
+
+
+def test_compute_etag_is_strong_and_content_based():
+    assert compute_etag(b"a") == compute_etag(b"a")
+    assert compute_etag(b"a") != compute_etag(b"b")
+    assert compute_etag(b"a").startswith('"')
+
+
+def test_etag_matches_uses_weak_comparison():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', 'W/"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"x"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def _app():
+    async def platos(request):
+        return JSONResponse(BODY)
+
+    async def con_etag(request):
+        return PlainTextResponse("hola", headers={"etag": '"servicio"'})
+
+    async def stream(request):
+        async def chunks():
+            yield b"a"
+            yield b"b"
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    async def falta(request):
+        return PlainTextResponse("no", status_code=404)
+
+    app = Starlette(routes=[
+        Route("/api/v1/menu/platos/", platos),
+        Route("/api/v1/menu/etag", con_etag),
+        Route("/api/v1/menu/stream", stream),
+        Route("/api/v1/menu/falta", falta),
+    ])
+    app.add_middleware(ETagMiddleware)
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+def _get(path: str, **headers) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers={k.replace("_", "-"): v for k, v in headers.items()})
+
+    return asyncio.run(run())
+
+
+def test_etag_added_and_304_on_match():
+    first = _get("/api/v1/menu/platos/", accept_encoding="identity")
+    etag = first.headers["etag"]
+    assert etag == compute_etag(first.content)
+
+    second = _get("/api/v1/menu/platos/", accept_encoding="identity", if_none_match=etag)
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert "content-type" not in second.headers
+
+
+def test_compressed_response_gets_weak_etag_that_still_matches():
+    gz = _get("/api/v1/menu/platos/", accept_encoding="gzip")
+    assert gz.headers["content-encoding"] == "gzip"
+    assert gz.headers["etag"].startswith('W/"')
+    again = _get("/api/v1/menu/platos/", accept_encoding="gzip", if_none_match=gz.headers["etag"])
+    assert again.status_code == 304
+
+
+def test_upstream_etag_is_kept_and_other_responses_pass_through():
+    assert _get("/api/v1/menu/etag").headers["etag"] == '"servicio"'
+    assert _get("/api/v1/menu/etag", if_none_match='"servicio"').status_code == 304
+    # Streaming sin ETag: no se bufferiza ni se calcula
+    streamed = _get("/api/v1/menu/stream")
+    assert streamed.text == "ab" and "etag" not in streamed.headers
+    assert "etag" not in _get("/api/v1/menu/falta").headers
@@ -0,0 +1,113 @@
+"""Pruebas unitarias de api-gateway/idempotency.py (sin docker)."""
+import asyncio
+import json
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from compression import CompressionMiddleware
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+def _app(status: int = 201):
+    calls = []
+
+    async def crear(request: Request):
+        body = await request.json()
+        calls.append(body)
+        await asyncio.sleep(0.01)
+        # Cuerpo grande para que la compresión actúe
+        return JSONResponse({"id": len(calls), "relleno": "x" * 2000, **body}, status_code=status)
+
+    app = Starlette(routes=[Route("/api/v1/reservas/", crear, methods=["POST"])])
+    store = IdempotencyStore(ttl=60, max_bytes=1024 * 1024, max_body=64 * 1024)
+    app.add_middleware(IdempotencyMiddleware, store=store)
+    app.add_middleware(CompressionMiddleware)
+    return app, store, calls
+
+
+def _post(app, *requests):
+    """Envía las peticiones (cuerpo, cabeceras) una tras otra y devuelve las respuestas."""
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.post("/api/v1/reservas/", json=body, headers=headers) for body, headers in requests]
+
+    return asyncio.run(run())
+
+
+def test_replay_returns_stored_response():
+    app, store, calls = _app()
+    headers = {"Idempotency-Key": "k1"}
+    first, second = _post(app, ({"n": 1}, headers), ({"n": 1}, headers))
+    assert first.status_code == second.status_code == 201
+    assert first.json() == second.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert len(calls) == 1
+    assert store.replayed == 1
+
+
+def test_same_key_with_other_body_is_rejected():
+    app, store, calls = _app()
+    headers = {"Idempotency-Key": "k1"}
+    _, response = _post(app, ({"n": 1}, headers), ({"n": 2}, headers))
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+def test_key_is_scoped_by_authorization():
+    app, _, calls = _app()
+    _post(
+        app,
+        ({"n": 1}, {"Idempotency-Key": "k1", "Authorization": "Bearer a"}),
+        ({"n": 1}, {"Idempotency-Key": "k1", "Authorization": "Bearer b"}),
+    )
+    assert len(calls) == 2
+
+
+def test_server_errors_are_not_stored():
+    app, store, calls = _app(status=503)
+    headers = {"Idempotency-Key": "k1"}
+    _post(app, ({"n": 1}, headers), ({"n": 1}, headers))
+    assert len(calls) == 2
+    assert store.stats()["entries"] == 0
+
+
+def test_stored_uncompressed_and_replayed_per_accept_encoding():
+    # La compresión sólo actúa sobre respuestas 200
+    app, store, calls = _app(status=200)
+    gz, plain = _post(
+        app,
+        ({"n": 1}, {"Idempotency-Key": "k1", "Accept-Encoding": "gzip"}),
+        # La repetición de un cliente sin gzip recibe el JSON sin comprimir
+        ({"n": 1}, {"Idempotency-Key": "k1", "Accept-Encoding": "identity"}),
+    )
+    assert gz.headers["content-encoding"] == "gzip"
+    entry = next(iter(store._entries.values()))
+    assert json.loads(entry.body)["n"] == 1
+    assert not any(k == b"content-encoding" for k, _ in entry.headers)
+    assert plain.headers["idempotent-replayed"] == "true"
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == gz.json()
+    assert len(calls) == 1
+
+
+def test_concurrent_duplicates_run_once():
+    app, store, calls = _app()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/api/v1/reservas/", json={"n": 1}, headers={"Idempotency-Key": "k1"})
+                for _ in range(5)
+            ))
+
+    responses = asyncio.run(run())
+    assert {r.json()["id"] for r in responses} == {1}
+    assert len(calls) == 1
+    assert store.waited == 4
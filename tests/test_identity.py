@@ -0,0 +1,44 @@
+"""Pruebas unitarias de api-gateway/identity.py (sin docker)."""
+import time
+
+import pytest
+from jose import ExpiredSignatureError, jwt
+
+from identity import JWT_ALG, TokenVerifier, UserCache, bearer_token
+
+
+def _token(secret: str = "s", sub: str = "ana@example.com", exp_in: float = 60) -> str:
+    return jwt.encode({"sub": sub, "exp": int(time.time() + exp_in)}, secret, algorithm=JWT_ALG)
+
+
+def test_verifier_accepts_valid_and_caches_claims():
+    verifier = TokenVerifier("s", max_entries=10)
+    token = _token()
+    assert verifier.verify(token)["sub"] == "ana@example.com"
+    assert verifier.claims(f"Bearer {token}")["sub"] == "ana@example.com"
+    assert verifier.hits == 1
+
+
+def test_verifier_rejects_bad_signature_and_expired():
+    verifier = TokenVerifier("s", max_entries=10)
+    assert verifier.verify(_token(secret="otro")) is None
+    with pytest.raises(ExpiredSignatureError):
+        verifier.verify(_token(exp_in=-10))
+    assert verifier.claims(f"Bearer {_token(exp_in=-10)}") is None
+    assert bearer_token("Basic abc") is None
+
+
+def test_user_cache_evict():
+    users = UserCache(ttl=30, max_entries=10)
+    users.put("ana@example.com", {"email": "ana@example.com"}, ttl=30)
+    assert users.get("ana@example.com") == {"email": "ana@example.com"}
+    users.evict("ana@example.com")
+    users.evict("nadie@example.com")
+    assert users.get("ana@example.com") is None
+    assert users.stats()["evictions"] == 1
+
+
+def test_user_cache_ttl():
+    users = UserCache(ttl=30, max_entries=10)
+    users.put("ana@example.com", {}, ttl=0)
+    assert users.get("ana@example.com") is None
@@ -0,0 +1,144 @@
+"""Pruebas de los endpoints por lotes de services/reservas/main.py sobre SQLite (sin docker)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+import main
+import ocupacion
+from models import OcupacionFranja, Reserva, ReservaCreate
+
+FRANJA = (datetime.now() + timedelta(days=7)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def db(reservas_engine, monkeypatch):
+    monkeypatch.setattr(ocupacion, "SLOT_MINUTES", 60)
+    monkeypatch.setattr(ocupacion, "SLOT_CAPACITY", 3)
+    with Session(reservas_engine) as db:
+        yield db
+
+
+def _reserva(email, fecha=FRANJA, restaurante_id=1):
+    return ReservaCreate(
+        cliente_nombre="Cliente", cliente_email=email, restaurante_id=restaurante_id,
+        fecha_reserva=fecha, numero_personas=2,
+    )
+
+
+def _ocupadas(db, restaurante_id=1, franja=FRANJA):
+    fila = db.get(OcupacionFranja, (restaurante_id, franja))
+    return fila.reservas if fila is not None else 0
+
+
+def test_lote_reports_each_item_in_order(db):
+    lote = [
+        _reserva("a@x.com"),
+        _reserva("b@x.com", fecha=datetime.now() - timedelta(days=1)),
+        _reserva("c@x.com", fecha=FRANJA + timedelta(minutes=30)),
+    ]
+    resultado = main.crear_reservas_lote(lote, db=db)
+    assert [r["status"] for r in resultado["resultados"]] == [201, 400, 201]
+    assert [r["indice"] for r in resultado["resultados"]] == [0, 1, 2]
+    assert resultado["creadas"] == 2 and resultado["rechazadas"] == 1
+    ids = [r["id"] for r in resultado["resultados"] if r["status"] == 201]
+    assert [db.get(Reserva, i).cliente_email for i in ids] == ["a@x.com", "c@x.com"]
+    assert _ocupadas(db) == 2
+
+
+def test_lote_rejects_duplicates_in_batch_and_in_database(db):
+    main.crear_reservas_lote([_reserva("a@x.com")], db=db)
+    resultado = main.crear_reservas_lote([_reserva("a@x.com"), _reserva("b@x.com"), _reserva("b@x.com")], db=db)
+    assert [r["status"] for r in resultado["resultados"]] == [409, 201, 409]
+    # Los duplicados no ocupan plaza
+    assert _ocupadas(db) == 2
+
+
+def test_lote_allows_rebooking_a_cancelled_reservation(db):
+    primera = main.crear_reservas_lote([_reserva("a@x.com")], db=db)["resultados"][0]["id"]
+    main.eliminar_reserva(primera, db=db)
+    resultado = main.crear_reservas_lote([_reserva("a@x.com")], db=db)
+    assert resultado["resultados"][0]["status"] == 201
+    assert _ocupadas(db) == 1
+
+
+def test_lote_stops_granting_when_slot_fills(db):
+    main.crear_reservas_lote([_reserva("previa@x.com")], db=db)
+    otra = FRANJA + timedelta(hours=1)
+    lote = [_reserva(f"{i}@x.com") for i in range(4)] + [_reserva("otra@x.com", fecha=otra)]
+    resultado = main.crear_reservas_lote(lote, db=db)
+    # Quedaban 2 plazas: por orden de llegada en el lote
+    assert [r["status"] for r in resultado["resultados"]] == [201, 201, 400, 400, 201]
+    assert resultado["resultados"][2]["detail"] == "No hay disponibilidad en ese horario"
+    assert _ocupadas(db) == 3 and _ocupadas(db, franja=otra) == 1
+    assert db.query(Reserva).count() == 4
+
+
+def test_lote_size_limit(db, monkeypatch):
+    monkeypatch.setattr(main, "MAX_RESERVAS_LOTE", 2)
+    with pytest.raises(main.HTTPException) as exc:
+        main.crear_reservas_lote([_reserva(f"{i}@x.com") for i in range(3)], db=db)
+    assert exc.value.status_code == 400
+
+
+def _crear(db, *emails, fecha=FRANJA):
+    resultado = main.crear_reservas_lote([_reserva(e, fecha=fecha) for e in emails], db=db)
+    return [r["id"] for r in resultado["resultados"]]
+
+
+def _estado_lote(db, ids, estado):
+    return main.actualizar_estado_lote(main.ActualizarEstadoLote(ids=ids, estado=estado), db=db)
+
+
+@pytest.mark.parametrize("origen,destino,permitida", [
+    (origen, destino, destino in destinos)
+    for origen, destinos in main.TRANSICIONES_LOTE.items()
+    for destino in main.TRANSICIONES_LOTE
+    if destino != origen
+])
+def test_estado_lote_follows_transition_table(db, origen, destino, permitida):
+    (reserva_id,) = _crear(db, "a@x.com")
+    db.get(Reserva, reserva_id).estado = origen
+    db.commit()
+    resultado = _estado_lote(db, [reserva_id], destino)["resultados"][0]
+    if permitida:
+        assert resultado == {"id": reserva_id, "status": 200, "estado": destino}
+    else:
+        assert resultado["status"] == 409 and resultado["estado"] == origen
+    db.expire_all()
+    assert db.get(Reserva, reserva_id).estado == (destino if permitida else origen)
+
+
+def test_estado_lote_reports_unknown_ids_and_same_state(db):
+    confirmada, pendiente = _crear(db, "a@x.com", "b@x.com")
+    _estado_lote(db, [confirmada], "confirmada")
+    # Sin estado cuenta como pendiente
+    db.get(Reserva, pendiente).estado = None
+    db.commit()
+    resultado = _estado_lote(db, [confirmada, 999, pendiente, confirmada], "confirmada")
+    assert [(r["id"], r["status"]) for r in resultado["resultados"]] == [(confirmada, 200), (999, 404), (pendiente, 200)]
+    assert resultado["actualizadas"] == 2 and resultado["rechazadas"] == 1
+
+
+def test_estado_lote_rejects_invalid_state(db):
+    with pytest.raises(main.HTTPException) as exc:
+        _estado_lote(db, [1], "perdida")
+    assert exc.value.status_code == 400
+
+
+def test_estado_lote_cancel_releases_slots_once(db):
+    otra = FRANJA + timedelta(hours=1)
+    ids = _crear(db, "a@x.com", "b@x.com", "c@x.com") + _crear(db, "d@x.com", fecha=otra)
+    assert _ocupadas(db) == 3
+    resultado = _estado_lote(db, ids[1:], "cancelada")
+    assert resultado["actualizadas"] == 3
+    assert _ocupadas(db) == 1 and _ocupadas(db, franja=otra) == 0
+    # Cancelar otra vez no libera de nuevo ni cuenta como error
+    _estado_lote(db, ids[1:], "cancelada")
+    assert _ocupadas(db) == 1
+    # Completar no libera plaza
+    _estado_lote(db, ids[:1], "completada")
+    assert _ocupadas(db) == 1
+    # Las plazas liberadas vuelven a estar disponibles
+    _crear(db, "e@x.com", "f@x.com")
+    assert _ocupadas(db) == 3
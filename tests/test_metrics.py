@@ -0,0 +1,39 @@
+"""Pruebas unitarias de common/metrics.py (sin docker)."""
+import threading
+
+from common.metrics import Metrics
+
+
+def _request(metrics: Metrics, seconds: float = 0.01):
+    metrics.started()
+    metrics.finished("GET", "/reservas/", 200, seconds)
+
+
+def test_render_counts_and_histogram():
+    metrics = Metrics("test")
+    _request(metrics, 0.003)
+    _request(metrics, 0.2)
+    text = metrics.render()
+    assert 'http_requests_total{service="test",method="GET",route="/reservas/",status="200"} 2' in text
+    assert 'http_request_duration_seconds_bucket{service="test",method="GET",route="/reservas/",le="0.005"} 1' in text
+    assert 'http_request_duration_seconds_count{service="test",method="GET",route="/reservas/"} 2' in text
+    assert 'http_requests_in_flight{service="test"} 0' in text
+
+
+def test_shards_of_finished_threads_are_merged():
+    # Como `flask run`: un hilo nuevo por petición
+    metrics = Metrics("test")
+    for _ in range(200):
+        thread = threading.Thread(target=_request, args=(metrics,))
+        thread.start()
+        thread.join()
+    assert metrics.shard_count() == 0
+    assert 'status="200"} 200' in metrics.render()
+
+
+def test_live_thread_keeps_its_shard():
+    metrics = Metrics("test")
+    _request(metrics)
+    assert metrics.shard_count() == 1
+    _request(metrics)
+    assert 'status="200"} 2' in metrics.render()
@@ -0,0 +1,123 @@
+"""Pruebas unitarias de services/reservas/ocupacion.py (sin docker; los contadores sobre SQLite)."""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import ocupacion
+from models import Base, OcupacionFranja
+from ocupacion import (
+    es_activa, franja_de, franjas_del_dia, liberar_plaza, liberar_plazas, mover_plaza, tomar_plaza, tomar_plazas,
+)
+
+FRANJA = datetime(2026, 5, 1, 20, 0)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(ocupacion, "SLOT_MINUTES", 60)
+    monkeypatch.setattr(ocupacion, "SLOT_CAPACITY", 3)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        yield db
+
+
+def _ocupadas(db, restaurante_id=1, franja=FRANJA):
+    fila = db.get(OcupacionFranja, (restaurante_id, franja))
+    return fila.reservas if fila is not None else 0
+
+
+def test_franja_de_truncates_to_slot_start(monkeypatch):
+    monkeypatch.setattr(ocupacion, "SLOT_MINUTES", 60)
+    assert franja_de(datetime(2026, 5, 1, 20, 0)) == datetime(2026, 5, 1, 20, 0)
+    assert franja_de(datetime(2026, 5, 1, 20, 59, 59)) == datetime(2026, 5, 1, 20, 0)
+    assert franja_de(datetime(2026, 5, 1, 21, 0)) == datetime(2026, 5, 1, 21, 0)
+
+
+def test_franja_de_with_half_hour_slots(monkeypatch):
+    monkeypatch.setattr(ocupacion, "SLOT_MINUTES", 30)
+    assert franja_de(datetime(2026, 5, 1, 20, 29)) == datetime(2026, 5, 1, 20, 0)
+    assert franja_de(datetime(2026, 5, 1, 20, 31)) == datetime(2026, 5, 1, 20, 30)
+
+
+def test_franja_de_ignores_timezone_and_microseconds(monkeypatch):
+    monkeypatch.setattr(ocupacion, "SLOT_MINUTES", 60)
+    aware = datetime(2026, 5, 1, 20, 15, 30, 123456, tzinfo=timezone(timedelta(hours=2)))
+    # Se toma la hora local tal cual (como la guarda la columna sin zona)
+    assert franja_de(aware) == datetime(2026, 5, 1, 20, 0)
+
+
+def test_franjas_del_dia_includes_both_ends(monkeypatch):
+    monkeypatch.setattr(ocupacion, "SLOT_MINUTES", 60)
+    franjas = franjas_del_dia(date(2026, 5, 1), 12, 22)
+    assert franjas[0] == datetime(2026, 5, 1, 12) and franjas[-1] == datetime(2026, 5, 1, 22)
+    assert len(franjas) == 11
+
+
+def test_es_activa():
+    assert es_activa(None) and es_activa("pendiente") and es_activa("confirmada")
+    assert not es_activa("cancelada")
+
+
+def test_tomar_plaza_refuses_when_slot_is_full(db):
+    # Horas distintas de la misma franja comparten el contador
+    for minuto in (0, 15, 59):
+        assert tomar_plaza(db, 1, FRANJA.replace(minute=minuto))
+    assert not tomar_plaza(db, 1, FRANJA + timedelta(minutes=30))
+    assert _ocupadas(db) == 3
+    # Otra franja u otro restaurante tienen su propio contador
+    assert tomar_plaza(db, 1, FRANJA + timedelta(hours=1))
+    assert tomar_plaza(db, 2, FRANJA)
+
+
+def test_liberar_plaza_never_goes_below_zero(db):
+    tomar_plaza(db, 1, FRANJA)
+    liberar_plaza(db, 1, FRANJA)
+    liberar_plaza(db, 1, FRANJA)
+    assert _ocupadas(db) == 0
+    assert tomar_plaza(db, 1, FRANJA)
+
+
+def test_tomar_plazas_grants_up_to_capacity(db):
+    tomar_plaza(db, 1, FRANJA)
+    otra = FRANJA + timedelta(hours=1)
+    concedidas = tomar_plazas(db, {(1, FRANJA): 5, (1, otra): 2})
+    assert concedidas == {(1, FRANJA): 2, (1, otra): 2}
+    assert _ocupadas(db) == 3 and _ocupadas(db, franja=otra) == 2
+    assert tomar_plazas(db, {(1, FRANJA): 1}) == {(1, FRANJA): 0}
+    assert not tomar_plaza(db, 1, FRANJA)
+
+
+def test_liberar_plazas_in_bulk(db):
+    otra = FRANJA + timedelta(hours=1)
+    tomar_plazas(db, {(1, FRANJA): 3, (1, otra): 1})
+    liberar_plazas(db, {(1, FRANJA): 2, (1, otra): 4})
+    assert _ocupadas(db) == 1 and _ocupadas(db, franja=otra) == 0
+    liberar_plazas(db, {})
+
+
+def test_mover_plaza_keeps_counters(db):
+    otra = FRANJA + timedelta(hours=1)
+    assert tomar_plaza(db, 1, FRANJA)
+    # Dentro de la misma franja no cambia nada
+    assert mover_plaza(db, (1, FRANJA, True), (1, FRANJA + timedelta(minutes=30), True))
+    assert _ocupadas(db) == 1
+    # A otra franja: libera la de origen y ocupa la de destino
+    assert mover_plaza(db, (1, FRANJA, True), (1, otra, True))
+    assert _ocupadas(db) == 0 and _ocupadas(db, franja=otra) == 1
+    # Cancelar libera; reactivar vuelve a ocupar
+    assert mover_plaza(db, (1, otra, True), (1, otra, False))
+    assert _ocupadas(db, franja=otra) == 0
+    assert mover_plaza(db, (1, otra, False), (1, otra, True))
+    assert _ocupadas(db, franja=otra) == 1
+
+
+def test_mover_plaza_to_full_slot_is_refused(db):
+    otra = FRANJA + timedelta(hours=1)
+    tomar_plazas(db, {(1, FRANJA): 1, (1, otra): 3})
+    assert not mover_plaza(db, (1, FRANJA, True), (1, otra, True))
+    # El origen no se libera: la transacción se deshace en el endpoint
+    assert _ocupadas(db) == 1 and _ocupadas(db, franja=otra) == 3
+    assert not mover_plaza(db, (1, FRANJA, False), (1, otra, True))
@@ -0,0 +1,49 @@
+"""Pruebas unitarias de common/pagination.py (sin docker)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from common.pagination import decode_cursor, encode_cursor, keyset_page, parse_datetime
+
+Base = declarative_base()
+
+
+class Fila(Base):
+    __tablename__ = "filas"
+    id = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, nullable=False)
+
+
+def test_cursor_round_trip():
+    fecha = datetime(2026, 5, 1, 20, 30)
+    cursor = encode_cursor([fecha, 42])
+    assert "=" not in cursor
+    assert decode_cursor(cursor, (parse_datetime, int)) == (fecha, 42)
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", encode_cursor([1]), encode_cursor(["x", 1]), "e30"])
+def test_invalid_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, (parse_datetime, int))
+
+
+def test_keyset_pages_cover_all_rows_once():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    base = datetime(2026, 1, 1)
+    with Session(engine) as db:
+        # Fechas repetidas: el id desempata dentro de la clave
+        db.add_all(Fila(id=i, fecha=base + timedelta(hours=i // 3)) for i in range(1, 11))
+        db.commit()
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = keyset_page(db.query(Fila), (Fila.fecha, Fila.id), (parse_datetime, int), cursor, 4)
+            seen.extend(r.id for r in rows)
+            pages += 1
+            if cursor is None:
+                break
+    assert seen == list(range(1, 11))
+    assert pages == 3
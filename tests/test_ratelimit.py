@@ -0,0 +1,78 @@
+"""Pruebas unitarias de api-gateway/ratelimit.py (sin docker)."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import ratelimit
+from ratelimit import MemoryBuckets, RateLimiter, parse_limits, parse_networks
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Sólo el reloj del módulo: el del event loop sigue siendo el real
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=clock, time=time.time))
+    return clock
+
+
+def test_parse_limits_skips_invalid_rules():
+    rules = parse_limits("ip POST auth/login=10/60,route * */=5,mal formada=1/1,ip GET x=0/1")
+    assert [(r.scope, r.method, r.prefix, r.capacity) for r in rules] == [
+        ("ip", "POST", "auth/login", 10.0),
+        ("route", "*", "*", 5.0),
+    ]
+    assert rules[0].rate == pytest.approx(10 / 60)
+    assert rules[0].matches("POST", "auth/login") and not rules[0].matches("POST", "auth/loginx")
+
+
+def test_bucket_allows_burst_then_waits_and_refills(clock):
+    buckets = MemoryBuckets(max_keys=100)
+
+    async def take():
+        return await buckets.take("k", capacity=3, rate=1.0)
+
+    assert [asyncio.run(take()) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert asyncio.run(take()) == pytest.approx(1.0)
+    clock.now += 1.0
+    # Tras un segundo vuelve a haber una ficha (la espera anterior no la consumió)
+    assert asyncio.run(take()) == 0.0
+
+
+def test_bucket_keys_are_bounded_and_swept(clock):
+    buckets = MemoryBuckets(max_keys=2, sweep_interval=10)
+    for key in ("a", "b", "c"):
+        asyncio.run(buckets.take(key, capacity=1, rate=1.0))
+    assert len(buckets) == 2
+    clock.now += 20
+    asyncio.run(buckets.take("d", capacity=1, rate=1.0))
+    # Los buckets ya llenos se barren: sólo queda el recién usado
+    assert len(buckets) == 1
+
+
+def test_limiter_applies_rules_per_ip(clock):
+    limiter = RateLimiter(parse_limits("ip POST auth/login=2/60"), MemoryBuckets(100), [])
+
+    def check(ip, method="POST", route="auth/login"):
+        return asyncio.run(limiter.check(method, route, ip, None))
+
+    assert check("1.1.1.1") == 0 and check("1.1.1.1") == 0
+    assert check("1.1.1.1") > 0
+    assert check("2.2.2.2") == 0
+    assert check("1.1.1.1", method="GET") == 0
+    assert limiter.limited == {"ip POST auth/login=2/60": 1}
+
+
+def test_client_ip_trusts_only_configured_proxies():
+    limiter = RateLimiter([], MemoryBuckets(10), parse_networks("10.0.0.0/8"))
+    assert limiter.client_ip("10.0.0.5", "203.0.113.7, 10.0.0.9") == "203.0.113.7"
+    assert limiter.client_ip("198.51.100.1", "203.0.113.7") == "198.51.100.1"
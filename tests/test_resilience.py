@@ -0,0 +1,85 @@
+"""Pruebas unitarias de api-gateway/resilience.py (sin docker)."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import resilience
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ServiceGuard
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for success in (False, False, True, False, False):
+        assert breaker.allow()
+        breaker.record(success)
+    # El éxito intermedio reinicia la cuenta
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == pytest.approx(10)
+
+
+def test_breaker_half_open_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, half_open_max=1)
+    breaker.record(False)
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Sólo una petición de prueba a la vez
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN and breaker.times_opened == 2
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+
+def test_guard_rejects_when_open_or_full(clock):
+    guard = ServiceGuard("menu", CircuitBreaker(failure_threshold=1, reset_timeout=5), max_in_flight=1)
+
+    async def failing():
+        raise httpx.ConnectError("caída")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(guard.call(failing))
+    with pytest.raises(HTTPException) as exc:
+        guard.acquire()
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "5"
+    assert guard.rejected_open == 1
+
+    clock.now += 5
+    guard.acquire()
+    with pytest.raises(HTTPException):
+        guard.acquire()
+    assert guard.rejected_full == 1
+
+
+def test_guard_counts_5xx_as_failure_and_cancel_as_neutral(clock):
+    guard = ServiceGuard("menu", CircuitBreaker(failure_threshold=2, reset_timeout=5), max_in_flight=10)
+
+    async def respond(status):
+        return httpx.Response(status)
+
+    asyncio.run(guard.call(lambda: respond(503)))
+    assert guard.breaker.consecutive_failures == 1
+    guard.acquire()
+    guard.release(None)
+    assert guard.breaker.consecutive_failures == 1
+    asyncio.run(guard.call(lambda: respond(404)))
+    assert guard.breaker.consecutive_failures == 0
+    assert guard.in_flight == 0
@@ -0,0 +1,84 @@
+"""Pruebas unitarias de api-gateway/retries.py (sin docker)."""
+import asyncio
+
+import httpx
+import pytest
+
+from retries import LatencyWindow, RetryBudget, RetryPolicy
+
+
+def _policy(hedge: bool = True, **kwargs) -> RetryPolicy:
+    window = LatencyWindow(size=100, min_samples=1)
+    window.record(0.01)
+    options = dict(
+        static_timeout=5.0,
+        min_timeout=0.5,
+        p99_multiplier=3,
+        max_retries=0,
+        backoff=0.0,
+        budget=RetryBudget(ratio=1.0, min_per_second=0.0, max_tokens=10.0),
+        window=window,
+        hedge=hedge,
+        hedge_min_delay=0.01,
+    )
+    options.update(kwargs)
+    return RetryPolicy(**options)
+
+
+@pytest.mark.parametrize("failing", [0, 1])
+def test_hedge_prefers_success_when_both_finish_together(failing):
+    # El orden de `done` (un set) depende de la tarea: se repite para cubrir ambos
+    for _ in range(20):
+        policy = _policy()
+        release = asyncio.Event()
+        calls = []
+
+        async def attempt(tried, timeout):
+            n = len(calls)
+            calls.append(n)
+            # Las dos copias quedan esperando el mismo evento y terminan en la misma vuelta
+            await release.wait()
+            return httpx.Response(503 if n == failing else 200)
+
+        async def run():
+            task = asyncio.ensure_future(policy.execute("GET", attempt, replicas=2))
+            while len(calls) < 2:
+                await asyncio.sleep(0.005)
+            release.set()
+            return await task
+
+        response = asyncio.run(run())
+        assert response.status_code == 200
+        assert policy.hedges == 1
+        assert policy.hedge_wins == (1 if failing == 0 else 0)
+
+
+def test_hedge_returns_failure_when_both_fail():
+    policy = _policy()
+    calls = []
+
+    async def attempt(tried, timeout):
+        n = len(calls)
+        calls.append(n)
+        await asyncio.sleep(0.05)
+        if n == 0:
+            raise httpx.ConnectError("caída")
+        return httpx.Response(502)
+
+    response = asyncio.run(policy.execute("GET", attempt, replicas=2))
+    assert response.status_code == 502
+
+
+def test_retries_stop_when_budget_is_exhausted():
+    policy = _policy(hedge=False, max_retries=3, budget=RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1.0))
+    calls = []
+
+    async def attempt(tried, timeout):
+        calls.append(timeout)
+        raise httpx.ConnectError("caída")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(policy.execute("GET", attempt, replicas=2))
+    # Un intento más el único reintento que permite el presupuesto
+    assert len(calls) == 2
+    assert policy.budget.exhausted == 1
@@ -0,0 +1,72 @@
+"""Pruebas unitarias de api-gateway/singleflight.py (sin docker)."""
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from singleflight import SingleFlight, request_key
+
+
+def _request(query: str = "", **headers) -> Request:
+    raw = [(k.encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": query.encode(), "headers": raw})
+
+
+def test_request_key_normalizes_query_and_scopes_by_authorization():
+    assert request_key("/menu/platos/", _request("b=2&a=1")) == request_key("menu/platos", _request("a=1&b=2"))
+    assert request_key("menu/platos", _request(authorization="Bearer a")) != request_key(
+        "menu/platos", _request(authorization="Bearer b")
+    )
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    async def run():
+        return await asyncio.gather(*(flight.do(("k",), fetch) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert results == [{"ok": True}] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"requests": 5, "upstream_calls": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_errors_are_shared_and_key_is_freed():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("caída")
+
+    async def run():
+        return await asyncio.gather(*(flight.do(("k",), failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "respuesta"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do(("k",), fetch))
+        second = asyncio.ensure_future(flight.do(("k",), fetch))
+        await asyncio.sleep(0)
+        # El cliente que inició la llamada se desconecta
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "respuesta"
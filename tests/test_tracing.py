@@ -0,0 +1,40 @@
+"""Pruebas unitarias de common/tracing.py (sin docker)."""
+import json
+
+from fastapi import FastAPI
+
+from common import tracing
+from common.tracing import FileExporter
+
+
+def _span(i: int) -> dict:
+    return {"trace_id": "t", "span_id": str(i), "name": "x" * 100}
+
+
+def test_file_exporter_writes_jsonl(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    exporter = FileExporter(str(path), max_bytes=0, backups=0, queue_size=100)
+    for i in range(10):
+        exporter.export(_span(i))
+    exporter.flush()
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["span_id"] for line in lines] == [str(i) for i in range(10)]
+
+
+def test_file_exporter_rotates_and_keeps_backups(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    exporter = FileExporter(str(path), max_bytes=1000, backups=2, queue_size=1000)
+    for i in range(100):
+        exporter.export(_span(i))
+        exporter.flush()
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["spans.jsonl", "spans.jsonl.1", "spans.jsonl.2"]
+    for name in ("spans.jsonl.1", "spans.jsonl.2"):
+        assert (tmp_path / name).stat().st_size < 1000 + 200
+
+
+def test_traces_endpoint_disabled_by_default():
+    assert not tracing.TRACE_ENDPOINT_ENABLED
+    app = FastAPI()
+    tracing.trace_fastapi(app, "test")
+    assert not any(getattr(route, "path", "") == "/traces/{trace_id}" for route in app.routes)
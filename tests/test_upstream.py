@@ -0,0 +1,99 @@
+"""Pruebas unitarias del passthrough de api-gateway/upstream.py (sin docker)."""
+import asyncio
+
+import httpx
+import pytest
+from starlette.requests import ClientDisconnect
+
+from upstream import UpstreamStreamingResponse
+
+
+class Cuerpo(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.leidos = 0
+        self.cerrado = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.leidos += 1
+            yield chunk
+
+    async def aclose(self):
+        self.cerrado = True
+
+
+def _respuesta(chunks=(b"a", b"b")):
+    cuerpo = Cuerpo(list(chunks))
+    cerradas = []
+    upstream = httpx.Response(200, headers={"content-type": "text/plain"}, stream=cuerpo)
+    return UpstreamStreamingResponse(upstream, cerradas.append), cuerpo, cerradas
+
+
+def _scope(spec_version="2.4"):
+    return {"type": "http", "asgi": {"spec_version": spec_version}}
+
+
+async def _recibir():
+    await asyncio.Event().wait()
+
+
+def test_body_is_streamed_and_upstream_closed_once():
+    response, cuerpo, cerradas = _respuesta()
+    enviados = []
+
+    async def send(message):
+        enviados.append(message)
+
+    asyncio.run(response(_scope(), _recibir, send))
+    assert b"".join(m.get("body", b"") for m in enviados) == b"ab"
+    assert cuerpo.cerrado and len(cerradas) == 1
+
+
+def test_disconnect_before_body_still_releases():
+    response, cuerpo, cerradas = _respuesta()
+
+    async def send(message):
+        raise OSError("cliente desconectado")
+
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(response(_scope(), _recibir, send))
+    assert cuerpo.leidos == 0
+    assert cuerpo.cerrado and len(cerradas) == 1
+
+
+def test_disconnect_message_cancels_stream_and_releases():
+    response, cuerpo, cerradas = _respuesta()
+
+    async def recibir():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        await asyncio.Event().wait()
+
+    asyncio.run(response(_scope("2.0"), recibir, send))
+    assert cuerpo.cerrado and len(cerradas) == 1
+
+
+def test_cancelled_request_releases():
+    response, cuerpo, cerradas = _respuesta()
+
+    async def send(message):
+        await asyncio.Event().wait()
+
+    async def run():
+        tarea = asyncio.ensure_future(response(_scope(), _recibir, send))
+        await asyncio.sleep(0.01)
+        tarea.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+
+    asyncio.run(run())
+    assert cuerpo.cerrado and len(cerradas) == 1
+
+
+def test_response_never_sent_is_closed_by_aclose():
+    response, cuerpo, cerradas = _respuesta()
+    asyncio.run(response.aclose())
+    asyncio.run(response.aclose())
+    assert cuerpo.cerrado and len(cerradas) == 1